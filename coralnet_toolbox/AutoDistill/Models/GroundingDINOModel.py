@@ -1,21 +1,30 @@
 import os
 import urllib.request
+from collections import OrderedDict
 from dataclasses import dataclass
 
 os.environ["CUBLAS_WORKSPACE_CONFIG"] = ":16:8"
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+import numpy as np
+import rasterio
 import torch
 
 torch.use_deterministic_algorithms(False)
 
 import supervision as sv
+from rasterio.windows import Window
+from torchvision.ops import batched_nms
 from autodistill.detection import CaptionOntology, DetectionBaseModel
 from autodistill.helpers import load_image
-from groundingdino.util.inference import Model
+from groundingdino.util.inference import Model, preprocess_caption
+from groundingdino.util.utils import get_phrases_from_posmap
 
 from autodistill_grounding_dino.helpers import (combine_detections)
 
+from coralnet_toolbox.Slicer.QtSlicer import Slicer
+from coralnet_toolbox.utilities import preprocess_image
+
 HOME = os.path.expanduser("~")
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -83,6 +92,47 @@ def load_grounding_dino(model="SwinT"):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+class CachedTextEncoder(torch.nn.Module):
+    """
+    Wraps GroundingDINO's text encoder (BERT) and caches its output per tokenized prompt, so an unchanged
+    ontology is encoded once rather than on every forward pass. When a batch repeats the same prompt for
+    every image, the prompt is encoded once and expanded to the batch.
+    """
+    def __init__(self, encoder, max_items=64):
+        super().__init__()
+        self.encoder = encoder
+        self.max_items = max_items
+        self.cache = OrderedDict()
+
+    def get_key(self, kwargs):
+        """Create a cache key from the first row of each (tensor) input."""
+        return tuple((name, tuple(value[:1].shape), value[:1].cpu().numpy().tobytes())
+                     for name, value in sorted(kwargs.items()) if torch.is_tensor(value))
+
+    def forward(self, **kwargs):
+        input_ids = kwargs['input_ids']
+        batch_size = input_ids.shape[0]
+
+        # Only batches that repeat a single prompt can be served from the cache
+        if not (input_ids == input_ids[:1]).all():
+            return self.encoder(**kwargs)
+
+        key = self.get_key(kwargs)
+        if key not in self.cache:
+            first = {name: value[:1] if torch.is_tensor(value) else value for name, value in kwargs.items()}
+            self.cache[key] = self.encoder(**first)
+            while len(self.cache) > self.max_items:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(key)
+
+        output = self.cache[key]
+        return {name: value.expand(batch_size, *value.shape[1:]) if torch.is_tensor(value) else value
+                for name, value in output.items()}
+
+    def clear(self):
+        self.cache.clear()
+
+
 @dataclass
 class GroundingDINO(DetectionBaseModel):
     ontology: CaptionOntology
@@ -98,6 +148,15 @@ class GroundingDINO(DetectionBaseModel):
         self.box_threshold = box_threshold
         self.text_threshold = text_threshold
 
+        # Detections per tile, so re-filtering tiled results does not re-run the model
+        self.tile_cache = OrderedDict()
+        self.max_cached_tiles = 2048
+
+        # Cache the text encodings of the ontology's prompts
+        model = self.grounding_dino_model.model
+        if not isinstance(model.bert, CachedTextEncoder):
+            model.bert = CachedTextEncoder(model.bert)
+
     def predict(self, input: str) -> sv.Detections:
         image = load_image(input, return_format="cv2")
 
@@ -117,4 +176,127 @@ class GroundingDINO(DetectionBaseModel):
             detections_list, overwrite_class_ids=range(len(detections_list))
         )
 
-        return detections
\ No newline at end of file
+        return detections
+
+    def predict_batch(self, images: list) -> list:
+        """
+        Make predictions on a batch of images, with one forward pass per prompt for the whole batch.
+
+        :param images: List of images (as passed to predict)
+        :return: List of sv.Detections, one per image
+        """
+        model = self.grounding_dino_model.model
+        device = self.grounding_dino_model.device
+
+        images = [load_image(image, return_format="cv2") for image in images]
+        processed = [Model.preprocess_image(image_bgr=image).to(device) for image in images]
+
+        detections_lists = [[] for _ in images]
+
+        for description in self.ontology.prompts():
+            caption = preprocess_caption(caption=description)
+            tokenized = model.tokenizer(caption)
+
+            with torch.no_grad():
+                outputs = model(processed, captions=[caption] * len(processed))
+
+            prediction_logits = outputs["pred_logits"].cpu().sigmoid()
+            prediction_boxes = outputs["pred_boxes"].cpu()
+
+            for idx, image in enumerate(images):
+                mask = prediction_logits[idx].max(dim=1)[0] > self.box_threshold
+                logits = prediction_logits[idx][mask]
+                boxes = prediction_boxes[idx][mask]
+
+                phrases = [get_phrases_from_posmap(logit > self.text_threshold, tokenized, model.tokenizer)
+                           .replace('.', '') for logit in logits]
+
+                source_h, source_w, _ = image.shape
+                detections = Model.post_process_result(source_h=source_h,
+                                                       source_w=source_w,
+                                                       boxes=boxes,
+                                                       logits=logits.max(dim=1)[0])
+                detections.class_id = Model.phrases2classes(phrases=phrases, classes=[description])
+                detections_lists[idx].append(detections)
+
+        return [combine_detections(detections_list, overwrite_class_ids=range(len(detections_list)))
+                for detections_list in detections_lists]
+
+    def get_tile_key(self, image_path, window):
+        """
+        Create a cache key for a tile's detections with the current ontology and thresholds.
+        """
+        mtime = os.path.getmtime(image_path) if os.path.exists(image_path) else 0
+        return (os.path.abspath(image_path), mtime, tuple(int(i) for i in window),
+                tuple(self.ontology.prompts()), self.box_threshold, self.text_threshold)
+
+    def cache_tile(self, key, detections):
+        """
+        Add a tile's detections to the cache, evicting the least recently used tiles beyond max_cached_tiles.
+        """
+        self.tile_cache[key] = detections
+        self.tile_cache.move_to_end(key)
+        while len(self.tile_cache) > self.max_cached_tiles:
+            self.tile_cache.popitem(last=False)
+
+    def predict_tiled(self, image_path, tile_size=1024, overlap=0.2, iou_thresh=0.5, batch_size=4):
+        """
+        Make predictions on overlapping tiles of an image (read with windowed reads) so small targets are
+        not lost when the model downsizes the image. Tile detections are cached, shifted into image
+        coordinates and merged with class-aware NMS; with a warm cache only the merging is re-run.
+
+        :param image_path: Path to the image
+        :param tile_size: Size of the (square) tiles
+        :param overlap: Fractional overlap between neighbouring tiles
+        :param iou_thresh: IoU threshold for merging detections of the same class across tiles
+        :param batch_size: Number of tiles passed to the model at once
+        :return: sv.Detections in image coordinates
+        """
+        with rasterio.open(image_path) as src:
+            tiles = Slicer.get_slices(src.height, src.width, (tile_size, tile_size), overlap)
+
+            # Detections of this image's tiles are collected here, the cache may evict them while filling
+            tile_detections = {}
+            for tile in tiles:
+                key = self.get_tile_key(image_path, tile)
+                if key in self.tile_cache:
+                    self.tile_cache.move_to_end(key)
+                    tile_detections[key] = self.tile_cache[key]
+
+            missing = [tile for tile in tiles if self.get_tile_key(image_path, tile) not in tile_detections]
+
+            # Only tiles without cached detections are read and predicted
+            for start in range(0, len(missing), batch_size):
+                windows = missing[start: start + batch_size]
+                images = []
+                for left, top, right, bottom in windows:
+                    image = src.read(window=Window(left, top, right - left, bottom - top))
+                    images.append(preprocess_image(image.transpose(1, 2, 0)))
+
+                for window, detections in zip(windows, self.predict_batch(images)):
+                    key = self.get_tile_key(image_path, window)
+                    tile_detections[key] = detections
+                    self.cache_tile(key, detections)
+
+        # Shift each tile's detections into image coordinates
+        detections_list = []
+        for tile in tiles:
+            detections = tile_detections[self.get_tile_key(image_path, tile)]
+            if len(detections):
+                xyxy = detections.xyxy + np.tile(tile[:2], 2)
+                detections_list.append(sv.Detections(xyxy=xyxy,
+                                                     confidence=detections.confidence,
+                                                     class_id=detections.class_id))
+
+        if not detections_list:
+            return sv.Detections.empty()
+
+        detections = sv.Detections.merge(detections_list)
+
+        # Class-aware NMS across the tiles
+        keep = batched_nms(torch.as_tensor(detections.xyxy, dtype=torch.float32),
+                           torch.as_tensor(detections.confidence, dtype=torch.float32),
+                           torch.as_tensor(detections.class_id, dtype=torch.int64),
+                           iou_thresh)
+
+        return detections[keep.numpy()]
@@ -4,7 +4,8 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QApplication, QMessageBox, QCheckBox, QVBoxLayout, QLabel,
-                             QDialog, QDialogButtonBox, QGroupBox, QButtonGroup)
+                             QDialog, QDialogButtonBox, QGroupBox, QButtonGroup, QFormLayout,
+                             QSpinBox)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -33,6 +34,8 @@ class BatchInferenceDialog(QDialog):
         self.setup_info_layout()
         # Setup the options layout
         self.setup_options_layout()
+        # Setup the performance layout
+        self.setup_performance_layout()
         # Setup buttons layout
         self.setup_buttons_layout()
         
@@ -87,6 +90,22 @@ class BatchInferenceDialog(QDialog):
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
 
+    def setup_performance_layout(self):
+        """
+        Set up the batching options.
+        """
+        group_box = QGroupBox("Performance")
+        layout = QFormLayout()
+        
+        # Number of images passed to the model at once
+        self.batch_size_spinbox = QSpinBox()
+        self.batch_size_spinbox.setRange(1, 64)
+        self.batch_size_spinbox.setValue(4)
+        layout.addRow("Batch Size:", self.batch_size_spinbox)
+        
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
     def setup_buttons_layout(self):
         """
         Setup the buttons layout.
@@ -122,7 +141,8 @@ class BatchInferenceDialog(QDialog):
         """
         QApplication.setOverrideCursor(Qt.WaitCursor)
         try:
-            self.deploy_model_dialog.predict(self.get_selected_image_paths())
+            self.deploy_model_dialog.predict(self.get_selected_image_paths(),
+                                             batch_size=self.batch_size_spinbox.value())
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to make predictions: {str(e)}")
         finally:
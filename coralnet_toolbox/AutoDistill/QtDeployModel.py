@@ -3,15 +3,20 @@ import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 import gc
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+import rasterio
 import torch
 from autodistill.detection import CaptionOntology
 
 from qtrangeslider import QRangeSlider
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QMetaObject, Q_ARG
 from PyQt5.QtWidgets import (QApplication, QComboBox, QDialog,
                              QFormLayout, QHBoxLayout, QLabel, QLineEdit,
-                             QMessageBox, QPushButton, QSlider, QVBoxLayout, QGroupBox)
+                             QMessageBox, QPushButton, QSlider, QVBoxLayout, QGroupBox,
+                             QSpinBox, QDoubleSpinBox)
 
 from torch.cuda import empty_cache
 
@@ -55,9 +60,14 @@ class DeployModelDialog(QDialog):
         self.area_thresh_max = 0.40
         self.loaded_model = None
         self.model_name = None
+        self.model_key = None
         self.ontology = None
         self.class_mapping = {}
         self.ontology_pairs = []
+        
+        # Models are loaded through the shared registry
+        self.model_registry = main_window.model_registry
+        self.model_registry.register_loader('autodistill', self.load_autodistill_model)
 
         # Create the layout
         self.layout = QVBoxLayout(self)
@@ -193,6 +203,24 @@ class DeployModelDialog(QDialog):
         self.use_sam_dropdown.currentIndexChanged.connect(self.is_sam_model_deployed)
         layout.addRow("Use SAM for creating Polygons:", self.use_sam_dropdown)
         
+        # Tiled mode for high-resolution images
+        self.tiled_dropdown = QComboBox()
+        self.tiled_dropdown.addItems(["False", "True"])
+        self.tiled_dropdown.setCurrentIndex(0)
+        layout.addRow("Tiled Mode (Large Images):", self.tiled_dropdown)
+        
+        self.tile_size_spinbox = QSpinBox()
+        self.tile_size_spinbox.setRange(256, 4096)
+        self.tile_size_spinbox.setSingleStep(256)
+        self.tile_size_spinbox.setValue(1024)
+        layout.addRow("Tile Size:", self.tile_size_spinbox)
+        
+        self.tile_overlap_spinbox = QDoubleSpinBox()
+        self.tile_overlap_spinbox.setRange(0.0, 0.5)
+        self.tile_overlap_spinbox.setSingleStep(0.05)
+        self.tile_overlap_spinbox.setValue(0.2)
+        layout.addRow("Tile Overlap:", self.tile_overlap_spinbox)
+        
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
         
@@ -347,11 +375,11 @@ class DeployModelDialog(QDialog):
             # Get the name of the model to load
             model_name = self.model_dropdown.currentText()
 
-            if model_name != self.model_name:
+            if model_name != self.model_name or self.loaded_model is None:
                 self.load_new_model(model_name)
-            else:
-                # Update the model with the new ontology
-                self.loaded_model.ontology = self.ontology
+                
+            # Update the model with the new ontology
+            self.loaded_model.ontology = self.ontology
 
             self.status_bar.setText(f"Model loaded: {model_name}")
             QMessageBox.information(self, "Model Loaded", "Model loaded successfully")
@@ -382,25 +410,67 @@ class DeployModelDialog(QDialog):
 
     def load_new_model(self, model_name):
         """
-        Load a new model based on the selected model name.
+        Load a new model based on the selected model name (or get it from the registry).
+
+        Args:
+            model_name: Name of the model to load.
+        """
+        self.model_key = self.model_registry.get_key('autodistill', model_name, None, self.main_window.device)
+        self.loaded_model = self.model_registry.get_or_load(self.model_key, on_evict=self.on_model_evicted)
+        self.model_name = model_name
+
+    def load_autodistill_model(self, model_name, task, device):
+        """
+        Load an AutoDistill model; used as the registry loader for 'autodistill' models.
 
         Args:
             model_name: Name of the model to load.
-            uncertainty_thresh: Threshold for uncertainty.
+            task: Unused, AutoDistill models are used for detection.
+            device: Unused, the models pick their own device.
         """
         if "GroundingDINO" in model_name:
             from coralnet_toolbox.AutoDistill.Models.GroundingDINOModel import GroundingDINO
 
             model = model_name.split("-")[1].strip()
-            self.model_name = model_name
-            self.loaded_model = GroundingDINO(ontology=self.ontology,
-                                              box_threshold=0.025,
-                                              text_threshold=0.025,
-                                              model=model)
+            return GroundingDINO(ontology=self.ontology,
+                                 box_threshold=0.025,
+                                 text_threshold=0.025,
+                                 model=model)
+
+        raise ValueError(f"Model not recognized: {model_name}")
+
+    def on_model_evicted(self, key):
+        """
+        Drop the reference to a model the registry evicted to stay within its memory budget.
+        """
+        if key == self.model_key:
+            self.loaded_model = None
+            self.model_key = None
+            self.model_name = None
+            # Evictions can happen off the GUI thread (e.g. while another dialog loads a model)
+            QMetaObject.invokeMethod(self.status_bar, "setText", Qt.QueuedConnection, Q_ARG(str, "No model loaded"))
 
-    def predict(self, image_paths=None):
+    def read_image(self, image_path):
         """
-        Make Autodistill predictions on the given inputs
+        Read an image with its own rasterio handle; safe to call off the GUI thread.
+        """
+        with rasterio.open(image_path) as src:
+            return rasterio_to_numpy(src)
+
+    def read_batch(self, executor, image_paths):
+        """
+        Submit the images of a batch to be read in the background.
+        """
+        return [executor.submit(self.read_image, image_path) for image_path in image_paths]
+
+    def predict(self, image_paths=None, batch_size=1):
+        """
+        Make Autodistill predictions on the given inputs. Images are predicted in batches (if the model
+        supports it), and the next batch is read in the background while the current one is predicted.
+
+        Args:
+            image_paths: List of image paths to process. If None, uses the current image.
+            batch_size: Number of images passed to the model at once.
         """
         if not self.loaded_model:
             return
@@ -414,25 +484,111 @@ class DeployModelDialog(QDialog):
         progress_bar = ProgressBar(self.annotation_window, title=f"Making {self.model_name} Predictions")
         progress_bar.show()
         progress_bar.start_progress(len(image_paths))
+        
+        # Create a results processor
+        results_processor = ResultsProcessor(self.main_window, 
+                                             self.class_mapping,
+                                             uncertainty_thresh=self.main_window.get_uncertainty_thresh(),
+                                             iou_thresh=self.main_window.get_iou_thresh(),
+                                             min_area_thresh=self.main_window.get_area_thresh_min(),
+                                             max_area_thresh=self.main_window.get_area_thresh_max())
+        
+        if not hasattr(self.loaded_model, 'predict_batch'):
+            batch_size = 1
+            
+        if self.tiled_dropdown.currentText() == "True" and hasattr(self.loaded_model, 'predict_tiled'):
+            self.predict_tiled(image_paths, results_processor, progress_bar, batch_size)
+        else:
+            self.predict_batched(image_paths, results_processor, progress_bar, batch_size)
+                
+        # Stop the progress bar
+        progress_bar.stop_progress()
+        progress_bar.close()
+                
+        # Make cursor normal
+        QApplication.restoreOverrideCursor()
+        gc.collect()
+        empty_cache()
 
-        for image_path in image_paths:
-            # Open the image
-            image = self.main_window.image_window.rasterio_open(image_path)
-            image = rasterio_to_numpy(image)
-            # Predict the image
-            results = self.loaded_model.predict(image)
+    def predict_batched(self, image_paths, results_processor, progress_bar, batch_size=1):
+        """
+        Make predictions on batches of whole images, reading the next batch in the background.
+
+        Args:
+            image_paths: List of image paths to process.
+            results_processor: ResultsProcessor used to create the annotations.
+            progress_bar: ProgressBar updated once per image.
+            batch_size: Number of images passed to the model at once.
+        """
+        batches = [image_paths[i: i + batch_size] for i in range(0, len(image_paths), batch_size)]
+        start_time = time.perf_counter()
+        inference_time = 0.0
+
+        with ThreadPoolExecutor(max_workers=max(1, batch_size)) as executor:
+            pending = self.read_batch(executor, batches[0])
             
-            # Create a results processor
-            results_processor = ResultsProcessor(self.main_window, 
-                                                 self.class_mapping,
-                                                 uncertainty_thresh=self.main_window.get_uncertainty_thresh(),
-                                                 iou_thresh=self.main_window.get_iou_thresh(),
-                                                 min_area_thresh=self.main_window.get_area_thresh_min(),
-                                                 max_area_thresh=self.main_window.get_area_thresh_max())
+            for idx, batch in enumerate(batches):
+                images = [future.result() for future in pending]
+                
+                # Read the next batch while this one is predicted
+                if idx + 1 < len(batches):
+                    pending = self.read_batch(executor, batches[idx + 1])
+                
+                # Predict the images
+                start = time.perf_counter()
+                if batch_size > 1:
+                    detections = self.loaded_model.predict_batch(images)
+                else:
+                    detections = [self.loaded_model.predict(image) for image in images]
+                inference_time += time.perf_counter() - start
+            
+                for image_path, image, results in zip(batch, images, detections):
+                    results = results_processor.from_supervision(results, image, image_path, self.class_mapping)
+                    
+                    # Update the progress bar
+                    progress_bar.update_progress()
+
+                    if self.use_sam_dropdown.currentText() == "True":
+                        # Apply SAM to the detection results
+                        results = self.sam_dialog.predict_from_results(results, self.class_mapping)
+                        # Process the segmentation results
+                        results_processor.process_segmentation_results(results)
+                    else:
+                        # Process the detection results
+                        results_processor.process_detection_results(results)
+                        
+                del images, detections
+                
+        # Report the throughput
+        total_time = time.perf_counter() - start_time
+        summary = (f"{len(image_paths)} images in {total_time:.2f}s "
+                   f"({len(image_paths) / total_time:.2f} images/sec, inference {inference_time:.2f}s)")
+        print(f"{self.model_name}: {summary}")
+        self.status_bar.setText(summary)
+
+    def predict_tiled(self, image_paths, results_processor, progress_bar, batch_size=1):
+        """
+        Make tiled predictions on each image; the full image is never loaded for the model.
+
+        Args:
+            image_paths: List of image paths to process.
+            results_processor: ResultsProcessor used to create the annotations.
+            progress_bar: ProgressBar updated once per image.
+            batch_size: Number of tiles passed to the model at once.
+        """
+        for image_path in image_paths:
+            detections = self.loaded_model.predict_tiled(image_path,
+                                                         tile_size=self.tile_size_spinbox.value(),
+                                                         overlap=self.tile_overlap_spinbox.value(),
+                                                         iou_thresh=self.main_window.get_iou_thresh(),
+                                                         batch_size=batch_size)
             
-            results = results_processor.from_supervision(results, image, image_path, self.class_mapping)
+            # Results only need the image's shape, not its pixels
+            with rasterio.open(image_path) as src:
+                shape = (src.height, src.width, 3)
+            image = np.broadcast_to(np.zeros((1, 1, 3), dtype=np.uint8), shape)
             
-            # Update the progress bar
+            results = results_processor.from_supervision(detections, image, image_path, self.class_mapping)
             progress_bar.update_progress()
 
             if self.use_sam_dropdown.currentText() == "True":
@@ -443,21 +599,15 @@ class DeployModelDialog(QDialog):
             else:
                 # Process the detection results
                 results_processor.process_detection_results(results)
-                
-        # Stop the progress bar
-        progress_bar.stop_progress()
-        progress_bar.close()
-                
-        # Make cursor normal
-        QApplication.restoreOverrideCursor()
-        gc.collect()
-        empty_cache()
 
     def deactivate_model(self):
         """
         Deactivate the currently loaded model and clean up resources.
         """
+        if self.model_key is not None:
+            self.model_registry.release(self.model_key)
         self.loaded_model = None
+        self.model_key = None
         self.model_name = None
         gc.collect()
         torch.cuda.empty_cache()
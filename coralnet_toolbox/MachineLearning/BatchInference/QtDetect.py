@@ -2,6 +2,8 @@ import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
+from PyQt5.QtWidgets import QComboBox, QFormLayout, QGroupBox
+
 from coralnet_toolbox.MachineLearning.BatchInference.QtBase import Base
 
 from coralnet_toolbox.QtProgressBar import ProgressBar
@@ -23,7 +25,24 @@ class Detect(Base):
         """
         Set up the layout with both generic and classification-specific options.
         """
-        pass
+        group_box = QGroupBox("Image Slicing")
+        layout = QFormLayout()
+        
+        # Sliced inference dropdown (slice size and overlap are set in the deploy model dialog)
+        self.slicer_dropdown = QComboBox()
+        self.slicer_dropdown.addItems(["False", "True"])
+        self.slicer_dropdown.setCurrentIndex(0)
+        layout.addRow("Sliced Inference:", self.slicer_dropdown)
+        
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+        
+    def showEvent(self, event):
+        """
+        Sync the sliced inference option with the deploy model dialog.
+        """
+        super().showEvent(event)
+        self.slicer_dropdown.setCurrentText(self.deploy_model_dialog.slicer_dropdown.currentText())
         
     def batch_inference(self):
         """
@@ -37,6 +56,7 @@ class Detect(Base):
         progress_bar.start_progress(len(self.image_paths))
 
         if self.loaded_model is not None:
+            self.deploy_model_dialog.slicer_dropdown.setCurrentText(self.slicer_dropdown.currentText())
             self.deploy_model_dialog.predict(inputs=self.image_paths)
 
         progress_bar.stop_progress()
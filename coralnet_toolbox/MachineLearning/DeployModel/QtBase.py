@@ -7,11 +7,19 @@ import json
 import os
 import random
 
+import numpy as np
+
+from PyQt5.QtCore import Qt, QMetaObject, Q_ARG
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import (QFileDialog, QMessageBox, QVBoxLayout, QLabel, QDialog,
-                             QTextEdit, QPushButton, QGroupBox, QHBoxLayout)
+                             QTextEdit, QPushButton, QGroupBox, QHBoxLayout, QFormLayout,
+                             QComboBox, QSpinBox)
 
 from torch.cuda import empty_cache
+from ultralytics import YOLO
+
+from coralnet_toolbox.MachineLearning.RuntimeBackend import (get_model_format, apply_runtime_options,
+                                                              GRAPH_OPTIMIZATIONS, PERFORMANCE_HINTS)
 
 from coralnet_toolbox.Icons import get_icon
 
@@ -46,9 +54,14 @@ class Base(QDialog):
         self.area_thresh_min = 0.00
         self.area_thresh_max = 0.40
         self.model_path = None
+        self.model_key = None
         self.loaded_model = None  
         self.class_names = []
         self.class_mapping = {}
+        
+        # Models are loaded through the shared registry
+        self.model_registry = main_window.model_registry
+        self.model_registry.register_loader('yolo', self.load_yolo_model)
 
         self.layout = QVBoxLayout(self)
         
@@ -58,6 +71,8 @@ class Base(QDialog):
         self.setup_labels_layout()
         # Setup parameters layout
         self.setup_parameters_layout()
+        # Setup the runtime layout
+        self.setup_runtime_layout()
         # Setup the button layout
         self.setup_buttons_layout()
         # Setup the status layout
@@ -98,6 +113,41 @@ class Base(QDialog):
     def setup_parameters_layout(self):
         raise NotImplementedError("Subclasses must implement this method")
 
+    def setup_runtime_layout(self):
+        """
+        Set up the runtime options used for exported ONNX / OpenVINO models.
+        """
+        group_box = QGroupBox("Runtime (ONNX / OpenVINO)")
+        layout = QFormLayout()
+
+        # Threads used by the runtime, 0 uses the runtime's default
+        self.runtime_threads_spinbox = QSpinBox()
+        self.runtime_threads_spinbox.setRange(0, os.cpu_count() or 64)
+        self.runtime_threads_spinbox.setValue(0)
+        self.runtime_threads_spinbox.setSpecialValueText("Default")
+        layout.addRow("Threads:", self.runtime_threads_spinbox)
+
+        # ONNX Runtime graph optimizations
+        self.graph_optimization_dropdown = QComboBox()
+        self.graph_optimization_dropdown.addItems(GRAPH_OPTIMIZATIONS)
+        layout.addRow("Graph Optimization:", self.graph_optimization_dropdown)
+
+        # OpenVINO performance hint
+        self.performance_hint_dropdown = QComboBox()
+        self.performance_hint_dropdown.addItems(PERFORMANCE_HINTS)
+        layout.addRow("Performance Hint:", self.performance_hint_dropdown)
+
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
+    def get_runtime_options(self):
+        """
+        Get the runtime options from the dialog widgets.
+        """
+        return dict(num_threads=self.runtime_threads_spinbox.value(),
+                    graph_optimization=self.graph_optimization_dropdown.currentText(),
+                    performance_hint=self.performance_hint_dropdown.currentText())
+
     def setup_buttons_layout(self):
         """
         Set up the buttons layout in a 2x2 grid
@@ -216,7 +266,7 @@ class Base(QDialog):
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             "Open Model File", "",
-            "Model Files (*.pt *.onnx *.torchscript *.engine *.bin)",
+            "Model Files (*.pt *.onnx *.torchscript *.engine *.bin *.xml)",
             options=options
         )
         
@@ -224,7 +274,7 @@ class Base(QDialog):
             # Clear the class mapping
             self.class_mapping = {}
             
-            if ".bin" in file_path:
+            if ".bin" in file_path or ".xml" in file_path:
                 # OpenVINO is a directory
                 file_path = os.path.dirname(file_path)
 
@@ -262,6 +312,50 @@ class Base(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load class mapping file: {str(e)}")
 
+    @staticmethod
+    def load_yolo_model(model_path, task, device):
+        """
+        Load and warm up an Ultralytics model; used as the registry loader for 'yolo' models.
+
+        :param model_path: Path to the model
+        :param task: Task of the model
+        :param device: Device the model is used on
+        :return: YOLO model
+        """
+        model = YOLO(model_path, task=task)
+        # Run a blank through the model to initialize it
+        imgsz = 224 if task == 'classify' else 640
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8))
+        return model
+
+    def get_registry_model(self, task):
+        """
+        Get the selected model from the shared registry, loading and warming it up if needed.
+
+        :param task: Task of the model
+        :return: YOLO model
+        """
+        self.model_key = self.model_registry.get_key('yolo', self.model_path, task, self.main_window.device)
+        model = self.model_registry.get_or_load(self.model_key, on_evict=self.on_model_evicted)
+
+        # Exported models run natively in their runtime, with the selected options
+        if get_model_format(self.model_path) in ['onnx', 'openvino']:
+            options = self.get_runtime_options()
+            if apply_runtime_options(model, **options):
+                print(f"Running {os.path.basename(self.model_path)} with {options}")
+
+        return model
+
+    def on_model_evicted(self, key):
+        """
+        Drop the reference to a model the registry evicted to stay within its memory budget.
+        """
+        if key == self.model_key:
+            self.loaded_model = None
+            self.model_key = None
+            # Evictions can happen off the GUI thread (e.g. while another dialog loads a model)
+            QMetaObject.invokeMethod(self.status_bar, "setText", Qt.QueuedConnection, Q_ARG(str, "No model loaded"))
+
     def load_model(self):
         """
         Load the model
@@ -347,7 +441,10 @@ class Base(QDialog):
         """
         Deactivate the current model
         """
+        if self.model_key is not None:
+            self.model_registry.release(self.model_key)
         self.loaded_model = None
+        self.model_key = None
         self.model_path = None
         self.class_mapping = None
         gc.collect()
@@ -5,14 +5,11 @@ warnings.filterwarnings("ignore", category=UserWarning)
 import gc
 import os
 
-import numpy as np
-
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QApplication, QMessageBox, QLabel, QGroupBox, QFormLayout,
                              QSlider)
 
 from torch.cuda import empty_cache
-from ultralytics import YOLO
 
 from coralnet_toolbox.MachineLearning.DeployModel.QtBase import Base
 
@@ -73,8 +70,7 @@ class Classify(Base):
             
         try:
             QApplication.setOverrideCursor(Qt.WaitCursor)
-            self.loaded_model = YOLO(self.model_path, task='classify')
-            self.loaded_model(np.zeros((224, 224, 3), dtype=np.uint8))
+            self.loaded_model = self.get_registry_model('classify')
             self.class_names = list(self.loaded_model.names.values())
 
             if not self.class_mapping:
@@ -114,7 +110,8 @@ class Classify(Base):
 
         images_np = []
         for annotation in inputs:
-            images_np.append(pixmap_to_numpy(annotation.cropped_image))
+            # Arrays are expected in BGR order (as read by OpenCV)
+            images_np.append(pixmap_to_numpy(annotation.cropped_image)[:, :, ::-1])
 
         # Predict the classification results
         results = self.loaded_model(images_np,
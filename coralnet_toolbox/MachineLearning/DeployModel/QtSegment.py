@@ -5,17 +5,16 @@ warnings.filterwarnings("ignore", category=UserWarning)
 import gc
 import os
 
-import numpy as np
-
 from qtrangeslider import QRangeSlider
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QApplication, QMessageBox, QLabel, QGroupBox, QFormLayout, QComboBox, QSlider)
 
 from torch.cuda import empty_cache
-from ultralytics import YOLO
 
 from coralnet_toolbox.MachineLearning.DeployModel.QtBase import Base
+from coralnet_toolbox.Slicer.QtSlicerDialog import Base as SlicerBase
 
+from coralnet_toolbox.ResultsCore import RAW_CONF_THRESH, RAW_IOU_THRESH
 from coralnet_toolbox.ResultsProcessor import ResultsProcessor
 
 
@@ -24,7 +23,7 @@ from coralnet_toolbox.ResultsProcessor import ResultsProcessor
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-class Segment(Base):
+class Segment(Base, SlicerBase):
     def __init__(self, main_window, parent=None):
         super().__init__(main_window, parent)
         self.setWindowTitle("Deploy Segmentation Model")
@@ -95,6 +94,9 @@ class Segment(Base):
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
         
+        # Setup the image slicing layout
+        self.setup_slicer_layout()
+        
     def load_model(self):
         """
         Load the segmentation model.
@@ -105,8 +107,7 @@ class Segment(Base):
             
         try:
             QApplication.setOverrideCursor(Qt.WaitCursor)
-            self.loaded_model = YOLO(self.model_path, task='segment')
-            self.loaded_model(np.zeros((640, 640, 3), dtype=np.uint8))
+            self.loaded_model = self.get_registry_model('segment')
             self.class_names = list(self.loaded_model.names.values())
 
             if not self.class_mapping:
@@ -138,13 +139,21 @@ class Segment(Base):
             # Predict only the current image
             inputs = [self.annotation_window.current_image_path]
 
+        use_sam = self.use_sam_dropdown.currentText() == "True"
+
+        # The raw predictions are cached and filtered by the ResultsProcessor, so the thresholds can be
+        # re-applied without re-running the model; SAM is only run on the boxes that pass the thresholds
+        kwargs = dict(agnostic_nms=True,
+                      conf=self.main_window.get_uncertainty_thresh() if use_sam else RAW_CONF_THRESH,
+                      iou=self.main_window.get_iou_thresh() if use_sam else RAW_IOU_THRESH,
+                      device=self.main_window.device)
+
         # Predict the segmentation results
-        results = self.loaded_model(inputs,
-                                    agnostic_nms=True,
-                                    conf=self.main_window.get_uncertainty_thresh(),
-                                    iou=self.main_window.get_iou_thresh(),
-                                    device=self.main_window.device,
-                                    stream=True)
+        if self.is_slicing_enabled():
+            # Batched inference on windowed slices, merged across the overlaps
+            results = self.predict_sliced(inputs, iou_thresh=self.main_window.get_iou_thresh(), **kwargs)
+        else:
+            results = self.loaded_model(inputs, stream=True, **kwargs)
 
         # Create a result processor
         results_processor = ResultsProcessor(self.main_window,
@@ -155,13 +164,16 @@ class Segment(Base):
                                              max_area_thresh=self.main_window.get_area_thresh_max())
         
         # Check if SAM model is deployed
-        if self.use_sam_dropdown.currentText() == "True":
+        if use_sam:
             # Apply SAM to the segmentation results
             results = self.sam_dialog.predict_from_results(results, self.class_mapping)
 
         # Process the segmentation results
         results_processor.process_segmentation_results(results)
 
+        if self.is_slicing_enabled():
+            self.report_slicer_timings()
+
         QApplication.restoreOverrideCursor()
         gc.collect()
         empty_cache()
\ No newline at end of file
@@ -5,18 +5,24 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 import os
 import json
-import random
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QBrush, QColor
 from PyQt5.QtWidgets import (QFileDialog, QApplication, QMessageBox, QCheckBox,
                              QVBoxLayout, QLabel, QLineEdit, QDialog, QHBoxLayout,
-                             QPushButton, QFormLayout, QDialogButtonBox, QDoubleSpinBox,
-                             QGroupBox, QTableWidget, QTableWidgetItem)
+                             QPushButton, QFormLayout, QDialogButtonBox, QDoubleSpinBox, QSpinBox,
+                             QGroupBox, QTableWidget, QTableWidgetItem, QComboBox)
 
 from coralnet_toolbox.Annotations.QtRectangleAnnotation import RectangleAnnotation
 from coralnet_toolbox.Annotations.QtPolygonAnnotation import PolygonAnnotation
 from coralnet_toolbox.Annotations.QtPatchAnnotation import PatchAnnotation
+from coralnet_toolbox.MachineLearning.Materialization import STRATEGIES
+from coralnet_toolbox.MachineLearning.ExportDataset.QtLabelWriter import (group_by_image, ImageShapeCache,
+                                                                         LabelWriter, get_label_path)
+from coralnet_toolbox.MachineLearning.ExportDataset.QtExportManifest import ExportManifest
+from coralnet_toolbox.MachineLearning.ExportDataset.QtSplitSolver import (build_count_matrix, stratified_split,
+                                                                         count_split_labels)
+from coralnet_toolbox.QtProgressBar import ProgressBar
 from coralnet_toolbox.Icons import get_icon
 
 
@@ -45,6 +51,11 @@ class Base(QDialog):
 
         self.selected_labels = []
         self.selected_annotations = []
+        self.image_index = {}
+        self.image_label_counts = None
+        self.split_label_counts = None
+        self.image_shapes = ImageShapeCache()
+        self.manifest = None
         self.updating_summary_statistics = False
         
         self.output_dir = None
@@ -93,7 +104,7 @@ class Base(QDialog):
 
         # Shuffle Button
         self.shuffle_button = QPushButton("Shuffle")
-        self.shuffle_button.clicked.connect(self.update_summary_statistics)
+        self.shuffle_button.clicked.connect(self.shuffle_splits)
         self.layout.addWidget(self.shuffle_button)
 
     def setup_output_layout(self):
@@ -111,6 +122,16 @@ class Base(QDialog):
         layout.addRow("Output Directory:", self.output_dir_edit)
         layout.addRow(self.output_dir_button)
 
+        # How images are placed into the dataset (links avoid duplicating large images)
+        self.materialization_combo = QComboBox()
+        self.materialization_combo.addItems(STRATEGIES)
+        layout.addRow("Image Files:", self.materialization_combo)
+
+        # Only rewrite images whose annotations or source changed since the last export
+        self.incremental_combo = QComboBox()
+        self.incremental_combo.addItems(["False", "True"])
+        layout.addRow("Incremental Export:", self.incremental_combo)
+
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
 
@@ -142,9 +163,18 @@ class Base(QDialog):
         layout.addWidget(QLabel("Test Ratio:"))
         layout.addWidget(self.test_ratio_spinbox)
 
+        # The same seed always gives the same split; Shuffle moves to the next seed
+        self.seed_spinbox = QSpinBox()
+        self.seed_spinbox.setRange(0, 2 ** 31 - 1)
+        self.seed_spinbox.setValue(0)
+
+        layout.addWidget(QLabel("Seed:"))
+        layout.addWidget(self.seed_spinbox)
+
         self.train_ratio_spinbox.valueChanged.connect(self.update_summary_statistics)
         self.val_ratio_spinbox.valueChanged.connect(self.update_summary_statistics)
         self.test_ratio_spinbox.valueChanged.connect(self.update_summary_statistics)
+        self.seed_spinbox.valueChanged.connect(self.update_summary_statistics)
 
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
@@ -208,7 +238,7 @@ class Base(QDialog):
 
         # Add Shuffle button
         self.shuffle_button = QPushButton("Shuffle")
-        self.shuffle_button.clicked.connect(self.update_summary_statistics)
+        self.shuffle_button.clicked.connect(self.shuffle_splits)
         button_layout.addWidget(self.shuffle_button)
 
         # Add spacer to push OK/Cancel to right
@@ -237,6 +267,10 @@ class Base(QDialog):
         elif state == Qt.Unchecked:
             self.update_summary_statistics()
 
+    def shuffle_splits(self):
+        """Solve the splits again with the next seed."""
+        self.seed_spinbox.setValue(self.seed_spinbox.value() + 1)
+
     def set_cell_color(self, row, column, color):
         """
         Set the background color of a cell in the label counts table.
@@ -403,38 +437,60 @@ class Base(QDialog):
 
     def split_data(self):
         """
-        Split the data by images based on the specified ratios.
+        Split the data by images based on the specified ratios, stratified by label so each split
+        receives its share of every selected label. The split is deterministic for a given seed.
         """
         self.train_ratio = self.train_ratio_spinbox.value()
         self.val_ratio = self.val_ratio_spinbox.value()
         self.test_ratio = self.test_ratio_spinbox.value()
 
-        images = self.image_window.image_paths
-        random.shuffle(images)
+        # Image x label annotation counts of the current selection (the UI's image list is left untouched)
+        images, self.image_index, self.image_label_counts = build_count_matrix(self.image_window.image_paths,
+                                                                               self.selected_annotations,
+                                                                               self.selected_labels)
 
-        train_split = int(len(images) * self.train_ratio)
-        val_split = int(len(images) * (self.train_ratio + self.val_ratio))
+        assignment = stratified_split(self.image_label_counts,
+                                      (self.train_ratio, self.val_ratio, self.test_ratio),
+                                      self.seed_spinbox.value())
 
-        # Initialize splits
-        self.train_images = []
-        self.val_images = []
-        self.test_images = []
+        # Assign images to splits
+        self.train_images = [image_path for image_path, split in zip(images, assignment) if split == 0]
+        self.val_images = [image_path for image_path, split in zip(images, assignment) if split == 1]
+        self.test_images = [image_path for image_path, split in zip(images, assignment) if split == 2]
 
-        # Assign images to splits based on ratios
-        if self.train_ratio > 0:
-            self.train_images = images[:train_split]
-        if self.val_ratio > 0:
-            self.val_images = images[train_split:val_split]
-        if self.test_ratio > 0:
-            self.test_images = images[val_split:]
+    def apply_manifest_splits(self):
+        """
+        Keep images that were already exported in the split they were exported to; only new images are
+        assigned by the ratios.
+        """
+        splits = {'train': self.train_images, 'valid': self.val_images, 'val': self.val_images, 'test': self.test_images}
+
+        images = self.train_images + self.val_images + self.test_images
+        for split_images in [self.train_images, self.val_images, self.test_images]:
+            split_images[:] = [image_path for image_path in split_images if image_path not in self.manifest]
+
+        for image_path in images:
+            split = self.manifest.get_split(image_path)
+            if split in splits:
+                splits[split].append(image_path)
+            elif split is not None:
+                self.train_images.append(image_path)
 
     def determine_splits(self):
         """
-        Determine the splits for train, validation, and test annotations.
+        Determine the splits for train, validation, and test annotations, and the label counts of each split.
         """
-        self.train_annotations = [a for a in self.selected_annotations if a.image_path in self.train_images]
-        self.val_annotations = [a for a in self.selected_annotations if a.image_path in self.val_images]
-        self.test_annotations = [a for a in self.selected_annotations if a.image_path in self.test_images]
+        train_images = set(self.train_images)
+        val_images = set(self.val_images)
+        test_images = set(self.test_images)
+
+        self.train_annotations = [a for a in self.selected_annotations if a.image_path in train_images]
+        self.val_annotations = [a for a in self.selected_annotations if a.image_path in val_images]
+        self.test_annotations = [a for a in self.selected_annotations if a.image_path in test_images]
+
+        # Label counts of each split, in the order of the selected labels
+        self.split_label_counts = [count_split_labels(self.image_label_counts, self.image_index, images)
+                                   for images in [train_images, val_images, test_images]]
 
     def check_label_distribution(self):
         """
@@ -448,41 +504,13 @@ class Base(QDialog):
         val_ratio = self.val_ratio_spinbox.value()
         test_ratio = self.test_ratio_spinbox.value()
 
-        # Initialize dictionaries to store label counts for each split
-        train_label_counts = {}
-        val_label_counts = {}
-        test_label_counts = {}
+        ratios = [train_ratio, val_ratio, test_ratio]
 
-        # Count annotations for each label in each split
-        for annotation in self.train_annotations:
-            label = annotation.label.short_label_code
-            train_label_counts[label] = train_label_counts.get(label, 0) + 1
-
-        for annotation in self.val_annotations:
-            label = annotation.label.short_label_code
-            val_label_counts[label] = val_label_counts.get(label, 0) + 1
-
-        for annotation in self.test_annotations:
-            label = annotation.label.short_label_code
-            test_label_counts[label] = test_label_counts.get(label, 0) + 1
-
-        # Check the conditions for each split
-        for label in self.selected_labels:
-            if train_ratio > 0 and (label not in train_label_counts or train_label_counts[label] == 0):
-                return False
-            if val_ratio > 0 and (label not in val_label_counts or val_label_counts[label] == 0):
-                return False
-            if test_ratio > 0 and (label not in test_label_counts or test_label_counts[label] == 0):
+        # Every selected label must be present in every split that has a ratio, and no such split can be empty
+        for ratio, label_counts in zip(ratios, self.split_label_counts):
+            if ratio > 0 and (label_counts.sum() == 0 or (label_counts == 0).any()):
                 return False
 
-        # Additional checks to ensure no empty splits
-        if train_ratio > 0 and len(self.train_annotations) == 0:
-            return False
-        if val_ratio > 0 and len(self.val_annotations) == 0:
-            return False
-        if test_ratio > 0 and len(self.test_annotations) == 0:
-            return False
-
         # Allow creation of dataset if
         if train_ratio >= 0 and val_ratio >= 0 and test_ratio >= 0:
             return True
@@ -502,9 +530,6 @@ class Base(QDialog):
 
         self.updating_summary_statistics = True
 
-        # Split the data by images
-        self.split_data()
-
         # Selected labels based on user's selection
         self.selected_labels = []
         for row in range(self.label_counts_table.rowCount()):
@@ -516,19 +541,28 @@ class Base(QDialog):
         # Filter annotations based on the selected annotation types and current tab
         self.selected_annotations = self.filter_annotations()
 
+        # Split the data by images
+        self.split_data()
+
         # Split the data by annotations
         self.determine_splits()
 
-        # Update the label counts table
+        # Update the label counts table from the per-split label counts
+        label_columns = {label: j for j, label in enumerate(self.selected_labels)}
+        anno_counts = self.image_label_counts.sum(axis=0)
+        train_counts, val_counts, test_counts = self.split_label_counts
+
         for row in range(self.label_counts_table.rowCount()):
             include_checkbox = self.label_counts_table.cellWidget(row, 0)
             label = self.label_counts_table.item(row, 1).text()
-            anno_count = sum(1 for a in self.selected_annotations if a.label.short_label_code == label)
-            if include_checkbox.isChecked():
-                train_count = sum(1 for a in self.train_annotations if a.label.short_label_code == label)
-                val_count = sum(1 for a in self.val_annotations if a.label.short_label_code == label)
-                test_count = sum(1 for a in self.test_annotations if a.label.short_label_code == label)
+            column = label_columns.get(label)
+            if include_checkbox.isChecked() and column is not None:
+                anno_count = int(anno_counts[column])
+                train_count = int(train_counts[column])
+                val_count = int(val_counts[column])
+                test_count = int(test_counts[column])
             else:
+                anno_count = 0
                 train_count = 0
                 val_count = 0
                 test_count = 0
@@ -624,9 +658,22 @@ class Base(QDialog):
             class_mapping = self.get_class_mapping()
             self.save_class_mapping_json(class_mapping, output_dir_path)
 
+        # Keep the splits of a previous export, and skip what has not changed since
+        self.manifest = None
+        if self.incremental_combo.currentText() == "True":
+            self.manifest = ExportManifest(output_dir_path)
+            self.apply_manifest_splits()
+            self.determine_splits()
+
         # Set the cursor to waiting (busy) cursor
         QApplication.setOverrideCursor(Qt.WaitCursor)
         self.create_dataset(output_dir_path)
+
+        if self.manifest is not None:
+            removed = self.manifest.prune()
+            self.manifest.save()
+            print(f"Incremental export: {removed} images no longer annotated were removed")
+
         # Restore the cursor to the default cursor
         QApplication.restoreOverrideCursor()
 
@@ -639,4 +686,61 @@ class Base(QDialog):
         raise NotImplementedError("Method must be implemented in the subclass.")
     
     def process_annotations(self):
-        raise NotImplementedError("Method must be implemented in the subclass.")
\ No newline at end of file
+        raise NotImplementedError("Method must be implemented in the subclass.")
+
+    def write_yolo_split(self, annotations, split_dir, split, to_yolo):
+        """
+        Write the YOLO label files of a split and copy its images. Annotations are grouped by image in a
+        single pass, image dimensions are read once and cached, and the files are written in parallel.
+
+        Args:
+            annotations (list): List of annotations.
+            split_dir (str): Path to the split directory.
+            split (str): Split name (e.g., "Training", "Validation", "Testing").
+            to_yolo (callable): Takes an annotation, image width and height; returns (label, YOLO string).
+        """
+        grouped = group_by_image(annotations)
+        if not grouped:
+            return
+
+        class_numbers = {label: i for i, label in enumerate(self.selected_labels)}
+        self.image_shapes.prefetch(list(grouped.keys()))
+
+        labels = {}
+        for image_path, image_annotations in grouped.items():
+            image_height, image_width = self.image_shapes.get(image_path)
+            lines = []
+            for image_annotation in image_annotations:
+                class_label, annotation = to_yolo(image_annotation, image_width, image_height)
+                lines.append(f"{class_numbers[class_label]} {annotation}")
+            labels[image_path] = lines
+
+        if self.manifest is not None:
+            # Only write images whose labels or source changed since the last export
+            split_name = os.path.basename(os.path.normpath(split_dir))
+            for image_path in [p for p, lines in labels.items() if self.manifest.is_unchanged(p, split_name, lines)]:
+                self.manifest.mark_exported(image_path)
+                del labels[image_path]
+            print(f"{split}: {len(labels)} of {len(grouped)} images changed")
+
+        progress_bar = ProgressBar(self, title=f"Creating {split} Dataset")
+        progress_bar.show()
+        progress_bar.start_progress(len(labels))
+
+        writer = LabelWriter(strategy=self.materialization_combo.currentText())
+        failed = set(writer.write(labels, split_dir, progress_callback=progress_bar.update_progress))
+
+        if self.manifest is not None:
+            for image_path, lines in labels.items():
+                if image_path in failed:
+                    # Not recorded, so the next export writes it again
+                    self.manifest.discard(image_path)
+                    continue
+                self.manifest.update(image_path,
+                                     split_name,
+                                     lines,
+                                     get_label_path(image_path, split_dir),
+                                     os.path.join(split_dir, "images", os.path.basename(image_path)))
+
+        progress_bar.stop_progress()
+        progress_bar.close()
\ No newline at end of file
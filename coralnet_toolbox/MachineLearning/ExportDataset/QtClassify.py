@@ -4,14 +4,12 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 import os
-from operator import attrgetter
-from itertools import groupby
-
 import pandas as pd
 
-from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QLabel)
+from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QLabel, QFormLayout, QSpinBox, QComboBox)
 
 from coralnet_toolbox.MachineLearning.ExportDataset.QtBase import Base
+from coralnet_toolbox.MachineLearning.ExportDataset.QtPatchExporter import PatchExporter
 from coralnet_toolbox.QtProgressBar import ProgressBar
 from coralnet_toolbox.Icons import get_icon
 
@@ -42,6 +40,36 @@ class Classify(Base):
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
         
+    def setup_output_layout(self):
+        """Setup output directory layout, with the patch export options."""
+        super().setup_output_layout()
+
+        # Patches are always written as new files
+        self.materialization_combo.setEnabled(False)
+        self.incremental_combo.setEnabled(False)
+
+        group_box = QGroupBox("Export Options")
+        layout = QFormLayout()
+
+        # Number of processes reading and writing patches
+        self.export_workers_spinbox = QSpinBox()
+        self.export_workers_spinbox.setRange(1, os.cpu_count() or 1)
+        self.export_workers_spinbox.setValue(max(1, min(8, (os.cpu_count() or 2) - 1)))
+        layout.addRow("Worker Processes:", self.export_workers_spinbox)
+
+        # Image format of the patches
+        self.export_format_dropdown = QComboBox()
+        self.export_format_dropdown.addItems(["jpg", "png"])
+        layout.addRow("Image Format:", self.export_format_dropdown)
+
+        # Write patches as individual files in class folders, or packed into tar shards
+        self.output_format_dropdown = QComboBox()
+        self.output_format_dropdown.addItems(["Files", "Shards"])
+        layout.addRow("Output Format:", self.output_format_dropdown)
+
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
     def update_annotation_type_checkboxes(self):
         """
         Update the state of annotation type checkboxes based on the selected dataset type.
@@ -73,6 +101,12 @@ class Classify(Base):
             with open(os.path.join(label_folder, 'NULL.jpg'), 'w') as f:
                 f.write("")
 
+        if self.output_format_dropdown.currentText() == "Shards":
+            # Class folders are still needed for Ultralytics to find the class names
+            for split_dir in [val_dir, test_dir]:
+                for label in self.selected_labels:
+                    os.makedirs(os.path.join(split_dir, label), exist_ok=True)
+
         self.process_annotations(self.train_annotations, train_dir, "Train")
         self.process_annotations(self.val_annotations, val_dir, "Validation")
         self.process_annotations(self.test_annotations, test_dir, "Test")
@@ -86,46 +120,49 @@ class Classify(Base):
         pd.DataFrame(df).to_csv(f"{output_dir_path}/dataset.csv", index=False)
         
     def process_annotations(self, annotations, split_dir, split):
-        # Get unique image paths
-        image_paths = list(set(a.image_path for a in annotations))
-        if not image_paths:
+        """
+        Export the annotations of a split as patches, in parallel across images.
+
+        Args:
+            annotations (list): List of annotations.
+            split_dir (str): Path to the split directory.
+            split (str): Name of the split.
+        """
+        if not annotations:
             return
 
+        exporter = PatchExporter(num_workers=self.export_workers_spinbox.value(),
+                                 image_format=self.export_format_dropdown.currentText())
+
         progress_bar = ProgressBar(self, title=f"Creating {split} Dataset")
         progress_bar.show()
-        progress_bar.start_progress(len(image_paths))
-
-        # Group annotations by image path
-        grouped_annotations = groupby(sorted(annotations, key=attrgetter('image_path')), 
-                                   key=attrgetter('image_path'))
-
-        for image_path, group in grouped_annotations:
-            try:
-                # Process image annotations
-                image_annotations = list(group)
-                image_annotations = self.annotation_window.crop_these_image_annotations(image_path, image_annotations)
-
-                # Save each cropped annotation
-                for annotation in image_annotations:
-                    label_code = annotation.label.short_label_code
-                    output_path = os.path.join(split_dir, label_code)
-                    # Create a split / label directory if it does not exist
-                    os.makedirs(output_path, exist_ok=True)
-                    output_filename = f"{label_code}_{annotation.id}.jpg"
-                    full_output_path = os.path.join(output_path, output_filename)
-
-                    try:
-                        annotation.cropped_image.save(full_output_path, "JPG", quality=100)
-                    except Exception as e:
-                        print(f"ERROR: Issue saving image {full_output_path}: {e}")
-                        # Optionally, save as PNG if JPG fails
-                        png_path = full_output_path.replace(".jpg", ".png")
-                        annotation.cropped_image.save(png_path, "PNG")
-
-            except Exception as exc:
-                print(f'{image_path} generated an exception: {exc}')
-            finally:
-                progress_bar.update_progress()
+
+        if self.output_format_dropdown.currentText() == "Shards":
+            # Each annotation is packed as label/label_id into <dataset>/shards/<split>
+            jobs = exporter.create_jobs(annotations,
+                                        lambda a: f"{a.label.short_label_code}/{a.label.short_label_code}_{a.id}")
+            shard_dir = os.path.join(os.path.dirname(split_dir), "shards", os.path.basename(split_dir))
+
+            progress_bar.start_progress(len(jobs))
+            counts = exporter.export_shards(jobs,
+                                            shard_dir,
+                                            get_class_name=lambda key: key.rsplit("/", 1)[0],
+                                            progress_callback=progress_bar.update_progress,
+                                            is_canceled=progress_bar.wasCanceled)
+        else:
+            # Each annotation is written to split / label / label_id
+            jobs = exporter.create_jobs(annotations,
+                                        lambda a: os.path.join(split_dir,
+                                                               a.label.short_label_code,
+                                                               f"{a.label.short_label_code}_{a.id}"))
+
+            progress_bar.start_progress(len(jobs))
+            counts = exporter.export(jobs,
+                                     progress_callback=progress_bar.update_progress,
+                                     is_canceled=progress_bar.wasCanceled)
+
+        print(f"{split}: {counts['written']} patches written, "
+              f"{counts['skipped']} already exported, {counts['failed']} failed")
 
         progress_bar.stop_progress()
-        progress_bar.close()
\ No newline at end of file
+        progress_bar.close()
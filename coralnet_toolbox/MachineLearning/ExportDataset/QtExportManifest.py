@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ExportManifest:
+    """
+    Records what was exported to a dataset directory, so a re-export only touches images whose
+    annotations or source file changed, and images keep the split they were first exported to.
+
+    Stored as export_manifest.json in the dataset directory, mapping each source image path to:
+        split: Split directory name (e.g. 'train')
+        mtime, size: Modification time and size of the source image
+        hash: Hash of the image's label file content
+        label_path, image_path: Files written for the image (relative to the dataset directory)
+
+    :param output_dir: Path to the dataset directory
+    """
+    filename = "export_manifest.json"
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, self.filename)
+        self.entries = {}
+        self.exported = set()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f).get('images', {})
+            except Exception as e:
+                print(f"Warning: Failed to read the export manifest, exporting everything\n{e}")
+                self.entries = {}
+
+    def __contains__(self, image_path):
+        return image_path in self.entries
+
+    def get_split(self, image_path):
+        """Get the split an image was exported to, or None."""
+        entry = self.entries.get(image_path)
+        return entry['split'] if entry else None
+
+    @staticmethod
+    def get_hash(lines):
+        """Hash the content of a label file."""
+        return hashlib.sha1("\n".join(lines).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get_source_stat(image_path):
+        """Get the (mtime, size) of a source image."""
+        stat = os.stat(image_path)
+        return stat.st_mtime, stat.st_size
+
+    def is_unchanged(self, image_path, split, lines):
+        """
+        Check if an image was already exported to the split with the same labels from the same source file,
+        and its output files still exist.
+
+        :param image_path: Path to the source image
+        :param split: Split directory name
+        :param lines: YOLO label lines of the image
+        """
+        entry = self.entries.get(image_path)
+        if entry is None or entry['split'] != split or entry['hash'] != self.get_hash(lines):
+            return False
+
+        mtime, size = self.get_source_stat(image_path)
+        if entry['mtime'] != mtime or entry['size'] != size:
+            return False
+
+        return all(os.path.exists(os.path.join(self.output_dir, entry[key])) for key in ['label_path', 'image_path'])
+
+    def mark_exported(self, image_path):
+        """Mark an image as part of the current export (changed or not)."""
+        self.exported.add(image_path)
+
+    def update(self, image_path, split, lines, label_path, output_image_path):
+        """
+        Record an image written in the current export, removing the files of a previous export to another split.
+
+        :param image_path: Path to the source image
+        :param split: Split directory name
+        :param lines: YOLO label lines of the image
+        :param label_path: Path of the written label file
+        :param output_image_path: Path of the written image
+        """
+        previous = self.entries.get(image_path)
+        if previous is not None and previous['split'] != split:
+            self.remove_files(previous)
+
+        mtime, size = self.get_source_stat(image_path)
+        self.entries[image_path] = {
+            'split': split,
+            'mtime': mtime,
+            'size': size,
+            'hash': self.get_hash(lines),
+            'label_path': os.path.relpath(label_path, self.output_dir),
+            'image_path': os.path.relpath(output_image_path, self.output_dir),
+        }
+        self.mark_exported(image_path)
+
+    def discard(self, image_path):
+        """
+        Forget an image whose files failed to write (they may be missing or partial), so the next export
+        writes it again.
+        """
+        self.entries.pop(image_path, None)
+        self.exported.discard(image_path)
+
+    def remove_files(self, entry):
+        """Remove the files written for an entry."""
+        for key in ['label_path', 'image_path']:
+            path = os.path.join(self.output_dir, entry[key])
+            if os.path.lexists(path):
+                os.remove(path)
+
+    def prune(self):
+        """
+        Remove the files and entries of images that were not part of the current export (e.g. their
+        annotations were deleted).
+
+        :return: Number of images removed
+        """
+        stale = [image_path for image_path in self.entries if image_path not in self.exported]
+        for image_path in stale:
+            self.remove_files(self.entries.pop(image_path))
+
+        return len(stale)
+
+    def save(self):
+        """Write the manifest to the dataset directory."""
+        with open(self.path, 'w') as f:
+            json.dump({'version': 1, 'images': self.entries}, f, indent=1)
@@ -0,0 +1,177 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import os
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import rasterio
+
+from coralnet_toolbox.MachineLearning.Materialization import materialize
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def group_by_image(annotations):
+    """
+    Group annotations by image in a single pass.
+
+    :param annotations: List of annotations
+    :return: Dictionary mapping image paths to lists of annotations (in their original order)
+    """
+    grouped = defaultdict(list)
+    for annotation in annotations:
+        grouped[annotation.image_path].append(annotation)
+
+    return dict(grouped)
+
+
+def get_label_path(image_path, split_dir):
+    """Get the path of an image's YOLO label file in a split directory."""
+    text_file = os.path.splitext(os.path.basename(image_path))[0] + ".txt"
+    return os.path.join(split_dir, "labels", text_file)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ImageShapeCache:
+    """
+    Caches the (height, width) of images, read from the file header only once per image.
+    """
+    def __init__(self):
+        self.shapes = {}
+
+    def get(self, image_path):
+        """Get the (height, width) of an image."""
+        if image_path not in self.shapes:
+            with rasterio.open(image_path) as src:
+                self.shapes[image_path] = (src.height, src.width)
+
+        return self.shapes[image_path]
+
+    def prefetch(self, image_paths, num_workers=8):
+        """Read the shapes of the images not cached yet, in parallel."""
+        missing = [p for p in image_paths if p not in self.shapes]
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for image_path, shape in zip(missing, executor.map(self.read_shape, missing)):
+                self.shapes[image_path] = shape
+
+    @staticmethod
+    def read_shape(image_path):
+        with rasterio.open(image_path) as src:
+            return src.height, src.width
+
+
+class LabelWriter:
+    """
+    Writes YOLO label files (and places their images) for a split with a pool of threads, since the work
+    is dominated by file I/O.
+
+    :param num_workers: Number of writing threads
+    :param strategy: How images are placed into the split (see Materialization.STRATEGIES)
+    """
+    def __init__(self, num_workers=8, strategy="Copy"):
+        self.num_workers = num_workers
+        self.strategy = strategy
+
+    def write_image(self, image_path, lines, split_dir, copy_image=True):
+        """
+        Write the label file of an image, and place the image into the split.
+
+        :param image_path: Path to the image
+        :param lines: List of YOLO label lines
+        :param split_dir: Path to the split directory (with images/ and labels/)
+        :param copy_image: Whether to place the image
+        """
+        with open(get_label_path(image_path, split_dir), 'w') as f:
+            f.write("".join(f"{line}\n" for line in lines))
+
+        if copy_image:
+            materialize(image_path,
+                        os.path.join(split_dir, "images", os.path.basename(image_path)),
+                        self.strategy)
+
+    def write(self, labels, split_dir, copy_images=True, progress_callback=None):
+        """
+        Write the label files of a split.
+
+        :param labels: Dictionary mapping image paths to lists of YOLO label lines
+        :param split_dir: Path to the split directory
+        :param copy_images: Whether to place the images
+        :param progress_callback: Optional callable called once per written image
+        :return: List of the image paths that failed
+        """
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, self.num_workers)) as executor:
+            futures = {executor.submit(self.write_image, image_path, lines, split_dir, copy_images): image_path
+                       for image_path, lines in labels.items()}
+
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"{futures[future]} generated an exception: {e}")
+                    failed.append(futures[future])
+
+                if progress_callback is not None:
+                    progress_callback()
+
+        return failed
+
+
+def benchmark(num_images=10000, num_polygons=1000000, num_points=16, num_workers=8):
+    """
+    Time grouping, formatting and writing YOLO segmentation labels for a synthetic dataset, without images.
+
+    :param num_images: Number of images
+    :param num_polygons: Number of polygons, spread randomly across the images
+    :param num_points: Number of points per polygon
+    :param num_workers: Number of writing threads
+    :return: Dictionary of timings in seconds
+    """
+    class Polygon:
+        __slots__ = ('image_path', 'cls', 'points')
+
+        def __init__(self, image_path, cls, points):
+            self.image_path = image_path
+            self.cls = cls
+            self.points = points
+
+    rng = np.random.default_rng(0)
+    image_ids = rng.integers(0, num_images, num_polygons)
+    points = rng.random((num_polygons, num_points, 2), dtype=np.float32)
+    polygons = [Polygon(f"image_{i}.jpg", int(i % 10), p) for i, p in zip(image_ids, points)]
+
+    timings = {}
+
+    start = time.perf_counter()
+    grouped = group_by_image(polygons)
+    timings['group'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = {image_path: [f"{a.cls} " + " ".join(f"{x} {y}" for x, y in a.points.tolist()) for a in group]
+              for image_path, group in grouped.items()}
+    timings['format'] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as split_dir:
+        os.makedirs(os.path.join(split_dir, "labels"))
+        start = time.perf_counter()
+        LabelWriter(num_workers).write(labels, split_dir, copy_images=False)
+        timings['write'] = time.perf_counter() - start
+
+    timings['total'] = timings['group'] + timings['format'] + timings['write']
+    return timings
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,375 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import io
+import os
+import json
+import tarfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+import rasterio
+
+from rasterio.windows import Window
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def prepare_patch(data):
+    """
+    Convert a window read by rasterio to an 8-bit BGR (or grayscale) image for encoding, with the same
+    normalization used when annotations are cropped for display.
+
+    :param data: Array of shape (C, H, W)
+    :return: Array of shape (H, W, 3) or (H, W)
+    """
+    if data.dtype != np.uint8:
+        data = ((data - data.min()) / max(data.max() - data.min(), 1e-12) * 255).astype(np.uint8)
+
+    if data.shape[0] == 1:
+        return data[0]
+
+    # Drop the alpha channel, and swap RGB to the BGR order expected by OpenCV
+    return np.ascontiguousarray(data[:3].transpose(1, 2, 0)[..., ::-1])
+
+
+def encode_patch(patch, output_path, image_format, quality):
+    """
+    Encode a patch; JPEG encoding falls back to PNG if it fails.
+
+    :param patch: Image array
+    :param output_path: Path (or key) of the output
+    :param image_format: 'jpg' or 'png'
+    :param quality: JPEG quality
+    :return: (output path with the extension actually used, encoded bytes)
+    """
+    if image_format == 'jpg':
+        ok, buffer = cv2.imencode(".jpg", patch, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if not ok:
+            print(f"ERROR: Issue encoding image {output_path}, saving as PNG")
+            output_path = os.path.splitext(output_path)[0] + ".png"
+            ok, buffer = cv2.imencode(".png", patch)
+    else:
+        ok, buffer = cv2.imencode(".png", patch)
+
+    if not ok:
+        raise ValueError(f"Failed to encode {output_path}")
+
+    return output_path, buffer.tobytes()
+
+
+def encode_and_write(patch, output_path, image_format, quality):
+    """
+    Encode a patch and write it atomically (to a temporary file that is renamed), so an interrupted
+    export never leaves a partial file behind.
+
+    :param patch: Image array
+    :param output_path: Path of the output file
+    :param image_format: 'jpg' or 'png'
+    :param quality: JPEG quality
+    :return: Path of the written file
+    """
+    output_path, data = encode_patch(patch, output_path, image_format, quality)
+
+    temp_path = output_path + ".part"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, output_path)
+
+    return output_path
+
+
+def read_patch(src, left, top, right, bottom):
+    """
+    Read an annotation's window from an open image, the same window the annotation uses for its own
+    crop (clipped to the image).
+
+    :param src: Open rasterio dataset
+    :return: Image array for encoding
+    """
+    left, top = int(left), int(top)
+    window = Window(col_off=max(0, left),
+                    row_off=max(0, top),
+                    width=min(src.width - left, int(right - left)),
+                    height=min(src.height - top, int(bottom - top)))
+
+    return prepare_patch(src.read(window=window))
+
+
+def export_image_patches(image_path, jobs, image_format='jpg', quality=100, num_threads=4):
+    """
+    Export the patches of a single image; run in a worker process. The image is opened once and each
+    window is read directly, while encoding and writing happen concurrently in a small thread pool.
+    Patches whose output file already exists are skipped, so an interrupted export can be resumed.
+
+    :param image_path: Path to the image
+    :param jobs: List of (left, top, right, bottom, output path), in image coordinates
+    :param image_format: 'jpg' or 'png'
+    :param quality: JPEG quality
+    :param num_threads: Number of threads encoding and writing patches
+    :return: Dictionary with the number of patches written, skipped and failed
+    """
+    counts = {'written': 0, 'skipped': 0, 'failed': 0}
+
+    pending = []
+    with rasterio.open(image_path) as src, ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for left, top, right, bottom, output_path in jobs:
+            alternate_path = os.path.splitext(output_path)[0] + ".png"
+            if os.path.exists(output_path) or os.path.exists(alternate_path):
+                counts['skipped'] += 1
+                continue
+
+            try:
+                patch = read_patch(src, left, top, right, bottom)
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                pending.append(executor.submit(encode_and_write, patch, output_path, image_format, quality))
+            except Exception as e:
+                print(f"ERROR: Issue reading patch {output_path}: {e}")
+                counts['failed'] += 1
+
+        for future in pending:
+            try:
+                future.result()
+                counts['written'] += 1
+            except Exception as e:
+                print(f"ERROR: Issue saving patch: {e}")
+                counts['failed'] += 1
+
+    return counts
+
+
+def encode_image_patches(image_path, jobs, image_format='jpg', quality=100):
+    """
+    Read and encode the patches of a single image in memory, for writing to shards; run in a worker process.
+
+    :param image_path: Path to the image
+    :param jobs: List of (left, top, right, bottom, key)
+    :param image_format: 'jpg' or 'png'
+    :param quality: JPEG quality
+    :return: List of (key, encoded bytes)
+    """
+    encoded = []
+    with rasterio.open(image_path) as src:
+        for left, top, right, bottom, key in jobs:
+            try:
+                encoded.append(encode_patch(read_patch(src, left, top, right, bottom), key, image_format, quality))
+            except Exception as e:
+                print(f"ERROR: Issue encoding patch {key}: {e}")
+
+    return encoded
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ShardWriter:
+    """
+    Writes encoded patches into uncompressed tar shards (readable by WebDataset and tar itself) and keeps
+    an index of where each patch's bytes are, so a dataset can read any patch with a single seek.
+
+    The output directory holds shard-000000.tar, ..., plus:
+        index.npy: int64 array of (shard, offset, size, class) per patch
+        index.json: {'classes': [...], 'shards': [...], 'keys': [...]}
+
+    :param output_dir: Directory the shards are written to
+    :param max_shard_size: Size in bytes after which a new shard is started
+    """
+    def __init__(self, output_dir, max_shard_size=512 * 1024 ** 2):
+        self.output_dir = output_dir
+        self.max_shard_size = max_shard_size
+
+        self.shards = []
+        self.classes = {}
+        self.keys = []
+        self.index = []
+        self.tar = None
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    def open_shard(self):
+        """Close the current shard and start a new one."""
+        if self.tar is not None:
+            self.tar.close()
+
+        name = f"shard-{len(self.shards):06d}.tar"
+        self.shards.append(name)
+        self.tar = tarfile.open(os.path.join(self.output_dir, name), 'w')
+
+    def write(self, key, class_name, data):
+        """
+        Add an encoded patch to the current shard.
+
+        :param key: Name of the patch in the shard (e.g. label/label_id.jpg)
+        :param class_name: Class of the patch
+        :param data: Encoded bytes
+        """
+        if self.tar is None or self.tar.offset >= self.max_shard_size:
+            self.open_shard()
+
+        info = tarfile.TarInfo(name=key)
+        info.size = len(data)
+        self.tar.addfile(info, io.BytesIO(data))
+
+        # The data is followed by padding to the next 512-byte block
+        padded_size = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        offset = self.tar.offset - padded_size
+
+        class_idx = self.classes.setdefault(class_name, len(self.classes))
+        self.index.append((len(self.shards) - 1, offset, len(data), class_idx))
+        self.keys.append(key)
+
+    def close(self):
+        """Close the last shard and write the index."""
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+        np.save(os.path.join(self.output_dir, "index.npy"), np.array(self.index, dtype=np.int64).reshape(-1, 4))
+        with open(os.path.join(self.output_dir, "index.json"), 'w') as f:
+            json.dump({'classes': list(self.classes), 'shards': self.shards, 'keys': self.keys}, f)
+
+
+class PatchExporter:
+    """
+    Exports annotation patches to image files in parallel: each image's windows are read by a worker
+    process and encoded from arrays directly, with no QPixmaps involved. Files that already exist are
+    skipped, so re-running an interrupted export only writes what is missing.
+
+    :param num_workers: Number of worker processes
+    :param image_format: 'jpg' or 'png'
+    :param quality: JPEG quality
+    """
+    def __init__(self, num_workers=4, image_format='jpg', quality=100):
+        self.num_workers = num_workers
+        self.image_format = image_format
+        self.quality = quality
+
+    @staticmethod
+    def get_window(annotation):
+        """
+        Get the window an annotation is cropped from, as (left, top, right, bottom) in image coordinates.
+
+        :param annotation: Patch, Rectangle or Polygon annotation
+        :return: Tuple of floats
+        """
+        if hasattr(annotation, 'center_xy'):
+            half_size = annotation.annotation_size / 2
+            left = int(annotation.center_xy.x()) - half_size
+            top = int(annotation.center_xy.y()) - half_size
+            return left, top, left + annotation.annotation_size, top + annotation.annotation_size
+
+        annotation.set_cropped_bbox()
+        return tuple(annotation.cropped_bbox)
+
+    def create_jobs(self, annotations, get_output_path):
+        """
+        Group the patches to export by image.
+
+        :param annotations: List of annotations
+        :param get_output_path: Callable taking an annotation and returning its output path (without extension)
+        :return: Dictionary mapping image paths to lists of (left, top, right, bottom, output path)
+        """
+        jobs = {}
+        for annotation in annotations:
+            output_path = f"{get_output_path(annotation)}.{self.image_format}"
+            jobs.setdefault(annotation.image_path, []).append((*self.get_window(annotation), output_path))
+
+        return jobs
+
+    def export_shards(self, jobs, output_dir, get_class_name, progress_callback=None, is_canceled=None):
+        """
+        Export the patches into tar shards instead of individual files. Workers read and encode the
+        patches of each image, and the shards are written sequentially by this process. Any shards
+        from a previous export to the same directory are replaced.
+
+        :param jobs: Dictionary from create_jobs, with keys relative to the shard (e.g. label/label_id)
+        :param output_dir: Directory the shards are written to
+        :param get_class_name: Callable taking a key and returning its class name
+        :param progress_callback: Optional callable called once per finished image
+        :param is_canceled: Optional callable returning True to stop
+        :return: Dictionary with the number of patches written and failed
+        """
+        totals = {'written': 0, 'skipped': 0, 'failed': 0}
+
+        if os.path.isdir(output_dir):
+            for name in os.listdir(output_dir):
+                if name.startswith("shard-") or name.startswith("index."):
+                    os.remove(os.path.join(output_dir, name))
+
+        writer = ShardWriter(output_dir)
+
+        with ProcessPoolExecutor(max_workers=max(1, self.num_workers)) as executor:
+            futures = {executor.submit(encode_image_patches,
+                                       image_path,
+                                       image_jobs,
+                                       self.image_format,
+                                       self.quality): image_path
+                       for image_path, image_jobs in jobs.items()}
+
+            for future in as_completed(futures):
+                image_jobs = jobs[futures[future]]
+                try:
+                    encoded = future.result()
+                    for key, data in encoded:
+                        writer.write(key, get_class_name(key), data)
+                    totals['written'] += len(encoded)
+                    totals['failed'] += len(image_jobs) - len(encoded)
+                except Exception as e:
+                    print(f"{futures[future]} generated an exception: {e}")
+                    totals['failed'] += len(image_jobs)
+
+                if progress_callback is not None:
+                    progress_callback()
+
+                if is_canceled is not None and is_canceled():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+        writer.close()
+
+        return totals
+
+    def export(self, jobs, progress_callback=None, is_canceled=None):
+        """
+        Export the patches, one image per task in the process pool.
+
+        :param jobs: Dictionary from create_jobs
+        :param progress_callback: Optional callable called once per finished image
+        :param is_canceled: Optional callable returning True to stop submitting work
+        :return: Dictionary with the number of patches written, skipped and failed
+        """
+        totals = {'written': 0, 'skipped': 0, 'failed': 0}
+
+        with ProcessPoolExecutor(max_workers=max(1, self.num_workers)) as executor:
+            futures = {executor.submit(export_image_patches,
+                                       image_path,
+                                       image_jobs,
+                                       self.image_format,
+                                       self.quality): image_path
+                       for image_path, image_jobs in jobs.items()}
+
+            for future in as_completed(futures):
+                try:
+                    for key, value in future.result().items():
+                        totals[key] += value
+                except Exception as e:
+                    print(f"{futures[future]} generated an exception: {e}")
+                    totals['failed'] += len(jobs[futures[future]])
+
+                if progress_callback is not None:
+                    progress_callback()
+
+                if is_canceled is not None and is_canceled():
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+        return totals
@@ -5,12 +5,10 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 import os
 import yaml
-import shutil
 
 from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QLabel)
 
 from coralnet_toolbox.MachineLearning.ExportDataset.QtBase import Base
-from coralnet_toolbox.QtProgressBar import ProgressBar
 from coralnet_toolbox.Icons import get_icon
 
 
@@ -102,39 +100,7 @@ class Segment(Base):
             split_dir (str): Path to the split directory.
             split (str): Split name (e.g., "Training", "Validation", "Testing").
         """
-        # Get unique image paths
-        image_paths = list(set(a.image_path for a in annotations))
-        if not image_paths:
-            return
-
-        progress_bar = ProgressBar(self, title=f"Creating {split} Dataset")
-        progress_bar.show()
-        progress_bar.start_progress(len(image_paths))
-
-        for image_path in image_paths:
-            yolo_annotations = []
-            image_height, image_width = self.image_window.rasterio_open(image_path).shape
-            image_annotations = [a for a in annotations if a.image_path == image_path]
-
-            for image_annotation in image_annotations:
-                class_label, annotation = image_annotation.to_yolo_segmentation(image_width, image_height)
-                class_number = self.selected_labels.index(class_label)
-                yolo_annotations.append(f"{class_number} {annotation}")
-
-            # Save the annotations to a text file
-            file_ext = image_path.split(".")[-1]
-            text_file = os.path.basename(image_path).replace(f".{file_ext}", ".txt")
-            text_path = os.path.join(f"{split_dir}/labels", text_file)
-
-            # Write the annotations to the text file
-            with open(text_path, 'w') as f:
-                for annotation in yolo_annotations:
-                    f.write(annotation + '\n')
-
-            # Copy the image to the split directory
-            shutil.copy(image_path, f"{split_dir}/images/{os.path.basename(image_path)}")
-
-            progress_bar.update_progress()
-
-        progress_bar.stop_progress()
-        progress_bar.close()
\ No newline at end of file
+        self.write_yolo_split(annotations,
+                              split_dir,
+                              split,
+                              lambda annotation, width, height: annotation.to_yolo_segmentation(width, height))
\ No newline at end of file
@@ -0,0 +1,114 @@
+import numpy as np
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def build_count_matrix(image_paths, annotations, labels):
+    """
+    Count the annotations of each label on each image in a single pass.
+
+    Images are sorted by path, so the matrix (and any split solved from it) does not depend on the order
+    the images were loaded or displayed in.
+
+    :param image_paths: List of image paths (images without annotations are kept as empty rows)
+    :param annotations: List of annotations
+    :param labels: List of label short codes, one column each
+    :return: (sorted image paths, dictionary mapping image paths to rows, (images, labels) int64 count matrix)
+    """
+    images = sorted(set(image_paths).union(a.image_path for a in annotations))
+    image_index = {image_path: i for i, image_path in enumerate(images)}
+    label_index = {label: j for j, label in enumerate(labels)}
+
+    rows, columns = [], []
+    for annotation in annotations:
+        column = label_index.get(annotation.label.short_label_code)
+        if column is not None:
+            rows.append(image_index[annotation.image_path])
+            columns.append(column)
+
+    counts = np.zeros((len(images), len(labels)), dtype=np.int64)
+    np.add.at(counts, (np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64)), 1)
+
+    return images, image_index, counts
+
+
+def stratified_split(counts, ratios, seed=0):
+    """
+    Assign images to splits so each label's annotations are divided by the ratios, as closely as
+    whole images allow (iterative stratification, Sechidis et al. 2011).
+
+    Labels are handled from the rarest to the most common: each image holding the current label goes
+    to the split that most lacks that label, ties broken by the split that most lacks images, then at
+    random. Images without annotations fill the remaining image quotas. Splits with a ratio of 0 get
+    no images. The same counts, ratios and seed always give the same split.
+
+    :param counts: (images, labels) count matrix (see build_count_matrix)
+    :param ratios: Ratio of each split, e.g. (train, val, test)
+    :param seed: Seed of the tie-breaking
+    :return: (images,) array of split indices, -1 if every ratio is 0
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    ratios = np.asarray(ratios, dtype=np.float64)
+    num_images = counts.shape[0]
+
+    assignment = np.full(num_images, -1, dtype=np.int64)
+    active = ratios > 0
+    if not active.any() or num_images == 0:
+        return assignment
+
+    rng = np.random.default_rng(seed)
+    ratios = np.where(active, ratios, 0.0) / ratios[active].sum()
+
+    # Remaining number of annotations (per label) and images each split should still receive
+    label_demand = ratios[:, None] * counts.sum(axis=0)[None, :]
+    image_demand = ratios * num_images
+    inactive = ~active
+
+    def choose(demand, tie_break):
+        """Index of the active split with the largest demand, ties broken by tie_break then at random."""
+        demand = np.where(inactive, -np.inf, demand)
+        best = np.flatnonzero(demand == demand.max())
+        if len(best) > 1:
+            best = best[tie_break[best] == tie_break[best].max()]
+        return int(best[rng.integers(len(best))]) if len(best) > 1 else int(best[0])
+
+    pending = counts.sum(axis=1) > 0
+    remaining = counts[pending].sum(axis=0)
+
+    while pending.any():
+        # The rarest label still on unassigned images
+        label = int(np.argmin(np.where(remaining > 0, remaining, np.iinfo(np.int64).max)))
+        images = np.flatnonzero(pending & (counts[:, label] > 0))
+        images = images[rng.permutation(len(images))]
+
+        for i in images:
+            split = choose(label_demand[:, label], image_demand)
+            assignment[i] = split
+            label_demand[split] -= counts[i]
+            image_demand[split] -= 1
+
+        pending[images] = False
+        remaining -= counts[images].sum(axis=0)
+
+    for i in rng.permutation(np.flatnonzero(assignment < 0)):
+        split = choose(image_demand, ratios)
+        assignment[i] = split
+        image_demand[split] -= 1
+
+    return assignment
+
+
+def count_split_labels(counts, image_index, split_images):
+    """
+    Sum the label counts of the images in a split.
+
+    :param counts: (images, labels) count matrix
+    :param image_index: Dictionary mapping image paths to rows of the matrix
+    :param split_images: Iterable of image paths in the split
+    :return: (labels,) int64 array
+    """
+    rows = np.fromiter((image_index[p] for p in split_images if p in image_index), dtype=np.int64)
+    return counts[rows].sum(axis=0)
@@ -4,22 +4,27 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 import uuid
 import yaml
-import glob
 import json
 import os
 import random
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt5.QtGui import QColor
 from PyQt5.QtCore import Qt, QPointF
 from PyQt5.QtWidgets import (QFileDialog, QApplication, QMessageBox, QVBoxLayout,
                              QLabel, QLineEdit, QDialog, QHBoxLayout, QPushButton, QDialogButtonBox, QGroupBox,
-                             QButtonGroup, QRadioButton, QGridLayout)
+                             QButtonGroup, QRadioButton, QGridLayout, QComboBox)
 
 from coralnet_toolbox.Annotations.QtPatchAnnotation import PatchAnnotation
 from coralnet_toolbox.Annotations.QtPolygonAnnotation import PolygonAnnotation
 from coralnet_toolbox.Annotations.QtRectangleAnnotation import RectangleAnnotation
 
+from coralnet_toolbox.MachineLearning.Materialization import STRATEGIES, REFERENCE
+from coralnet_toolbox.MachineLearning.Materialization import materialize, write_manifest
+from coralnet_toolbox.MachineLearning.ImportDataset.QtLabelReader import (LabelReader, find_image_label_pairs,
+                                                                         to_pixel_boxes)
+from coralnet_toolbox.MachineLearning.ExportDataset.QtLabelWriter import ImageShapeCache
+
 from coralnet_toolbox.QtProgressBar import ProgressBar
 from coralnet_toolbox.Icons import get_icon
 
@@ -105,6 +110,12 @@ class Base(QDialog):
         self.output_folder_name.setPlaceholderText("data")
         layout.addWidget(self.output_folder_name, 1, 1, 1, 2)
 
+        # How images are placed into the output folder, or referenced where they are
+        layout.addWidget(QLabel("Image Files:"), 2, 0)
+        self.materialization_combo = QComboBox()
+        self.materialization_combo.addItems(STRATEGIES + [REFERENCE])
+        layout.addWidget(self.materialization_combo, 2, 1, 1, 2)
+
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
 
@@ -185,33 +196,42 @@ class Base(QDialog):
         dir_path = os.path.dirname(self.yaml_path_label.text())
         class_names = data.get('names', [])
 
-        # Collect all images from the train, valid, and test folders
-        image_paths = glob.glob(f"{dir_path}/**/images/*.*", recursive=True)
-        label_paths = glob.glob(f"{dir_path}/**/labels/*.txt", recursive=True)
+        # Pair each label file with its image (train, valid, and test folders)
+        image_label_paths = find_image_label_pairs(dir_path)
 
-        if not image_paths or not label_paths:
+        if not image_label_paths:
+            QApplication.restoreOverrideCursor()
             QMessageBox.warning(self,
                                 "No Images or Labels Found",
                                 "No images or labels were found in the specified directories.")
             return
 
-        # Check that each label file has a corresponding image file
-        image_label_paths = {}
-
-        for label_path in label_paths:
-            # Create the image path from the label path
-            src_image_path = label_path.replace('labels', 'images').replace('.txt', '.jpg')
-            if src_image_path in image_paths:
-                # Copy the image to the output folder
-                image_path = f"{output_folder}/images/{os.path.basename(src_image_path)}"
-                shutil.copy(src_image_path, image_path)
-                # Reformat paths
-                label_path = label_path.replace("\\", "/")
-                image_path = image_path.replace("\\", "/")
-                # Add to the dict, and add the image to the image window
-                image_label_paths[image_path] = label_path
-                self.main_window.image_window.add_image(image_path)
+        strategy = self.materialization_combo.currentText()
+
+        def place_image(src_image_path):
+            if strategy == REFERENCE:
+                # Use the image where it is
+                return os.path.abspath(src_image_path).replace("\\", "/")
+            # Place the image in the output folder
+            image_path = f"{output_folder}/images/{os.path.basename(src_image_path)}"
+            materialize(src_image_path, image_path, strategy)
+            return image_path.replace("\\", "/")
+
+        src_image_paths = list(image_label_paths.keys())
+        label_paths = [image_label_paths[p].replace("\\", "/") for p in src_image_paths]
+
+        # Place the images, read the labels, and read the image sizes (from the headers) in parallel
+        image_shapes = ImageShapeCache()
+        with ThreadPoolExecutor() as executor:
+            image_paths = list(executor.map(place_image, src_image_paths))
+        image_shapes.prefetch(src_image_paths)
+
+        if strategy == REFERENCE:
+            # Keep a list of the referenced images with the output
+            write_manifest(image_paths, f"{output_folder}/images.txt")
 
+        # Add the images to the image window at once
+        self.main_window.image_window.add_images(image_paths)
         # Update filtered images
         self.main_window.image_window.filter_images()
         # Set the last image as the current image
@@ -226,101 +246,91 @@ class Base(QDialog):
         else:
             raise ValueError("No annotation type selected")
 
+        reader = LabelReader(task='detect' if annotation_type == 'RectangleAnnotation' else 'segment')
+        labels = reader.read(label_paths)
+
         # Process the annotations based on the selected type
         progress_bar = ProgressBar(self, title=f"Importing YOLO Dataset")
         progress_bar.show()
-        progress_bar.start_progress(len(image_label_paths))
+        progress_bar.start_progress(len(image_paths))
+
+        # Labels are resolved once per class
+        class_labels = {}
+
+        def get_label(class_id):
+            if class_id not in class_labels:
+                short_label_code = long_label_code = class_names[class_id]
+                existing_label = self.main_window.label_window.get_label_by_short_code(short_label_code)
+
+                if existing_label:
+                    color = existing_label.color
+                    label_id = existing_label.id
+                else:
+                    label_id = str(uuid.uuid4())
+                    color = QColor(random.randint(0, 255),
+                                   random.randint(0, 255),
+                                   random.randint(0, 255))
+
+                    self.main_window.label_window.add_label_if_not_exists(short_label_code,
+                                                                          long_label_code,
+                                                                          color,
+                                                                          label_id)
+
+                class_labels[class_id] = (short_label_code, long_label_code, color, label_id)
+
+            return class_labels[class_id]
 
         try:
             annotations = []
+            image_annotations = {}
+            transparency = self.main_window.get_transparency_value()
 
-            for image_path, label_path in image_label_paths.items():
-
-                # Read the label file
-                image_height, image_width = self.main_window.image_window.rasterio_open(image_path).shape
-
-                with open(label_path, 'r') as file:
-                    lines = file.readlines()
-
-                for line in lines:
-                    if annotation_type == 'RectangleAnnotation':
-                        class_id, x_center, y_center, width, height = map(float, line.split())
-                        x_center, y_center, width, height = (x_center * image_width,
-                                                             y_center * image_height,
-                                                             width * image_width,
-                                                             height * image_height)
-
-                        top_left = QPointF(x_center - width / 2, y_center - height / 2)
-                        bottom_right = QPointF(x_center + width / 2, y_center + height / 2)
-
-                        class_name = class_names[int(class_id)]
-                        short_label_code = long_label_code = class_name
-                        existing_label = self.main_window.label_window.get_label_by_short_code(short_label_code)
-
-                        if existing_label:
-                            color = existing_label.color
-                            label_id = existing_label.id
-                        else:
-                            label_id = str(uuid.uuid4())
-                            color = QColor(random.randint(0, 255),
-                                           random.randint(0, 255),
-                                           random.randint(0, 255))
-
-                            self.main_window.label_window.add_label_if_not_exists(short_label_code,
-                                                                                  long_label_code,
-                                                                                  color,
-                                                                                  label_id)
-
-                        annotation = RectangleAnnotation(top_left,
-                                                         bottom_right,
+            for image_path, src_image_path, label in zip(image_paths, src_image_paths, labels):
+                if label is None:
+                    progress_bar.update_progress()
+                    continue
+
+                image_height, image_width = image_shapes.get(src_image_path)
+                classes, shapes = label
+                image_annotations[image_path] = []
+
+                if annotation_type == 'RectangleAnnotation':
+                    # Convert all boxes of the image at once
+                    boxes = to_pixel_boxes(shapes, image_width, image_height).tolist()
+                    for class_id, (x1, y1, x2, y2) in zip(classes.tolist(), boxes):
+                        short_label_code, long_label_code, color, label_id = get_label(class_id)
+                        annotation = RectangleAnnotation(QPointF(x1, y1),
+                                                         QPointF(x2, y2),
                                                          short_label_code,
                                                          long_label_code,
                                                          color,
                                                          image_path,
                                                          label_id,
-                                                         self.main_window.get_transparency_value(),
+                                                         transparency,
                                                          show_msg=False)
-
-                    else:
-                        class_id, *points = map(float, line.split())
-                        points = [QPointF(x * image_width, y * image_height) for x, y in zip(points[::2], points[1::2])]
-
-                        class_name = class_names[int(class_id)]
-                        short_label_code = long_label_code = class_name
-                        existing_label = self.main_window.label_window.get_label_by_short_code(short_label_code)
-
-                        if existing_label:
-                            color = existing_label.color
-                            label_id = existing_label.id
-                        else:
-                            label_id = str(uuid.uuid4())
-                            color = QColor(random.randint(0, 255),
-                                           random.randint(0, 255),
-                                           random.randint(0, 255))
-
-                            self.main_window.label_window.add_label_if_not_exists(short_label_code,
-                                                                                  long_label_code,
-                                                                                  color,
-                                                                                  label_id)
-
+                        image_annotations[image_path].append(annotation)
+                else:
+                    for class_id, polygon in zip(classes.tolist(), shapes):
+                        points = [QPointF(x, y) for x, y in (polygon * (image_width, image_height)).tolist()]
+                        short_label_code, long_label_code, color, label_id = get_label(class_id)
                         annotation = PolygonAnnotation(points,
                                                        short_label_code,
                                                        long_label_code,
                                                        color,
                                                        image_path,
                                                        label_id,
-                                                       self.main_window.get_transparency_value(),
+                                                       transparency,
                                                        show_msg=False)
+                        image_annotations[image_path].append(annotation)
 
-                    # Add the annotation to the list for export
-                    annotations.append(annotation)
+                annotations.extend(image_annotations[image_path])
+                progress_bar.update_progress()
 
-                    # Add annotation to the dict
-                    self.annotation_window.annotations_dict[annotation.id] = annotation
-                    progress_bar.update_progress()
+            # Add the annotations to the dict at once
+            self.annotation_window.annotations_dict.update({a.id: a for a in annotations})
 
-                # Update the image window's image dict
-                self.main_window.image_window.update_image_annotations(image_path)
+            # Update the image window's image dict, counting the images' existing annotations too
+            self.main_window.image_window.update_images_annotations(list(image_annotations))
 
             # Load the annotations for current image
             self.annotation_window.load_annotations()
@@ -0,0 +1,249 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def check_rows(rows):
+    """
+    Check rows of a YOLO label file have a non-negative integer class index and finite values.
+
+    :param rows: (n, k) array of rows
+    :raises ValueError: If a row is invalid
+    """
+    classes = rows[:, 0]
+    if not np.isfinite(rows).all() or (classes < 0).any() or (classes != np.floor(classes)).any():
+        raise ValueError("Invalid class index or non-finite value")
+
+
+def parse_rows(text):
+    """
+    Parse the rows of a YOLO label file, which may have different lengths: a box (class x y w h) or a
+    polygon (class followed by at least three x y points).
+
+    :param text: Content of the label file
+    :return: List of float32 arrays, one per non-empty row
+    :raises ValueError: If a row is malformed, so a bad file is not partially imported
+    """
+    rows = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            row = np.array(line.split(), dtype=np.float32)
+            if len(row) != 5 and (len(row) < 7 or len(row) % 2 == 0):
+                raise ValueError(f"Expected 5 values or a class and x y points, got {len(row)} values")
+            check_rows(row[None])
+        except ValueError as e:
+            raise ValueError(f"Line {number}: {e}") from e
+        rows.append(row)
+
+    return rows
+
+
+def read_boxes(label_path):
+    """
+    Read a YOLO detection label file. Files with a fixed number of values per row are parsed in a single
+    NumPy call; rows with polygons (as Ultralytics accepts for detection) are converted to their boxes.
+
+    :param label_path: Path to the label file
+    :return: (classes as an (n,) int64 array, normalized xywh boxes as an (n, 4) float32 array)
+    :raises ValueError: If the file is malformed
+    """
+    with open(label_path, 'r') as f:
+        text = f.read()
+
+    if not text.strip():
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype=np.float32)
+
+    try:
+        values = np.loadtxt(io.StringIO(text), dtype=np.float32, ndmin=2)
+    except ValueError:
+        # Rows of different lengths (or malformed rows, reported below)
+        values = None
+
+    if values is not None and values.shape[1] == 5:
+        check_rows(values)
+        return values[:, 0].astype(np.int64), values[:, 1:]
+
+    classes, boxes = [], []
+    for row in parse_rows(text):
+        if len(row) == 5:
+            boxes.append(row[1:])
+        else:
+            points = row[1:].reshape(-1, 2)
+            (x_min, y_min), (x_max, y_max) = points.min(axis=0), points.max(axis=0)
+            boxes.append([(x_min + x_max) / 2, (y_min + y_max) / 2, x_max - x_min, y_max - y_min])
+        classes.append(int(row[0]))
+
+    return np.array(classes, dtype=np.int64), np.array(boxes, dtype=np.float32).reshape(-1, 4)
+
+
+def read_polygons(label_path):
+    """
+    Read a YOLO segmentation label file. Rows with a box are converted to its four corners.
+
+    :param label_path: Path to the label file
+    :return: (classes as an (n,) int64 array, list of normalized (k, 2) float32 polygons)
+    :raises ValueError: If the file is malformed
+    """
+    with open(label_path, 'r') as f:
+        rows = parse_rows(f.read())
+
+    classes, polygons = [], []
+    for row in rows:
+        if len(row) == 5:
+            x, y, w, h = row[1:]
+            points = np.array([[x - w / 2, y - h / 2],
+                               [x + w / 2, y - h / 2],
+                               [x + w / 2, y + h / 2],
+                               [x - w / 2, y + h / 2]], dtype=np.float32)
+        else:
+            points = row[1:].reshape(-1, 2)
+        classes.append(int(row[0]))
+        polygons.append(points)
+
+    return np.array(classes, dtype=np.int64), polygons
+
+
+def to_pixel_boxes(boxes, width, height):
+    """
+    Convert normalized xywh boxes to pixel xyxy boxes.
+
+    :param boxes: (n, 4) normalized xywh boxes
+    :param width: Image width
+    :param height: Image height
+    :return: (n, 4) float64 array
+    """
+    boxes = boxes.astype(np.float64)
+    xy, wh = boxes[:, :2], boxes[:, 2:]
+    scale = np.array([width, height], dtype=np.float64)
+    return np.hstack(((xy - wh / 2) * scale, (xy + wh / 2) * scale))
+
+
+def find_image_label_pairs(dir_path):
+    """
+    Pair the images of a YOLO dataset with their label files (same name, images/ -> labels/).
+
+    :param dir_path: Directory of the dataset (containing data.yaml)
+    :return: Dictionary mapping image paths to label paths, sorted by image path
+    """
+    images, labels = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+
+    image_paths = {}
+    label_paths = []
+    for root, _, names in os.walk(dir_path):
+        parts = root.split(os.sep)
+        for name in names:
+            path = os.path.join(root, name)
+            if 'images' in parts and not name.endswith('.txt'):
+                image_paths[os.path.splitext(path)[0]] = path
+            elif 'labels' in parts and name.endswith('.txt'):
+                label_paths.append(path)
+
+    pairs = {}
+    for label_path in label_paths:
+        image_path = image_paths.get(os.path.splitext(images.join(label_path.rsplit(labels, 1)))[0])
+        if image_path is not None:
+            pairs[image_path] = label_path
+
+    return dict(sorted(pairs.items()))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class LabelReader:
+    """
+    Reads YOLO label files with a pool of threads, since the work is dominated by file I/O.
+
+    :param task: 'detect' (boxes) or 'segment' (polygons)
+    :param num_workers: Number of reading threads
+    """
+    def __init__(self, task='detect', num_workers=8):
+        self.task = task
+        self.num_workers = num_workers
+
+    def read(self, label_paths):
+        """
+        Read label files.
+
+        :param label_paths: List of label file paths
+        :return: List of (classes, boxes or polygons), in the same order; None for files that failed or are
+            malformed (reported with a warning rather than partially imported)
+        """
+        read_file = read_boxes if self.task == 'detect' else read_polygons
+
+        def read_label(label_path):
+            try:
+                return read_file(label_path)
+            except Exception as e:
+                print(f"Warning: Failed to read {label_path}\n{e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, self.num_workers)) as executor:
+            return list(executor.map(read_label, label_paths))
+
+
+def benchmark(num_images=118287, num_boxes=860001, num_workers=8):
+    """
+    Time reading YOLO detection labels for a synthetic dataset the size of COCO train2017, line by line
+    (as ImportDataset used to) and with the LabelReader.
+
+    :param num_images: Number of label files
+    :param num_boxes: Number of boxes, spread randomly across the files
+    :param num_workers: Number of reading threads
+    :return: Dictionary of timings in seconds
+    """
+    rng = np.random.default_rng(0)
+    image_ids = rng.integers(0, num_images, num_boxes)
+    boxes = rng.random((num_boxes, 4), dtype=np.float32)
+    classes = rng.integers(0, 80, num_boxes)
+
+    timings = {}
+    with tempfile.TemporaryDirectory() as label_dir:
+        lines = [[] for _ in range(num_images)]
+        for i, c, box in zip(image_ids.tolist(), classes.tolist(), boxes.tolist()):
+            lines[i].append(f"{c} {box[0]:.6f} {box[1]:.6f} {box[2]:.6f} {box[3]:.6f}\n")
+
+        label_paths = []
+        for i, image_lines in enumerate(lines):
+            label_path = os.path.join(label_dir, f"{i:012d}.txt")
+            with open(label_path, 'w') as f:
+                f.write("".join(image_lines))
+            label_paths.append(label_path)
+
+        start = time.perf_counter()
+        for label_path in label_paths:
+            with open(label_path, 'r') as f:
+                for line in f.readlines():
+                    class_id, x_center, y_center, width, height = map(float, line.split())
+        timings['line_by_line'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        LabelReader('detect', num_workers=1).read(label_paths)
+        timings['numpy'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        LabelReader('detect', num_workers=num_workers).read(label_paths)
+        timings['numpy_threads'] = time.perf_counter() - start
+
+    return timings
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,108 @@
+import os
+import sys
+import shutil
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+# How image files are placed into a dataset; 'Reference' leaves them where they are and lists their paths
+STRATEGIES = ["Copy", "Hardlink", "Reflink", "Symlink"]
+REFERENCE = "Reference"
+
+# ioctl request that clones a file's extents on Linux (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def reflink(src, dst):
+    """
+    Create a copy-on-write clone of a file, sharing its data blocks until either file is modified.
+    Supported on Linux filesystems with FICLONE (btrfs, xfs) and on macOS (APFS).
+
+    :param src: Source file
+    :param dst: Destination file
+    :raises OSError: If the filesystem does not support cloning
+    """
+    if sys.platform.startswith("linux"):
+        import fcntl
+
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            try:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            except OSError:
+                d.close()
+                os.remove(dst)
+                raise
+        shutil.copystat(src, dst)
+
+    elif sys.platform == "darwin":
+        import ctypes
+
+        libc = ctypes.CDLL("libc.dylib", use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), dst)
+
+    else:
+        raise OSError(f"Reflinks are not supported on {sys.platform}")
+
+
+def materialize(src, dst, strategy="Copy"):
+    """
+    Place a file into a dataset using the given strategy. Links that cannot be created (e.g. hardlinks
+    across devices, reflinks on filesystems without copy-on-write, symlinks without permission) fall
+    back to a copy. An existing destination is replaced rather than written through, so a link left by
+    a previous run (e.g. to the source itself) is never copied onto.
+
+    Can be used as the copy_function of shutil.copytree.
+
+    :param src: Source file
+    :param dst: Destination file
+    :param strategy: One of STRATEGIES
+    :return: Path to the destination file
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return dst
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if strategy == "Copy":
+        return shutil.copy(src, dst)
+
+    try:
+        if strategy == "Hardlink":
+            os.link(src, dst)
+        elif strategy == "Reflink":
+            reflink(src, dst)
+        elif strategy == "Symlink":
+            os.symlink(os.path.abspath(src), dst)
+        else:
+            raise ValueError(f"Unknown materialization strategy: {strategy}")
+    except OSError as e:
+        print(f"Warning: {strategy} failed for {src}, copying instead\n{e}")
+        return shutil.copy(src, dst)
+
+    return dst
+
+
+def write_manifest(paths, manifest_path):
+    """
+    Write a list of (absolute) file paths, one per line.
+
+    :param paths: List of paths
+    :param manifest_path: Path of the manifest file
+    :return: Path of the manifest file
+    """
+    with open(manifest_path, 'w') as f:
+        f.write("".join(f"{os.path.abspath(path)}\n" for path in paths))
+
+    return manifest_path
@@ -4,13 +4,14 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 import json
 import os
-import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QFileDialog, QApplication, QMessageBox, QWidget, QVBoxLayout,
                              QLabel, QLineEdit, QDialog, QHBoxLayout, QPushButton,
-                             QDialogButtonBox, QFormLayout, QGroupBox, QScrollArea)
+                             QDialogButtonBox, QFormLayout, QGroupBox, QScrollArea, QComboBox)
+
+from coralnet_toolbox.MachineLearning.Materialization import STRATEGIES
+from coralnet_toolbox.MachineLearning.MergeDatasets.QtDatasetMerger import DatasetMerger
 
 from coralnet_toolbox.QtProgressBar import ProgressBar
 
@@ -90,6 +91,16 @@ class Base(QDialog):
         dir_layout.addWidget(output_dir_button)
         layout.addRow("Output Directory:", dir_layout)
 
+        # How image files are placed into the merged dataset
+        self.materialization_combo = QComboBox()
+        self.materialization_combo.addItems(STRATEGIES)
+        layout.addRow("Image Files:", self.materialization_combo)
+
+        # Keep identical images (same content) only once
+        self.deduplicate_combo = QComboBox()
+        self.deduplicate_combo.addItems(["True", "False"])
+        layout.addRow("Deduplicate Images:", self.deduplicate_combo)
+
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
     
@@ -265,61 +276,44 @@ class Base(QDialog):
         output_dir_path = os.path.join(self.output_dir, self.dataset_name)
         os.makedirs(output_dir_path, exist_ok=True)
 
-        merged_class_mapping = {}
-
-        def copy_directory(src, dest):
-            """
-            Copies contents from the source directory to the destination directory.
-
-            :param src: Source directory path.
-            :param dest: Destination directory path.
-            """
-            shutil.copytree(src, dest, dirs_exist_ok=True)
-
-        with ThreadPoolExecutor() as executor:
-            futures = []
-            for dir_path, class_mapping_path in self.valid_directories:
-                if self.task == 'classify':
-                    if class_mapping_path:
-                        try:
-                            with open(class_mapping_path, 'r') as json_file:
-                                class_mapping = json.load(json_file)
-                                merged_class_mapping.update(class_mapping)
-                        except Exception as e:
-                            print(f"Error reading class mapping: {e}")
-
-                        # Copy train, val, and test splits
-                        for split in ['train', 'val', 'test']:
-                            src_split_dir = os.path.join(dir_path, split)
-                            dest_split_dir = os.path.join(output_dir_path, split)
-                            if os.path.exists(src_split_dir):
-                                future = executor.submit(copy_directory, src_split_dir, dest_split_dir)
-                                futures.append(future)
-                else:
-                    QMessageBox.warning(self, "Warning", "Only Classification datasets merging has been implemented.")
-                    return
+        merger = DatasetMerger(output_dir_path,
+                               task=self.task,
+                               strategy=self.materialization_combo.currentText(),
+                               deduplicate=self.deduplicate_combo.currentText() == "True")
 
-            # Create and display a progress bar
-            progress_bar = ProgressBar(self, title="Merging Datasets")
-            progress_bar.show()
-            progress_bar.start_progress(len(futures))
+        # Only datasets with a class mapping are merged
+        datasets = [(d, c) for d, c in self.valid_directories if c]
+        planned = merger.prepare([d for d, _ in datasets])
 
-            # Wait for all copy operations to complete
-            for i, future in enumerate(as_completed(futures)):
-                future.result()
-                progress_bar.update_progress()
+        # Create and display a progress bar
+        progress_bar = ProgressBar(self, title="Merging Datasets")
+        progress_bar.show()
+        progress_bar.start_progress(len(planned))
 
-            # Close the progress bar
-            progress_bar.stop_progress()
-            progress_bar.close()
+        # Place the files in parallel
+        stats = merger.write(planned, progress_callback=progress_bar.update_progress)
 
-        # Save the merged class mapping if available
-        if merged_class_mapping:
-            merged_class_mapping_path = os.path.join(output_dir_path, "class_mapping.json")
-            with open(merged_class_mapping_path, 'w') as json_file:
-                json.dump(merged_class_mapping, json_file, indent=4)
+        # Close the progress bar
+        progress_bar.stop_progress()
+        progress_bar.close()
 
-        QMessageBox.information(self, "Success", "Datasets merged successfully!")
+        # Save the merged class mapping if available
+        merger.write_class_mapping([c for _, c in datasets])
+
+        message = (f"Datasets merged successfully!\n\n"
+                   f"Images: {stats.get('images', 0)}\n"
+                   f"Duplicates skipped: {stats.get('duplicates', 0)}\n"
+                   f"Renamed (name collisions): {stats.get('renamed', 0)}")
+        if stats.get('conflicting_duplicates'):
+            message += f"\nDuplicates skipped in another split: {stats['conflicting_duplicates']}"
+        if stats.get('cross_class_duplicates'):
+            message += f"\nIdentical images kept under more than one class: {stats['cross_class_duplicates']}"
+        if stats.get('merged_labels'):
+            message += f"\nImages with labels merged from their duplicates: {stats['merged_labels']}"
+        if stats.get('failed'):
+            message += f"\nFailed: {stats['failed']}"
+
+        QMessageBox.information(self, "Success", message)
 
         # Restore the cursor to default
         QApplication.restoreOverrideCursor()
@@ -0,0 +1,385 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from coralnet_toolbox.MachineLearning.Materialization import materialize
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp', '.dng', '.mpo', '.pfm'}
+
+# Source split directory -> merged split directory
+CLASSIFY_SPLITS = {'train': 'train', 'val': 'val', 'test': 'test'}
+YOLO_SPLITS = {'train': 'train', 'valid': 'valid', 'val': 'valid', 'test': 'test'}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Hash the content of a file.
+
+    :param path: Path to the file
+    :param chunk_size: Bytes read at a time
+    :return: Hex digest
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def list_files(directory):
+    """
+    List the files under a directory.
+
+    :param directory: Path to the directory
+    :return: Sorted list of paths relative to the directory
+    """
+    files = []
+    for root, _, names in os.walk(directory):
+        files += [os.path.relpath(os.path.join(root, name), directory) for name in names]
+
+    return sorted(files)
+
+
+def read_label_lines(src, lookup=None):
+    """
+    Read the lines of a YOLO label file, with their class indices remapped.
+
+    :param src: Source label file
+    :param lookup: Array mapping the dataset's class indices to the merged class indices, or None
+    :return: List of label lines
+    """
+    with open(src, 'r') as f:
+        lines = [line.split(maxsplit=1) for line in f.read().splitlines() if line.strip()]
+
+    if not lines:
+        return []
+
+    classes = np.array([int(parts[0]) for parts in lines])
+    if lookup is not None:
+        classes = lookup[classes]
+
+    return [f"{c} {parts[1] if len(parts) > 1 else ''}".rstrip() for c, parts in zip(classes.tolist(), lines)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class DatasetMerger:
+    """
+    Merges datasets file by file: files are listed and hashed in parallel, identical images are kept
+    once (by content hash), files whose names collide with different content are renamed after their
+    dataset, and files are placed with a materialization strategy.
+
+    Classification datasets (split/class/image) merge their class mappings. YOLO datasets
+    (split/images, split/labels and data.yaml) also get their class indices remapped to the merged
+    class names, with one lookup table per dataset; the labels of an image kept once are merged from
+    all of its duplicates.
+
+    :param output_dir: Path to the merged dataset
+    :param task: 'classify', 'detect' or 'segment'
+    :param strategy: How images are placed (see Materialization.STRATEGIES)
+    :param deduplicate: Whether identical images are kept only once
+    :param num_workers: Number of threads
+    """
+    def __init__(self, output_dir, task='classify', strategy="Copy", deduplicate=True, num_workers=8):
+        self.output_dir = output_dir
+        self.task = task
+        self.strategy = strategy
+        self.deduplicate = deduplicate
+        self.num_workers = max(1, num_workers)
+
+        self.splits = CLASSIFY_SPLITS if task == 'classify' else YOLO_SPLITS
+        self.stats = defaultdict(int)
+        # Class index lookup of each YOLO dataset (None keeps the indices)
+        self.lookups = []
+        # Merged relative path of a kept image -> (dataset index, src path) of its skipped duplicates
+        self.duplicates = defaultdict(list)
+
+    def list_datasets(self, datasets):
+        """
+        List the images of each dataset split, in parallel.
+
+        :param datasets: List of dataset directories
+        :return: List of (dataset index, src path, merged relative path), in a deterministic order
+        """
+        jobs = [(i, dir_path, split) for i, dir_path in enumerate(datasets) for split in self.splits
+                if os.path.isdir(os.path.join(dir_path, split))]
+
+        def list_split(job):
+            i, dir_path, split = job
+            split_dir = os.path.join(dir_path, split)
+            files = []
+            for rel_path in list_files(split_dir):
+                if os.path.splitext(rel_path)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                # YOLO label files follow their images
+                if self.task != 'classify' and rel_path.split(os.sep)[0] != 'images':
+                    continue
+                files.append((i, os.path.join(split_dir, rel_path), os.path.join(self.splits[split], rel_path)))
+            return files
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            return [file for files in executor.map(list_split, jobs) for file in files]
+
+    def hash_files(self, paths):
+        """
+        Hash the files that could be duplicates; a file whose size no other file has is unique.
+
+        :param paths: List of paths
+        :return: Dictionary mapping paths to content keys
+        """
+        sizes = {path: os.path.getsize(path) for path in paths}
+        size_counts = defaultdict(int)
+        for size in sizes.values():
+            size_counts[size] += 1
+
+        candidates = [path for path in paths if size_counts[sizes[path]] > 1]
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            hashes = dict(zip(candidates, executor.map(hash_file, candidates)))
+
+        return {path: hashes.get(path, f"size:{sizes[path]}") for path in paths}
+
+    def plan(self, files):
+        """
+        Decide where each image goes: skip duplicates, and rename collisions deterministically
+        (<name>_ds<dataset>, then <name>_ds<dataset>_<n>). A classification image is only a duplicate of
+        one under the same class; identical images under different classes are all kept, so no label is
+        dropped.
+
+        :param files: List of (dataset index, src path, merged relative path)
+        :return: List of (dataset index, src path, merged relative path) to write
+        """
+        keys = self.hash_files([src for _, src, _ in files]) if self.deduplicate else {}
+
+        seen = {}
+        used = {}
+        planned = []
+        classes = defaultdict(set)
+        self.duplicates = defaultdict(list)
+        for i, src, rel_path in files:
+            key = keys.get(src)
+            if key is not None and self.task == 'classify':
+                class_name = os.path.basename(os.path.dirname(rel_path))
+                if classes[key] and class_name not in classes[key]:
+                    # Same image under another class, kept in both
+                    self.stats['cross_class_duplicates'] += 1
+                    print(f"Warning: {src} is also under class {', '.join(sorted(classes[key]))}, "
+                          f"keeping it in each class")
+                classes[key].add(class_name)
+                key = (key, class_name)
+
+            if key is not None and key in seen:
+                self.stats['duplicates'] += 1
+                self.duplicates[seen[key]].append((i, src))
+                if os.path.dirname(seen[key]) != os.path.dirname(rel_path):
+                    # Same image (and class) in another split; YOLO labels are merged into the kept image
+                    self.stats['conflicting_duplicates'] += 1
+                continue
+
+            stem, ext = os.path.splitext(rel_path)
+            candidate, n = rel_path, 0
+            while candidate.lower() in used:
+                n += 1
+                candidate = f"{stem}_ds{i + 1}{ext}" if n == 1 else f"{stem}_ds{i + 1}_{n}{ext}"
+            if n:
+                self.stats['renamed'] += 1
+
+            used[candidate.lower()] = src
+            if key is not None:
+                seen[key] = candidate
+            planned.append((i, src, candidate))
+
+        return planned
+
+    @staticmethod
+    def get_label_path(image_path):
+        """Get the YOLO label file of an image (split/images/x.jpg -> split/labels/x.txt)."""
+        images, labels = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+        return os.path.splitext(labels.join(image_path.rsplit(images, 1)))[0] + ".txt"
+
+    def merge_names(self, datasets):
+        """
+        Merge the class names of YOLO datasets (data.yaml), in order of first appearance.
+
+        :param datasets: List of dataset directories
+        :return: (merged names, list of lookup arrays, one per dataset)
+        """
+        names, lookups = [], []
+        for dir_path in datasets:
+            dataset_names = []
+            yaml_path = os.path.join(dir_path, 'data.yaml')
+            if os.path.exists(yaml_path):
+                with open(yaml_path, 'r') as f:
+                    dataset_names = yaml.safe_load(f).get('names', [])
+                if isinstance(dataset_names, dict):
+                    dataset_names = [dataset_names[k] for k in sorted(dataset_names)]
+            else:
+                print(f"Warning: No data.yaml found in {dir_path}, class indices are kept")
+
+            for name in dataset_names:
+                if name not in names:
+                    names.append(name)
+
+            lookup = np.array([names.index(name) for name in dataset_names], dtype=np.int64)
+            lookups.append(lookup if len(lookup) else None)
+
+        return names, lookups
+
+    @staticmethod
+    def merge_class_mappings(class_mapping_paths):
+        """
+        Merge class mapping JSON files; the first mapping of a label wins.
+
+        :param class_mapping_paths: List of paths (or None)
+        :return: Merged class mapping
+        """
+        merged = {}
+        for path in class_mapping_paths:
+            if not path:
+                continue
+            try:
+                with open(path, 'r') as f:
+                    for label, info in json.load(f).items():
+                        if label in merged and merged[label] != info:
+                            print(f"Warning: Conflicting class mapping for {label}, keeping the first")
+                        merged.setdefault(label, info)
+            except Exception as e:
+                print(f"Error reading class mapping: {e}")
+
+        return merged
+
+    def merge_labels(self, dataset_index, src, rel_path):
+        """
+        Read the remapped labels of an image and of its skipped duplicates, each line kept once.
+
+        :return: (list of label lines or None if no image has a label file, whether duplicates added lines)
+        """
+        lines, found, merged = {}, False, False
+        for i, path in [(dataset_index, src)] + self.duplicates.get(rel_path, []):
+            label_path = self.get_label_path(path)
+            if not os.path.exists(label_path):
+                continue
+            for line in read_label_lines(label_path, self.lookups[i]):
+                if line not in lines:
+                    lines[line] = None
+                    merged = merged or path != src
+            found = True
+
+        return (list(lines) if found else None), merged
+
+    def write_file(self, dataset_index, src, rel_path):
+        """
+        Write an image's remapped label file (YOLO), then place the image into the merged dataset, so an
+        image is never placed without its labels.
+
+        :return: True if labels of the image's duplicates were merged into its label file
+        """
+        dst = os.path.join(self.output_dir, rel_path)
+        merged = False
+
+        if self.task != 'classify':
+            lines, merged = self.merge_labels(dataset_index, src, rel_path)
+            if lines is not None:
+                dst_label = os.path.join(self.output_dir, self.get_label_path(rel_path))
+                os.makedirs(os.path.dirname(dst_label), exist_ok=True)
+                with open(dst_label, 'w') as f:
+                    f.write("".join(f"{line}\n" for line in lines))
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        materialize(src, dst, self.strategy)
+
+        return merged
+
+    def prepare(self, datasets):
+        """
+        List, hash and plan the files of the datasets; YOLO datasets also get their merged data.yaml.
+
+        :param datasets: List of dataset directories
+        :return: List of (dataset index, src path, merged relative path) to write
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.stats = defaultdict(int)
+
+        self.lookups = [None] * len(datasets)
+        if self.task != 'classify':
+            names, self.lookups = self.merge_names(datasets)
+            data = {split: f'../{split}/images' for split in sorted(set(self.splits.values()))}
+            data.update({'nc': len(names), 'names': names})
+            with open(os.path.join(self.output_dir, 'data.yaml'), 'w') as f:
+                yaml.dump(data, f, default_flow_style=False)
+
+        return self.plan(self.list_datasets(datasets))
+
+    def write(self, planned, progress_callback=None):
+        """
+        Write the planned files in parallel.
+
+        :param planned: List from prepare
+        :param progress_callback: Optional callable called once per file
+        :return: Dictionary of counts (images, duplicates, conflicting_duplicates, cross_class_duplicates, renamed,
+            merged_labels, failed)
+        """
+        def write_job(job):
+            try:
+                return True, self.write_file(*job)
+            except Exception as e:
+                print(f"Warning: Failed to merge {job[1]}\n{e}")
+                return False, False
+
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            for success, merged in executor.map(write_job, planned):
+                self.stats['images' if success else 'failed'] += 1
+                if merged:
+                    self.stats['merged_labels'] += 1
+                if progress_callback is not None:
+                    progress_callback()
+
+        return dict(self.stats)
+
+    def write_class_mapping(self, class_mapping_paths):
+        """
+        Write the merged class mapping of the datasets, if any.
+
+        :param class_mapping_paths: List of class mapping JSON paths (or None), one per dataset
+        :return: Merged class mapping
+        """
+        merged_class_mapping = self.merge_class_mappings(class_mapping_paths)
+        if merged_class_mapping:
+            with open(os.path.join(self.output_dir, "class_mapping.json"), 'w') as f:
+                json.dump(merged_class_mapping, f, indent=4)
+
+        return merged_class_mapping
+
+    def merge(self, datasets, class_mapping_paths=None, progress_callback=None):
+        """
+        Merge the datasets.
+
+        :param datasets: List of dataset directories
+        :param class_mapping_paths: Optional list of class mapping JSON paths, one per dataset
+        :param progress_callback: Optional callable called once per file
+        :return: Dictionary of counts
+        """
+        stats = self.write(self.prepare(datasets), progress_callback)
+        if class_mapping_paths:
+            self.write_class_mapping(class_mapping_paths)
+
+        return stats
@@ -2,13 +2,25 @@ import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
+import random
+from itertools import groupby
+from operator import attrgetter
+
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (QFileDialog, QApplication, QMessageBox, QVBoxLayout,
                              QLabel, QLineEdit, QDialog, QHBoxLayout, QPushButton,
-                             QComboBox, QFormLayout, QGroupBox, QScrollArea, QWidget)
+                             QComboBox, QFormLayout, QGroupBox, QScrollArea, QWidget, QSpinBox)
 
 from ultralytics import YOLO
 
+from coralnet_toolbox.MachineLearning.RuntimeBackend import benchmark_backends, format_benchmark
+from coralnet_toolbox.MachineLearning.Quantization import (read_calibration_image, split_calibration_set,
+                                                           quantize_int8, evaluate_quantization,
+                                                           format_quantization_report)
+
+from coralnet_toolbox.QtProgressBar import ProgressBar
+from coralnet_toolbox.utilities import pixmap_to_numpy
+
 from coralnet_toolbox.Icons import get_icon
 
 
@@ -47,6 +59,10 @@ class Base(QDialog):
         self.setup_model_layout()
         # Setup the parameters layout
         self.setup_parameters_layout()
+        # Setup the quantization layout
+        self.setup_quantization_layout()
+        # Setup the benchmark layout
+        self.setup_benchmark_layout()
         # Setup the buttons layout
         self.setup_buttons_layout()
         
@@ -122,6 +138,44 @@ class Base(QDialog):
 
         self.layout.addWidget(group_box)
 
+    def setup_quantization_layout(self):
+        """Setup quantization layout."""
+        group_box = QGroupBox("INT8 Quantization")
+        layout = QFormLayout()
+
+        # Quantize the exported ONNX / OpenVINO model, calibrated on the project's annotations
+        self.int8_dropdown = QComboBox()
+        self.int8_dropdown.addItems(["False", "True"])
+        layout.addRow("Quantize to INT8:", self.int8_dropdown)
+
+        # Number of project samples (patch crops or images) used to calibrate and evaluate
+        self.calibration_samples_spinbox = QSpinBox()
+        self.calibration_samples_spinbox.setRange(8, 2048)
+        self.calibration_samples_spinbox.setValue(128)
+        layout.addRow("Calibration Samples:", self.calibration_samples_spinbox)
+
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
+    def setup_benchmark_layout(self):
+        """Setup benchmark layout."""
+        group_box = QGroupBox("Benchmark")
+        layout = QFormLayout()
+
+        # Compare the exported model against PyTorch on the CPU after exporting
+        self.benchmark_dropdown = QComboBox()
+        self.benchmark_dropdown.addItems(["False", "True"])
+        layout.addRow("Benchmark on CPU:", self.benchmark_dropdown)
+
+        # Number of timed predictions per model
+        self.benchmark_runs_spinbox = QSpinBox()
+        self.benchmark_runs_spinbox.setRange(1, 1000)
+        self.benchmark_runs_spinbox.setValue(20)
+        layout.addRow("Runs:", self.benchmark_runs_spinbox)
+
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
     def setup_buttons_layout(self):
         """Setup buttons layout."""
         cancel_button = QPushButton("Cancel")
@@ -211,20 +265,137 @@ class Base(QDialog):
 
         return params
 
+    def build_calibration_set(self, task, imgsz, num_samples):
+        """
+        Build a calibration set from the current project's annotations: patch crops (labeled with their
+        short label code) for classifiers, annotated images for detectors.
+
+        :param task: Task of the model
+        :param imgsz: Input size of the model
+        :param num_samples: Maximum number of samples
+        :return: (list of BGR images, list of labels or None)
+        """
+        annotation_window = self.main_window.annotation_window
+        annotations = list(annotation_window.annotations_dict.values())
+        rng = random.Random(0)
+
+        if task == 'classify':
+            annotations = rng.sample(annotations, min(num_samples, len(annotations)))
+            grouped = groupby(sorted(annotations, key=attrgetter('image_path')), key=attrgetter('image_path'))
+
+            images, labels = [], []
+            for image_path, group in grouped:
+                group = annotation_window.crop_these_image_annotations(image_path, list(group))
+                for annotation in group:
+                    # Calibration images are in BGR order (as read by OpenCV)
+                    images.append(pixmap_to_numpy(annotation.cropped_image)[:, :, ::-1])
+                    labels.append(annotation.label.short_label_code)
+
+            # Shuffle again so the held-out samples are not all from the last images
+            order = list(range(len(images)))
+            rng.shuffle(order)
+            return [images[i] for i in order], [labels[i] for i in order]
+
+        image_paths = sorted(set(a.image_path for a in annotations))
+        image_paths = rng.sample(image_paths, min(num_samples, len(image_paths)))
+
+        progress_bar = ProgressBar(self, title="Reading Calibration Images")
+        progress_bar.show()
+        progress_bar.start_progress(len(image_paths))
+
+        images = []
+        for image_path in image_paths:
+            try:
+                images.append(read_calibration_image(image_path, imgsz))
+            except Exception as e:
+                print(f"Warning: Failed to read {image_path}\n{e}")
+            progress_bar.update_progress()
+
+        progress_bar.stop_progress()
+        progress_bar.close()
+
+        return images, None
+
+    def quantize_model(self, params):
+        """
+        Export the model, quantize it to INT8 using calibration data from the project, and evaluate the
+        accuracy drop and CPU speedup against the FP32 model.
+
+        :param params: Export parameters
+        :return: Message describing the result
+        """
+        if params['format'] not in ['onnx', 'openvino']:
+            raise ValueError("INT8 quantization is only supported for the onnx and openvino formats")
+
+        model = YOLO(self.model_path)
+        task = model.task
+        imgsz = params.get('imgsz', model.model.args.get('imgsz', 640))
+        imgsz = max(imgsz) if isinstance(imgsz, (list, tuple)) else int(imgsz)
+
+        images, labels = self.build_calibration_set(task, imgsz, self.calibration_samples_spinbox.value())
+        if not images:
+            raise ValueError("The project has no annotations to calibrate the model with")
+
+        calibration_images, evaluation_images, evaluation_labels = split_calibration_set(images, labels)
+
+        # Export in full precision, then quantize the exported model
+        params = {k: v for k, v in params.items() if k not in ['int8', 'half']}
+        params['imgsz'] = imgsz
+        fp32_path = model.export(**params)
+        int8_path = quantize_int8(fp32_path, calibration_images, imgsz, task)
+
+        metrics = evaluate_quantization(fp32_path, int8_path, evaluation_images, evaluation_labels, imgsz, task)
+        benchmark = benchmark_backends(self.model_path,
+                                       [fp32_path, int8_path],
+                                       task=task,
+                                       imgsz=imgsz,
+                                       runs=self.benchmark_runs_spinbox.value())
+
+        report = format_quantization_report(metrics, benchmark)
+        print(report)
+
+        return (f"INT8 model exported to {int8_path}\n"
+                f"Calibrated on {len(calibration_images)} samples, "
+                f"evaluated on {len(evaluation_images)}.\n\n{report}")
+
     def optimize_model(self):
         """
         Optimize and export the model using the specified parameters.
         """
         params = self.get_optimization_parameters()
 
+        if self.int8_dropdown.currentText() == "True":
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                message = self.quantize_model(params)
+                QMessageBox.information(self, "Model Quantization Status", message)
+            except Exception as e:
+                error_message = f"An error occurred when quantizing model: {e}"
+                QMessageBox.critical(self, "Error", error_message)
+                print(error_message)
+            QApplication.restoreOverrideCursor()
+            return
+
         # Set the cursor to waiting (busy) cursor
         QApplication.setOverrideCursor(Qt.WaitCursor)
 
         try:
             # Initialize the model and export with given params
-            YOLO(self.model_path).export(**params)
+            model = YOLO(self.model_path)
+            exported_path = model.export(**params)
 
             message = "Model export successful."
+
+            if self.benchmark_dropdown.currentText() == "True" and exported_path:
+                # Compare CPU inference of the exported model against PyTorch
+                results = benchmark_backends(self.model_path,
+                                             [exported_path],
+                                             task=model.task,
+                                             imgsz=params.get('imgsz', 640),
+                                             runs=self.benchmark_runs_spinbox.value())
+                summary = format_benchmark(results)
+                print(summary)
+                message += f"\n\nCPU benchmark:\n{summary}"
             QMessageBox.information(self, "Model Export Status", message)
 
         except Exception as e:
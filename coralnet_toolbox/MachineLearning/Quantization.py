@@ -0,0 +1,328 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+import rasterio
+
+from torchvision.ops import box_iou
+from ultralytics import YOLO
+
+from coralnet_toolbox.utilities import preprocess_image
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class CalibrationReader:
+    """
+    Feeds calibration images to ONNX Runtime's static quantization, one image per call
+    (the onnxruntime.quantization.CalibrationDataReader interface).
+
+    :param images: List of BGR images as (H, W, 3) uint8 arrays
+    :param input_name: Name of the model's input
+    :param imgsz: Input size of the model
+    :param task: Task of the model
+    """
+    def __init__(self, images, input_name, imgsz, task):
+        self.images = images
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.task = task
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.images):
+            return None
+
+        image = preprocess_calibration_image(self.images[self.index], self.imgsz, self.task)
+        self.index += 1
+        return {self.input_name: image}
+
+    def rewind(self):
+        self.index = 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def preprocess_calibration_image(image, imgsz, task):
+    """
+    Preprocess an image the way Ultralytics does before inference: classifiers are resized and center
+    cropped, detectors are letterboxed. Pixel values are scaled to [0, 1].
+
+    :param image: BGR image as an (H, W, 3) uint8 array
+    :param imgsz: Input size of the model
+    :param task: Task of the model
+    :return: Input tensor as a (1, 3, imgsz, imgsz) float32 array
+    """
+    height, width = image.shape[:2]
+
+    if task == 'classify':
+        scale = imgsz / min(height, width)
+        resized = cv2.resize(image, (max(imgsz, round(width * scale)), max(imgsz, round(height * scale))))
+        top = (resized.shape[0] - imgsz) // 2
+        left = (resized.shape[1] - imgsz) // 2
+        output = resized[top: top + imgsz, left: left + imgsz]
+    else:
+        scale = imgsz / max(height, width)
+        resized = cv2.resize(image, (round(width * scale), round(height * scale)))
+        output = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        top = (imgsz - resized.shape[0]) // 2
+        left = (imgsz - resized.shape[1]) // 2
+        output[top: top + resized.shape[0], left: left + resized.shape[1]] = resized
+
+    output = output[..., ::-1].transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(output, dtype=np.float32) / 255.0
+
+
+def read_calibration_image(image_path, imgsz):
+    """
+    Read an image downsampled so its longest side is about imgsz, without loading it at full resolution.
+
+    :param image_path: Path to the image
+    :param imgsz: Input size of the model
+    :return: BGR image as an (H, W, 3) uint8 array
+    """
+    with rasterio.open(image_path) as src:
+        scale = min(1.0, imgsz / max(src.height, src.width))
+        out_shape = (src.count, max(1, round(src.height * scale)), max(1, round(src.width * scale)))
+        image = src.read(out_shape=out_shape)
+
+    image = preprocess_image(image.transpose(1, 2, 0))[..., ::-1]
+    return np.ascontiguousarray(image, dtype=np.uint8)
+
+
+def split_calibration_set(images, labels=None, holdout=0.25, min_images=8):
+    """
+    Split the samples into a calibration set and a held-out evaluation set. Small sets are used for both.
+
+    :param images: List of images
+    :param labels: Optional list of labels, one per image
+    :param holdout: Fraction of the samples held out for evaluation
+    :param min_images: Minimum number of samples before any are held out
+    :return: (calibration images, evaluation images, evaluation labels)
+    """
+    labels = labels if labels is not None else [None] * len(images)
+
+    if len(images) < min_images:
+        return images, images, labels
+
+    split = max(1, int(len(images) * (1 - holdout)))
+    return images[:split], images[split:], labels[split:]
+
+
+def quantize_onnx_int8(model_path, images, imgsz, task, output_path=None):
+    """
+    Statically quantize an exported ONNX model to INT8 (QDQ format, per-channel weights), calibrating
+    the activation ranges on the given images. The Ultralytics metadata of the model is kept.
+
+    :param model_path: Path to the FP32 .onnx file
+    :param images: List of BGR calibration images
+    :param imgsz: Input size of the model
+    :param task: Task of the model
+    :param output_path: Path of the INT8 model, defaults to <name>_int8.onnx
+    :return: Path to the INT8 model
+    """
+    import onnx
+    import onnxruntime
+    from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+
+    output_path = output_path or str(Path(model_path).with_name(f"{Path(model_path).stem}_int8.onnx"))
+
+    session = onnxruntime.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+    reader = CalibrationReader(images, session.get_inputs()[0].name, imgsz, task)
+    del session
+
+    quantize_static(str(model_path),
+                    output_path,
+                    reader,
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8)
+
+    # Ultralytics reads the class names, task and image size from the model's metadata
+    fp32_model = onnx.load(str(model_path), load_external_data=False)
+    int8_model = onnx.load(output_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, output_path)
+
+    return output_path
+
+
+def quantize_openvino_int8(model_path, images, imgsz, task, output_path=None):
+    """
+    Quantize an exported OpenVINO model to INT8 with NNCF, calibrating on the given images.
+    The Ultralytics metadata of the model is copied alongside.
+
+    :param model_path: Path to the FP32 *_openvino_model directory
+    :param images: List of BGR calibration images
+    :param imgsz: Input size of the model
+    :param task: Task of the model
+    :param output_path: Directory of the INT8 model, defaults to <name>_int8_openvino_model
+    :return: Path to the INT8 model directory
+    """
+    import nncf
+    import openvino as ov
+
+    model_path = Path(model_path)
+    xml_path = model_path if model_path.is_file() else next(model_path.glob("*.xml"))
+    model_dir = xml_path.parent
+
+    name = model_dir.name.replace("_openvino_model", "")
+    output_path = Path(output_path or model_dir.with_name(f"{name}_int8_openvino_model"))
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    core = ov.Core()
+    ov_model = core.read_model(str(xml_path))
+
+    dataset = nncf.Dataset(images, lambda image: preprocess_calibration_image(image, imgsz, task))
+    # Keep the detection head (box decoding) in full precision, as Ultralytics does
+    ignored_scope = None
+    if task != 'classify':
+        ignored_scope = nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"])
+
+    quantized_model = nncf.quantize(ov_model,
+                                    dataset,
+                                    preset=nncf.QuantizationPreset.MIXED,
+                                    subset_size=len(images),
+                                    ignored_scope=ignored_scope)
+
+    ov.save_model(quantized_model, str(output_path / xml_path.name), compress_to_fp16=False)
+
+    metadata_path = model_dir / "metadata.yaml"
+    if metadata_path.exists():
+        shutil.copy(metadata_path, output_path / "metadata.yaml")
+
+    return str(output_path)
+
+
+def quantize_int8(model_path, images, imgsz, task):
+    """
+    Quantize an exported ONNX or OpenVINO model to INT8.
+
+    :param model_path: Path to the FP32 exported model
+    :param images: List of BGR calibration images
+    :param imgsz: Input size of the model
+    :param task: Task of the model
+    :return: Path to the INT8 model
+    """
+    if str(model_path).endswith(".onnx"):
+        return quantize_onnx_int8(model_path, images, imgsz, task)
+
+    return quantize_openvino_int8(model_path, images, imgsz, task)
+
+
+def match_detections(reference, candidate, iou_thresh=0.5):
+    """
+    Count the detections of one model matched by another (same class, IoU above the threshold).
+
+    :param reference: Ultralytics Results of the reference model
+    :param candidate: Ultralytics Results of the compared model
+    :param iou_thresh: IoU threshold for a match
+    :return: (matched, number of reference detections, number of candidate detections)
+    """
+    num_reference, num_candidate = len(reference.boxes), len(candidate.boxes)
+    if not num_reference or not num_candidate:
+        return 0, num_reference, num_candidate
+
+    iou = box_iou(reference.boxes.xyxy.cpu(), candidate.boxes.xyxy.cpu())
+    iou[reference.boxes.cls.cpu()[:, None] != candidate.boxes.cls.cpu()[None, :]] = 0
+
+    # Greedy one-to-one matching, highest IoU first
+    matched = 0
+    while True:
+        value = iou.max()
+        if value < iou_thresh:
+            break
+        i, j = divmod(int(iou.argmax()), iou.shape[1])
+        iou[i, :] = 0
+        iou[:, j] = 0
+        matched += 1
+
+    return matched, num_reference, num_candidate
+
+
+def evaluate_quantization(fp32_path, int8_path, images, labels=None, imgsz=640, task=None):
+    """
+    Compare the predictions of an INT8 model against its FP32 version on held-out project data.
+
+    Classifiers report top-1 agreement between the models, and top-1 accuracy of each against the
+    project labels when given. Detectors report the F1 score of the INT8 detections against the FP32
+    detections (IoU 0.5, same class), so 1.0 means the quantized model finds the same objects.
+
+    :param fp32_path: Path to the FP32 model
+    :param int8_path: Path to the INT8 model
+    :param images: List of BGR evaluation images
+    :param labels: Optional list of class names, one per image (classifiers)
+    :param imgsz: Input size of the model
+    :param task: Task of the model
+    :return: Dictionary of metrics
+    """
+    kwargs = dict(imgsz=imgsz, device='cpu', verbose=False)
+    fp32_model = YOLO(fp32_path, task=task)
+    int8_model = YOLO(int8_path, task=task)
+
+    fp32_results = [fp32_model(image, **kwargs)[0] for image in images]
+    int8_results = [int8_model(image, **kwargs)[0] for image in images]
+
+    if task == 'classify':
+        fp32_top1 = [r.names[r.probs.top1] for r in fp32_results]
+        int8_top1 = [r.names[r.probs.top1] for r in int8_results]
+        metrics = {'agreement': float(np.mean([a == b for a, b in zip(fp32_top1, int8_top1)]))}
+
+        if labels and any(label is not None for label in labels):
+            pairs = [(label, a, b) for label, a, b in zip(labels, fp32_top1, int8_top1) if label is not None]
+            metrics['fp32_accuracy'] = float(np.mean([label == a for label, a, _ in pairs]))
+            metrics['int8_accuracy'] = float(np.mean([label == b for label, _, b in pairs]))
+            metrics['accuracy_drop'] = metrics['fp32_accuracy'] - metrics['int8_accuracy']
+
+        return metrics
+
+    matched, num_fp32, num_int8 = 0, 0, 0
+    for reference, candidate in zip(fp32_results, int8_results):
+        m, r, c = match_detections(reference, candidate)
+        matched, num_fp32, num_int8 = matched + m, num_fp32 + r, num_int8 + c
+
+    precision = matched / num_int8 if num_int8 else 1.0
+    recall = matched / num_fp32 if num_fp32 else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    return {
+        'fp32_detections': num_fp32,
+        'int8_detections': num_int8,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'accuracy_drop': 1.0 - f1,
+    }
+
+
+def format_quantization_report(metrics, benchmark):
+    """
+    Format the evaluation metrics and benchmark of a quantized model.
+
+    :param metrics: Dictionary from evaluate_quantization
+    :param benchmark: List of benchmark dictionaries (see RuntimeBackend.benchmark_backends)
+    :return: String
+    """
+    lines = ["Accuracy (held-out project data):"]
+    for key, value in metrics.items():
+        lines.append(f"    {key}: {value:.3f}" if isinstance(value, float) else f"    {key}: {value}")
+
+    if benchmark:
+        lines.append("CPU speed:")
+        for result in benchmark:
+            lines.append(f"    {result['model']}: {result['ms']:.1f} ms / image ({result.get('speedup', 1.0):.2f}x)")
+
+    return "\n".join(lines)
@@ -0,0 +1,263 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+import ultralytics
+from ultralytics import YOLO
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+GRAPH_OPTIMIZATIONS = ["All", "Extended", "Basic", "Disabled"]
+PERFORMANCE_HINTS = ["LATENCY", "THROUGHPUT"]
+
+# Ultralytics version whose AutoBackend attributes apply_runtime_options replaces (see requirements.txt)
+SUPPORTED_ULTRALYTICS = "8.3."
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_model_format(model_path):
+    """
+    Get the format of a (possibly exported) model from its path.
+
+    :param model_path: Path to the model file (or OpenVINO model directory)
+    :return: 'pytorch', 'torchscript', 'onnx', 'openvino' or 'engine'
+    """
+    model_path = str(model_path)
+
+    if model_path.endswith(".onnx"):
+        return 'onnx'
+    if model_path.endswith(".xml") or model_path.rstrip("/\\").endswith("_openvino_model"):
+        return 'openvino'
+    if model_path.endswith(".torchscript"):
+        return 'torchscript'
+    if model_path.endswith(".engine"):
+        return 'engine'
+
+    return 'pytorch'
+
+
+def create_onnx_session(model_path, providers=None, num_threads=0, graph_optimization="All"):
+    """
+    Create an ONNX Runtime session with explicit session options.
+
+    :param model_path: Path to the .onnx file
+    :param providers: Execution providers, defaults to the CPU provider
+    :param num_threads: Number of intra-op threads, 0 for the runtime default
+    :param graph_optimization: One of GRAPH_OPTIMIZATIONS
+    :return: onnxruntime.InferenceSession
+    """
+    import onnxruntime
+
+    levels = {
+        "All": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        "Extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "Basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "Disabled": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    }
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = levels.get(graph_optimization, levels["All"])
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.inter_op_num_threads = 1
+    if num_threads:
+        options.intra_op_num_threads = int(num_threads)
+
+    return onnxruntime.InferenceSession(str(model_path),
+                                        sess_options=options,
+                                        providers=providers or ["CPUExecutionProvider"])
+
+
+def compile_openvino_model(model_path, num_threads=0, performance_hint="LATENCY"):
+    """
+    Compile an OpenVINO model for the CPU with explicit runtime properties.
+
+    :param model_path: Path to the .xml file, or the exported *_openvino_model directory
+    :param num_threads: Number of inference threads, 0 for the runtime default
+    :param performance_hint: One of PERFORMANCE_HINTS
+    :return: openvino CompiledModel
+    """
+    import openvino as ov
+
+    model_path = Path(model_path)
+    if not model_path.is_file():
+        model_path = next(model_path.glob("*.xml"))
+
+    core = ov.Core()
+    ov_model = core.read_model(model=str(model_path), weights=model_path.with_suffix(".bin"))
+    if ov_model.get_parameters()[0].get_layout().empty:
+        ov_model.get_parameters()[0].set_layout(ov.Layout("NCHW"))
+
+    config = {"PERFORMANCE_HINT": performance_hint}
+    if num_threads:
+        config["INFERENCE_NUM_THREADS"] = int(num_threads)
+
+    return core.compile_model(ov_model, device_name="CPU", config=config)
+
+
+def supports_runtime_options():
+    """
+    Check the installed Ultralytics version is one whose AutoBackend internals apply_runtime_options
+    was written against (the session / compiled model attributes are not part of its public API).
+
+    :return: True if the version is supported
+    """
+    return ultralytics.__version__.startswith(SUPPORTED_ULTRALYTICS)
+
+
+def apply_runtime_options(model, num_threads=0, graph_optimization="All", performance_hint="LATENCY"):
+    """
+    Replace the runtime session Ultralytics created for an exported ONNX / OpenVINO model with one
+    created from explicit options, so the model runs natively in its runtime with tuned thread counts
+    and graph optimizations. Models of other formats are left unchanged, as are models whose backend
+    does not look as expected (e.g. another Ultralytics version); they keep the default session.
+
+    The model must have made a prediction first (e.g. a warm-up), so its predictor exists.
+
+    :param model: Ultralytics YOLO model
+    :param num_threads: Number of threads, 0 for the runtime default
+    :param graph_optimization: ONNX Runtime graph optimization level, one of GRAPH_OPTIMIZATIONS
+    :param performance_hint: OpenVINO performance hint, one of PERFORMANCE_HINTS
+    :return: True if the options were applied
+    """
+    predictor = getattr(model, 'predictor', None)
+    backend = getattr(predictor, 'model', None)
+    if backend is None:
+        return False
+
+    is_onnx = getattr(backend, 'onnx', False)
+    is_openvino = getattr(backend, 'xml', False)
+    if not (is_onnx or is_openvino):
+        return False
+
+    if not supports_runtime_options():
+        print(f"Warning: Runtime options are not supported with ultralytics {ultralytics.__version__} "
+              f"(expected {SUPPORTED_ULTRALYTICS}x), using the default session")
+        return False
+
+    try:
+        if is_onnx:
+            # Models bound to their session through IO bindings are not supported
+            if not hasattr(backend, 'session') or not hasattr(backend, 'output_names') or hasattr(backend, 'io'):
+                print("Warning: Unexpected ONNX backend, using the default session")
+                return False
+
+            session = create_onnx_session(model.ckpt_path or model.model,
+                                          providers=backend.session.get_providers(),
+                                          num_threads=num_threads,
+                                          graph_optimization=graph_optimization)
+
+            if [output.name for output in session.get_outputs()] != list(backend.output_names):
+                print("Warning: ONNX session outputs do not match the model, using the default session")
+                return False
+
+            backend.session = session
+            return True
+
+        if not hasattr(backend, 'ov_compiled_model') or not hasattr(backend, 'inference_mode'):
+            print("Warning: Unexpected OpenVINO backend, using the default compiled model")
+            return False
+
+        backend.ov_compiled_model = compile_openvino_model(model.ckpt_path or model.model,
+                                                           num_threads=num_threads,
+                                                           performance_hint=performance_hint)
+        backend.inference_mode = performance_hint
+        return True
+
+    except Exception as e:
+        print(f"Warning: Failed to apply runtime options, using the default session\n{e}")
+        return False
+
+
+def benchmark_model(model_path, task=None, imgsz=640, runs=20, warmup=3, **runtime_options):
+    """
+    Time inference of a model on the CPU with a blank image.
+
+    :param model_path: Path to the model
+    :param task: Task of the model
+    :param imgsz: Size of the (square) input image
+    :param runs: Number of timed predictions
+    :param warmup: Number of untimed predictions made first
+    :param runtime_options: Keyword arguments passed to apply_runtime_options
+    :return: Dictionary with the format, mean and standard deviation in ms per image, and images per second
+    """
+    image = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    kwargs = dict(imgsz=imgsz, device='cpu', verbose=False)
+
+    model = YOLO(model_path, task=task)
+    model(image, **kwargs)
+    apply_runtime_options(model, **runtime_options)
+
+    for _ in range(warmup):
+        model(image, **kwargs)
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model(image, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    times = np.array(times) * 1000
+    return {
+        'format': get_model_format(model_path),
+        'model': os.path.basename(str(model_path).rstrip("/\\")),
+        'ms': float(times.mean()),
+        'std': float(times.std()),
+        'fps': float(1000 / times.mean()),
+    }
+
+
+def benchmark_backends(model_path, exported_paths, task=None, imgsz=640, runs=20, **runtime_options):
+    """
+    Compare CPU inference of a PyTorch model against its exported versions.
+
+    :param model_path: Path to the PyTorch (.pt) model
+    :param exported_paths: Paths to the exported models
+    :param task: Task of the model
+    :param imgsz: Size of the (square) input image
+    :param runs: Number of timed predictions per model
+    :param runtime_options: Keyword arguments passed to apply_runtime_options
+    :return: List of benchmark dictionaries (see benchmark_model), PyTorch first, with the speedup over it
+    """
+    results = []
+    for path in [model_path] + list(exported_paths):
+        try:
+            results.append(benchmark_model(path, task=task, imgsz=imgsz, runs=runs, **runtime_options))
+        except Exception as e:
+            print(f"Warning: Failed to benchmark {path}\n{e}")
+
+    if results and results[0]['format'] == 'pytorch':
+        for result in results:
+            result['speedup'] = results[0]['ms'] / result['ms']
+
+    return results
+
+
+def format_benchmark(results):
+    """
+    Format benchmark results as a table.
+
+    :param results: List of benchmark dictionaries
+    :return: String
+    """
+    lines = [f"{'Format':<12}{'ms / image':>14}{'images / s':>12}{'speedup':>10}"]
+    for result in results:
+        lines.append(f"{result['format']:<12}"
+                     f"{result['ms']:>8.1f} ± {result['std']:<4.1f}"
+                     f"{result['fps']:>12.1f}"
+                     f"{result.get('speedup', 1.0):>9.2f}x")
+
+    return "\n".join(lines)
@@ -12,6 +12,7 @@ from PyQt5.QtWidgets import (QApplication, QMessageBox, QVBoxLayout, QLabel, QDi
                              QDoubleSpinBox, QComboBox, QPushButton, QFileDialog, QSpinBox,
                              QHBoxLayout, QWidget, QStackedWidget, QGridLayout)
 
+from coralnet_toolbox.MachineLearning.TileDataset.QtTileWorker import TileDatasetWorker
 from coralnet_toolbox.QtProgressBar import ProgressBar
 
 from coralnet_toolbox.Icons import get_icon
@@ -183,6 +184,9 @@ class Base(QDialog):
         # Object Detection / Instance Segmentation
         self.annotation_type = None
 
+        # Worker thread of the parallel tiling mode
+        self.tile_worker = None
+
         self.layout = QVBoxLayout(self)
 
         # Setup the info layout
@@ -324,6 +328,20 @@ class Base(QDialog):
         self.num_viz_sample_spinbox.setValue(25)
         layout.addRow("Number of Visualization Samples:", self.num_viz_sample_spinbox)
 
+        # Parallel tiling (source images are partitioned across worker processes)
+        self.parallel_combo = QComboBox()
+        self.parallel_combo.addItems(["True", "False"])
+        self.parallel_combo.setEditable(False)
+        self.parallel_combo.setCurrentIndex(0)
+        layout.addRow("Parallel Tiling:", self.parallel_combo)
+
+        self.num_workers_spinbox = QSpinBox()
+        self.num_workers_spinbox.setRange(1, os.cpu_count() or 1)
+        self.num_workers_spinbox.setValue(max(1, (os.cpu_count() or 1) - 1))
+        layout.addRow("Tiling Processes:", self.num_workers_spinbox)
+        self.parallel_combo.currentTextChanged.connect(
+            lambda text: self.num_workers_spinbox.setEnabled(text == "True"))
+
         group_box.setLayout(layout)
         self.layout.addWidget(group_box)
 
@@ -514,6 +532,10 @@ class Base(QDialog):
             # Resume the cursor
             QApplication.restoreOverrideCursor()
 
+        # Parallel tiling closes the dialog when the worker finishes
+        if self.tile_worker is not None and self.tile_worker.isRunning():
+            return
+
         self.accept()
 
     def tile_dataset(self):
@@ -574,6 +596,24 @@ class Base(QDialog):
         # Get the number of visualization samples
         num_viz_samples = self.num_viz_sample_spinbox.value()
 
+        config = TileConfig(
+            slice_wh=slice_wh,
+            overlap_wh=overlap_wh,
+            ext=ext,
+            annotation_type=self.annotation_type,
+            densify_factor=densify_factor,
+            smoothing_tolerance=smoothing_tolerance,
+            train_ratio=train_ratio,
+            valid_ratio=valid_ratio,
+            test_ratio=test_ratio,
+            margins=margins,
+            include_negative_samples=include_negatives
+        )
+
+        if self.parallel_combo.currentText() == "True":
+            self.start_parallel_tiling(src, dst, config, num_viz_samples)
+            return
+
         # Pause the cursor
         QApplication.setOverrideCursor(Qt.WaitCursor)
 
@@ -589,20 +629,6 @@ class Base(QDialog):
             if self.progress_bar.wasCanceled():
                 raise Exception("Tiling process was canceled by the user.")
 
-        config = TileConfig(
-            slice_wh=slice_wh,
-            overlap_wh=overlap_wh,
-            ext=ext,
-            annotation_type=self.annotation_type,
-            densify_factor=densify_factor,
-            smoothing_tolerance=smoothing_tolerance,
-            train_ratio=train_ratio,
-            valid_ratio=valid_ratio,
-            test_ratio=test_ratio,
-            margins=margins,
-            include_negative_samples=include_negatives
-        )
-
         tiler = YoloTiler(
             source=src,
             target=dst,
@@ -628,3 +654,61 @@ class Base(QDialog):
             self.progress_bar.stop_progress()
             self.progress_bar.close()
             QApplication.restoreOverrideCursor()
+
+    def start_parallel_tiling(self, src, dst, config, num_viz_samples):
+        """
+        Tile the dataset with a pool of worker processes, driven from a worker thread so the UI stays
+        responsive; progress is streamed back as chunks of images complete.
+
+        :param src: Source directory
+        :param dst: Destination directory
+        :param config: TileConfig
+        :param num_viz_samples: Number of visualization samples
+        """
+        # Copy the class_mapping.json file if it exists
+        os.makedirs(dst, exist_ok=True)
+        self.copy_class_mapping()
+
+        self.progress_bar = ProgressBar(self, title="Tiling Progress")
+        self.progress_bar.show()
+
+        self.tile_worker = TileDatasetWorker(src,
+                                             dst,
+                                             config,
+                                             num_viz_samples=num_viz_samples,
+                                             num_workers=self.num_workers_spinbox.value())
+
+        self.tile_worker.progress_updated.connect(self.on_tiling_progress)
+        self.tile_worker.tiling_completed.connect(self.on_tiling_completed)
+        self.tile_worker.tiling_error.connect(self.on_tiling_error)
+        self.progress_bar.cancel_button.clicked.connect(self.tile_worker.cancel)
+        self.tile_worker.start()
+
+    def on_tiling_progress(self, stage, current, total):
+        """Update the progress bar with the progress of the tiling worker."""
+        if stage == "tiling":
+            self.progress_bar.setWindowTitle(f"Tiling Images ({current} / {total})")
+        else:
+            self.progress_bar.setWindowTitle(f"Tiling {stage.capitalize()} Set")
+
+        if self.progress_bar.max_value != total:
+            self.progress_bar.start_progress(max(1, total))
+        self.progress_bar.set_value(current)
+
+    def on_tiling_completed(self, num_tiles):
+        """Handle the completion of the tiling worker."""
+        self.progress_bar.stop_progress()
+        self.progress_bar.close()
+        QMessageBox.information(self,
+                                "Tiling Complete",
+                                f"The dataset has been tiled successfully ({num_tiles} tiles).")
+        self.accept()
+
+    def on_tiling_error(self, error_message):
+        """Handle an error (or cancellation) of the tiling worker."""
+        self.progress_bar.stop_progress()
+        self.progress_bar.close()
+        QMessageBox.critical(self,
+                             "Error",
+                             f"Failed to tile dataset: {error_message}")
+        self.accept()
@@ -0,0 +1,222 @@
+import warnings
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import os
+import math
+import shutil
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from yolo_tiler import YoloTiler, TileProgress
+
+from PyQt5.QtCore import pyqtSignal, QThread
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+# The parallel tiler drives YoloTiler's private steps (_create_target_folder, _validate_directories,
+# _check_and_split_data, _copy_data_yaml), which are only stable within the yolo-tiling version pinned
+# in requirements.txt
+
+# Tiler of a worker process, created once so its logger handlers are not duplicated for every chunk
+_tiler = None
+
+
+def init_tiler(source, config):
+    """Create the tiler of a worker process."""
+    global _tiler
+    _tiler = YoloTiler(source=source, target=source, config=config, num_viz_samples=0, callback=None)
+
+
+def tile_images(staging_dir, jobs):
+    """
+    Tile a chunk of source images into a staging directory (runs in a worker process).
+
+    :param staging_dir: Directory with the train/valid/test structure of the target
+    :param jobs: List of (subfolder, image path, label path)
+    :return: List of error messages of the images that failed
+    """
+    _tiler.target = Path(staging_dir)
+    _tiler._create_target_folder(_tiler.target)
+
+    failed = []
+    for subfolder, image_path, label_path in jobs:
+        try:
+            _tiler.tile_image(Path(image_path), Path(label_path), subfolder)
+        except Exception as e:
+            failed.append(f"{image_path}: {e}")
+
+    return failed
+
+
+def find_tile_jobs(source, subfolders, input_ext):
+    """
+    Pair the images of each source subfolder with their label files (by name).
+
+    :param source: Source directory of the YOLO dataset
+    :param subfolders: List of subfolders (e.g. 'train/')
+    :param input_ext: Extension of the source images
+    :return: List of (subfolder, image path, label path), sorted
+    """
+    jobs = []
+    for subfolder in subfolders:
+        image_dir = Path(source) / subfolder / 'images'
+        label_dir = Path(source) / subfolder / 'labels'
+
+        for image_path in sorted(image_dir.glob(f'*{input_ext}')):
+            label_path = label_dir / f"{image_path.stem}.txt"
+            if not label_path.exists():
+                print(f"Warning: No label file found for {image_path}, skipping")
+                continue
+            jobs.append((subfolder, str(image_path), str(label_path)))
+
+    return jobs
+
+
+def partition(jobs, num_workers, chunks_per_worker=8, max_chunk_size=64):
+    """
+    Partition the jobs into chunks, several per worker so the work stays balanced and progress is
+    reported as chunks complete.
+
+    :param jobs: List of jobs
+    :param num_workers: Number of worker processes
+    :param chunks_per_worker: Target number of chunks per worker
+    :param max_chunk_size: Maximum number of jobs per chunk
+    :return: List of lists of jobs
+    """
+    chunk_size = math.ceil(len(jobs) / max(1, num_workers * chunks_per_worker))
+    chunk_size = min(max(1, chunk_size), max_chunk_size)
+    return [jobs[i: i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+
+def merge_staging(staging_dir, target, subfolders):
+    """
+    Move the tiles of a staging directory into the target splits, then remove the staging directory.
+
+    :param staging_dir: Staging directory of a chunk
+    :param target: Target directory of the tiled dataset
+    :param subfolders: List of subfolders (e.g. 'train/')
+    :return: Number of tiles moved
+    """
+    num_tiles = 0
+    for subfolder in subfolders:
+        for folder in ['images', 'labels']:
+            src_dir = os.path.join(staging_dir, subfolder, folder)
+            dst_dir = os.path.join(target, subfolder, folder)
+            if not os.path.isdir(src_dir):
+                continue
+
+            for name in os.listdir(src_dir):
+                os.replace(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+                num_tiles += folder == 'images'
+
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    return num_tiles
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class TileDatasetWorker(QThread):
+    """
+    Tiles a YOLO dataset with a pool of worker processes, off the GUI thread.
+
+    Source images are partitioned into chunks; each chunk is tiled by a worker process into its own
+    staging directory, which is merged into the target splits as soon as it completes. Splitting
+    train into valid / test (when those are empty) and rendering samples then run as in yolo-tiling.
+
+    Signals:
+        progress_updated: (stage, current, total) as work completes.
+        tiling_completed: Emitted with the number of tiles when tiling completes.
+        tiling_error: Emitted when an error occurs during tiling.
+
+    :param source: Source directory of the YOLO dataset
+    :param target: Target directory of the tiled dataset
+    :param config: TileConfig
+    :param num_viz_samples: Number of tiles to render
+    :param num_workers: Number of worker processes
+    """
+    progress_updated = pyqtSignal(str, int, int)
+    tiling_completed = pyqtSignal(int)
+    tiling_error = pyqtSignal(str)
+
+    def __init__(self, source, target, config, num_viz_samples=0, num_workers=4):
+        super().__init__()
+        self.source = source
+        self.target = target
+        self.config = config
+        self.num_viz_samples = num_viz_samples
+        self.num_workers = max(1, num_workers)
+        self._is_cancelled = False
+
+    def run(self):
+        staging_root = os.path.join(self.target, ".tiling")
+        try:
+            tiler = YoloTiler(source=self.source,
+                              target=self.target,
+                              config=self.config,
+                              num_viz_samples=self.num_viz_samples,
+                              callback=self.on_tile_progress)
+            tiler._validate_directories()
+
+            jobs = find_tile_jobs(self.source, tiler.subfolders, self.config.input_ext)
+            chunks = partition(jobs, self.num_workers)
+
+            num_tiles, num_done, failed = 0, 0, []
+            self.progress_updated.emit("tiling", 0, len(jobs))
+
+            with ProcessPoolExecutor(max_workers=self.num_workers,
+                                     initializer=init_tiler,
+                                     initargs=(self.source, self.config)) as executor:
+
+                futures = {}
+                for i, chunk in enumerate(chunks):
+                    staging_dir = os.path.join(staging_root, f"chunk_{i:05d}")
+                    futures[executor.submit(tile_images, staging_dir, chunk)] = (staging_dir, len(chunk))
+
+                for future in as_completed(futures):
+                    if self._is_cancelled:
+                        for pending in futures:
+                            pending.cancel()
+                        break
+
+                    staging_dir, num_images = futures[future]
+                    failed.extend(future.result())
+                    num_tiles += merge_staging(staging_dir, self.target, tiler.subfolders)
+
+                    num_done += num_images
+                    self.progress_updated.emit("tiling", num_done, len(jobs))
+
+            if self._is_cancelled:
+                raise Exception("Tiling process was canceled by the user.")
+
+            for message in failed:
+                print(f"Warning: Failed to tile {message}")
+
+            # Same post-processing as YoloTiler.run
+            tiler._check_and_split_data()
+            tiler._copy_data_yaml()
+            if self.num_viz_samples > 0:
+                tiler.visualize_random_samples()
+
+            self.tiling_completed.emit(num_tiles)
+
+        except Exception as e:
+            self.tiling_error.emit(str(e))
+        finally:
+            shutil.rmtree(staging_root, ignore_errors=True)
+
+    def on_tile_progress(self, progress: TileProgress):
+        """Report the progress of the splitting and rendering steps."""
+        if self._is_cancelled:
+            raise Exception("Tiling process was canceled by the user.")
+        self.progress_updated.emit(progress.current_set, progress.current_tile, progress.total_tiles)
+
+    def cancel(self):
+        self._is_cancelled = True
@@ -10,6 +10,7 @@ from pathlib import Path
 
 import ultralytics.data.build as build
 import ultralytics.models.yolo.classify.train as train_build
+import ultralytics.models.yolo.classify.val as val_build
 
 from ultralytics.data.dataset import YOLODataset
 from ultralytics.data.dataset import ClassificationDataset
@@ -24,6 +25,10 @@ from ultralytics import YOLO
 
 from coralnet_toolbox.MachineLearning.WeightedDataset import WeightedInstanceDataset
 from coralnet_toolbox.MachineLearning.WeightedDataset import WeightedClassificationDataset
+from coralnet_toolbox.MachineLearning.WeightedDataset import ShardedClassificationDataset
+from coralnet_toolbox.MachineLearning.WeightedDataset import WeightedShardedClassificationDataset
+from coralnet_toolbox.MachineLearning.WeightedDataset import TiledInstanceDataset
+from coralnet_toolbox.MachineLearning.WeightedDataset import WeightedTiledInstanceDataset
 
 from coralnet_toolbox.MachineLearning.EvaluateModel.QtBase import EvaluateModelWorker
 
@@ -70,31 +75,51 @@ class TrainModelWorker(QThread):
             # Extract parameters
             model_path = self.params.pop('model', None)
             weighted = self.params.pop('weighted', False)
+            tiling = self.params.pop('tiling', None)
+            tiled = tiling is not None and self.params['task'] in ['detect', 'segment']
+
+            # Classification datasets exported as shards are read from the shards
+            sharded = self.params['task'] == 'classify' and os.path.isdir(os.path.join(self.params['data'], 'shards'))
 
             # Use the custom dataset class for weighted sampling
-            if weighted and self.params['task'] == 'classify':
+            if weighted and sharded:
+                train_build.ClassificationDataset = WeightedShardedClassificationDataset
+            elif weighted and self.params['task'] == 'classify':
                 train_build.ClassificationDataset = WeightedClassificationDataset
+            elif tiled:
+                dataset_class = WeightedTiledInstanceDataset if weighted else TiledInstanceDataset
+                build.YOLODataset = dataset_class.with_tiles(**tiling)
             elif weighted and self.params['task'] in ['detect', 'segment']:
                 build.YOLODataset = WeightedInstanceDataset
+            elif sharded:
+                train_build.ClassificationDataset = ShardedClassificationDataset
+
+            if sharded:
+                val_build.ClassificationDataset = ShardedClassificationDataset
 
             # Load the model, train, and save the best weights
             self.model = YOLO(model_path)
             self.model.train(**self.params, device=self.device)
 
             # Revert to the original dataset class without weighted sampling
-            if weighted and self.params['task'] == 'classify':
+            if (weighted or sharded) and self.params['task'] == 'classify':
                 train_build.ClassificationDataset = ClassificationDataset
-            elif weighted and self.params['task'] in ['detect', 'segment']:
+            elif weighted and not tiled and self.params['task'] in ['detect', 'segment']:
                 build.YOLODataset = YOLODataset
 
-            # Evaluate the model after training
+            # Evaluate the model after training (on the same tiles when tiled)
             self.evaluate_model()
+
             # Emit signal to indicate training has completed
             self.training_completed.emit()
 
         except Exception as e:
             self.training_error.emit(str(e))
         finally:
+            # Revert to the original dataset classes, even if training or evaluation failed
+            build.YOLODataset = YOLODataset
+            train_build.ClassificationDataset = ClassificationDataset
+            val_build.ClassificationDataset = ClassificationDataset
             self._cleanup()
 
     def evaluate_model(self):
@@ -188,6 +213,9 @@ class Base(QDialog):
         self.setup_info_layout()
         # Create the dataset layout
         self.setup_dataset_layout()
+        # Create the tiling layout (detection and segmentation)
+        if self.task in ['detect', 'segment']:
+            self.setup_tiling_layout()
         # Create and set up the parameters layout
         self.setup_parameters_layout()
         # Create the buttons layout
@@ -214,6 +242,47 @@ class Base(QDialog):
     def setup_dataset_layout(self):
         raise NotImplementedError("Subclasses must implement this method.")
 
+    def setup_tiling_layout(self):
+        """
+        Set up the layout and widgets for tiling the dataset on the fly during training.
+        """
+        group_box = QGroupBox("Tiling (On the Fly)")
+        layout = QFormLayout()
+
+        # Train on tiles read from the source images, instead of a tiled copy of the dataset
+        self.tiled_combo = QComboBox()
+        self.tiled_combo.addItems(["False", "True"])
+        layout.addRow("Tiled:", self.tiled_combo)
+
+        # Tile Size
+        tile_layout = QHBoxLayout()
+        self.tile_width_spinbox = QSpinBox()
+        self.tile_width_spinbox.setRange(32, 9999)
+        self.tile_width_spinbox.setValue(640)
+        self.tile_height_spinbox = QSpinBox()
+        self.tile_height_spinbox.setRange(32, 9999)
+        self.tile_height_spinbox.setValue(640)
+        tile_layout.addWidget(QLabel("Width (px):"))
+        tile_layout.addWidget(self.tile_width_spinbox)
+        tile_layout.addWidget(QLabel("Height (px):"))
+        tile_layout.addWidget(self.tile_height_spinbox)
+        layout.addRow("Tile Size:", tile_layout)
+
+        # Overlap
+        self.tile_overlap_spinbox = QDoubleSpinBox()
+        self.tile_overlap_spinbox.setRange(0.0, 0.9)
+        self.tile_overlap_spinbox.setSingleStep(0.1)
+        self.tile_overlap_spinbox.setValue(0.0)
+        layout.addRow("Overlap (Fraction):", self.tile_overlap_spinbox)
+
+        # Include negative samples
+        self.tile_negatives_combo = QComboBox()
+        self.tile_negatives_combo.addItems(["True", "False"])
+        layout.addRow("Include Negative Samples:", self.tile_negatives_combo)
+
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
     def setup_parameters_layout(self):
         """
         Set up the layout and widgets for the generic layout.
@@ -518,6 +587,15 @@ class Base(QDialog):
         params['name'] = params['name'] if params['name'] else now
         params['pretrained'] = self.model_edit.text() if self.model_edit.text() else params['pretrained']
 
+        # Tiling on the fly
+        if self.task in ['detect', 'segment'] and self.tiled_combo.currentText() == "True":
+            overlap = self.tile_overlap_spinbox.value()
+            params['tiling'] = {
+                'tile_wh': (self.tile_width_spinbox.value(), self.tile_height_spinbox.value()),
+                'overlap_wh': (overlap, overlap),
+                'include_negatives': self.tile_negatives_combo.currentText() == "True",
+            }
+
         # Add custom parameters (allows overriding the above parameters)
         for param_name, param_value in self.custom_params:
             name = param_name.text().strip()
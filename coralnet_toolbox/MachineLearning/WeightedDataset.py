@@ -2,10 +2,153 @@ import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
+import json
+import math
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
 import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from PIL import Image
 
+from ultralytics.data.augment import classify_augmentations, classify_transforms
 from ultralytics.data.dataset import YOLODataset
 from ultralytics.data.dataset import ClassificationDataset
+from ultralytics.utils import colorstr, LOGGER
+
+from coralnet_toolbox.utilities import preprocess_image
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+def get_tile_windows(width, height, tile_wh, overlap_wh=(0, 0)):
+    """
+    Get the windows that tile an image, with the last row and column aligned to the image border.
+    An image smaller than a tile is covered by a single window.
+
+    Args:
+        width (int): Width of the image.
+        height (int): Height of the image.
+        tile_wh (tuple): Tile width and height in pixels.
+        overlap_wh (tuple): Overlap width and height, in pixels or as a fraction (float < 1) of the tile.
+
+    Returns:
+        list: List of (x, y, width, height) windows.
+    """
+    def get_starts(size, tile, overlap):
+        if size <= tile:
+            return [0], size
+        overlap = int(tile * overlap) if isinstance(overlap, float) and overlap < 1 else int(overlap)
+        step = max(1, tile - overlap)
+        return sorted(set(range(0, size - tile, step)) | {size - tile}), tile
+
+    xs, tile_w = get_starts(width, tile_wh[0], overlap_wh[0])
+    ys, tile_h = get_starts(height, tile_wh[1], overlap_wh[1])
+
+    return [(x, y, tile_w, tile_h) for y in ys for x in xs]
+
+
+def clip_polygon(points, x1, y1, x2, y2):
+    """
+    Clip a polygon to a rectangle (Sutherland-Hodgman).
+
+    Args:
+        points (numpy.ndarray): (n, 2) polygon vertices.
+        x1, y1, x2, y2 (float): Rectangle bounds.
+
+    Returns:
+        numpy.ndarray: (m, 2) vertices of the clipped polygon, empty if outside the rectangle.
+    """
+    for axis, bound, lower in [(0, x1, True), (0, x2, False), (1, y1, True), (1, y2, False)]:
+        if len(points) == 0:
+            break
+
+        inside = points[:, axis] >= bound if lower else points[:, axis] <= bound
+        output = []
+        for p, q, p_inside, q_inside in zip(points, np.roll(points, 1, axis=0), inside, np.roll(inside, 1)):
+            # Edge from the previous vertex q to the vertex p
+            if p_inside != q_inside:
+                t = (bound - q[axis]) / (p[axis] - q[axis])
+                output.append(q + t * (p - q))
+            if p_inside:
+                output.append(p)
+
+        points = np.array(output, dtype=np.float32).reshape(-1, 2)
+
+    return points
+
+
+def get_polygon_area(points):
+    """Area of a polygon (shoelace formula)."""
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+
+
+def tile_label(label, window, min_visibility=0.1):
+    """
+    Crop the YOLO label of an image to a tile window. Instances are clipped to the window, and dropped
+    when less than min_visibility of their area remains inside it.
+
+    Args:
+        label (dict): Ultralytics label of the image (normalized xywh boxes, optional normalized segments).
+        window (tuple): (x, y, width, height) of the tile.
+        min_visibility (float): Minimum fraction of an instance's area inside the tile.
+
+    Returns:
+        dict: Ultralytics label of the tile.
+    """
+    height, width = label['shape']
+    x, y, tile_w, tile_h = window
+    scale = np.array([width, height], dtype=np.float32)
+    offset = np.array([x, y], dtype=np.float32)
+    tile_scale = np.array([tile_w, tile_h], dtype=np.float32)
+
+    cls, bboxes, segments = [], [], []
+    if label['segments']:
+        for c, segment in zip(label['cls'], label['segments']):
+            polygon = segment * scale
+            clipped = clip_polygon(polygon, x, y, x + tile_w, y + tile_h)
+            if len(clipped) < 3 or get_polygon_area(clipped) < min_visibility * get_polygon_area(polygon):
+                continue
+
+            clipped = (clipped - offset) / tile_scale
+            (x_min, y_min), (x_max, y_max) = clipped.min(axis=0), clipped.max(axis=0)
+            cls.append(c)
+            bboxes.append([(x_min + x_max) / 2, (y_min + y_max) / 2, x_max - x_min, y_max - y_min])
+            segments.append(clipped)
+    else:
+        for c, (xc, yc, w, h) in zip(label['cls'], label['bboxes']):
+            x_min, x_max = (xc - w / 2) * width, (xc + w / 2) * width
+            y_min, y_max = (yc - h / 2) * height, (yc + h / 2) * height
+
+            clipped_w = min(x_max, x + tile_w) - max(x_min, x)
+            clipped_h = min(y_max, y + tile_h) - max(y_min, y)
+            if clipped_w <= 0 or clipped_h <= 0 or clipped_w * clipped_h < min_visibility * w * width * h * height:
+                continue
+
+            x_min, x_max = max(x_min, x) - x, min(x_max, x + tile_w) - x
+            y_min, y_max = max(y_min, y) - y, min(y_max, y + tile_h) - y
+            cls.append(c)
+            bboxes.append([(x_min + x_max) / 2 / tile_w, (y_min + y_max) / 2 / tile_h,
+                           (x_max - x_min) / tile_w, (y_max - y_min) / tile_h])
+
+    return {
+        'im_file': label['im_file'],
+        'shape': (tile_h, tile_w),
+        'cls': np.array(cls, dtype=np.float32).reshape(-1, 1),
+        'bboxes': np.array(bboxes, dtype=np.float32).reshape(-1, 4),
+        'segments': segments,
+        'keypoints': None,
+        'normalized': True,
+        'bbox_format': 'xywh',
+    }
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -83,6 +226,107 @@ class WeightedClassificationDataset(ClassificationDataset):
         return super(WeightedClassificationDataset, self).__getitem__(index)
 
 
+class ShardedClassificationDataset(ClassificationDataset):
+    def __init__(self, root, args, augment=False, prefix=""):
+        """
+        Initialize the ShardedClassificationDataset, which reads patches from the tar shards written by
+        ExportDataset (<dataset>/shards/<split>) instead of one file per patch. Each patch is read with a
+        single seek into a memory-mapped shard. Falls back to a regular ClassificationDataset when the
+        split was not exported as shards.
+
+        Args:
+            root (str): Path to the split directory (e.g. <dataset>/train).
+            args (Namespace): Ultralytics configuration.
+            augment (bool): Whether to apply augmentations.
+            prefix (str): Prefix for log messages.
+        """
+        self.shard_dir = Path(root).parent / "shards" / Path(root).name
+        self.sharded = (self.shard_dir / "index.json").exists()
+
+        if not self.sharded:
+            super(ShardedClassificationDataset, self).__init__(root, args, augment=augment, prefix=prefix)
+            return
+
+        with open(self.shard_dir / "index.json", 'r') as f:
+            info = json.load(f)
+
+        # Class indices follow the sorted class folders, as with ImageFolder
+        folders = sorted(d.name for d in os.scandir(root) if d.is_dir()) if os.path.isdir(root) else []
+        classes = sorted(set(folders) | set(info['classes']))
+        class_idx = np.array([classes.index(name) for name in info['classes']], dtype=np.int64)
+
+        index = np.load(self.shard_dir / "index.npy")
+        if augment and args.fraction < 1.0:
+            index = index[:round(len(index) * args.fraction)]
+
+        self.root = root
+        self.base = type('Base', (), {'classes': classes, 'root': root})()
+        self.shards = [str(self.shard_dir / name) for name in info['shards']]
+        self.index = index
+        self.samples = [[int(i), int(class_idx[c]), None, None] for i, (_, _, _, c) in enumerate(index)]
+        self.mmaps = {}
+
+        self.prefix = colorstr(f"{prefix}: ") if prefix else ""
+        self.cache_ram = False
+        self.cache_disk = False
+
+        scale = (1.0 - args.scale, 1.0)
+        self.torch_transforms = (
+            classify_augmentations(size=args.imgsz,
+                                   scale=scale,
+                                   hflip=args.fliplr,
+                                   vflip=args.flipud,
+                                   erasing=args.erasing,
+                                   auto_augment=args.auto_augment,
+                                   hsv_h=args.hsv_h,
+                                   hsv_s=args.hsv_s,
+                                   hsv_v=args.hsv_v)
+            if augment
+            else classify_transforms(size=args.imgsz, crop_fraction=args.crop_fraction)
+        )
+
+    def read_patch(self, index):
+        """
+        Read and decode a patch from its shard.
+
+        Returns:
+            numpy.ndarray: BGR image.
+        """
+        shard, offset, size, _ = self.index[index]
+
+        # Memory-map shards lazily, so each dataloader worker maps its own
+        if shard not in self.mmaps:
+            self.mmaps[shard] = np.memmap(self.shards[shard], dtype=np.uint8, mode='r')
+
+        return cv2.imdecode(self.mmaps[shard][offset: offset + size], cv2.IMREAD_COLOR)
+
+    def __getitem__(self, index):
+        """
+        Return the transformed patch and its class.
+        """
+        if not self.sharded:
+            return super(ShardedClassificationDataset, self).__getitem__(index)
+
+        sample_index, cls, _, _ = self.samples[index]
+        image = Image.fromarray(cv2.cvtColor(self.read_patch(sample_index), cv2.COLOR_BGR2RGB))
+        return {"img": self.torch_transforms(image), "cls": cls}
+
+    def __getstate__(self):
+        """
+        Drop the memory maps when pickled (e.g. for dataloader workers).
+        """
+        state = self.__dict__.copy()
+        state['mmaps'] = {}
+        return state
+
+
+class WeightedShardedClassificationDataset(WeightedClassificationDataset, ShardedClassificationDataset):
+    """
+    Weighted sampling over a sharded classification dataset.
+    """
+    pass
+
+
 class WeightedInstanceDataset(YOLODataset):
     def __init__(self, *args, mode="train", **kwargs):
         """
@@ -166,3 +410,135 @@ class WeightedInstanceDataset(YOLODataset):
             index = np.random.choice(len(self.labels), p=self.probabilities)
             return self.transforms(self.get_image_and_label(index))
 
+
+class TiledInstanceDataset(YOLODataset):
+    """
+    Detection / segmentation dataset that tiles the source images on the fly instead of training on
+    tiles written to disk. Each sample is a tile window over a source image, read with a rasterio window
+    when it is loaded; the labels are cropped to the windows once, when the dataset is indexed.
+
+    Tiling parameters are class attributes; use with_tiles to get a class with other parameters, so
+    the same dataset can be re-tiled without re-exporting.
+    """
+    tile_wh = (640, 640)
+    overlap_wh = (0, 0)
+    include_negatives = True
+    min_visibility = 0.1
+    cache_size = 64
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the TiledInstanceDataset.
+
+        Args:
+            Same as YOLODataset. Caching images to disk is not supported (tiles are not files).
+        """
+        if kwargs.get('cache') == 'disk':
+            print("Warning: Tiled datasets cannot be cached to disk, caching is disabled")
+            kwargs['cache'] = None
+
+        # Recently read tiles, by (image path, window)
+        self.tile_cache = OrderedDict()
+        self.windows = []
+
+        super(TiledInstanceDataset, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def with_tiles(cls, tile_wh, overlap_wh=(0, 0), include_negatives=True):
+        """
+        Get a subclass with the given tiling parameters (e.g. to replace build.YOLODataset).
+
+        Args:
+            tile_wh (tuple): Tile width and height in pixels.
+            overlap_wh (tuple): Overlap width and height, in pixels or as a fraction of the tile.
+            include_negatives (bool): Whether to keep tiles without instances.
+        """
+        return type(cls.__name__, (cls,), {'tile_wh': tuple(tile_wh),
+                                           'overlap_wh': tuple(overlap_wh),
+                                           'include_negatives': include_negatives})
+
+    def get_labels(self):
+        """
+        Index the tile windows of the source images, and crop the labels to them.
+
+        Returns:
+            list: A list of labels, one per tile.
+        """
+        labels = super(TiledInstanceDataset, self).get_labels()
+
+        tiles, self.windows = [], []
+        for label in labels:
+            height, width = label['shape']
+            for window in get_tile_windows(width, height, self.tile_wh, self.overlap_wh):
+                tile = tile_label(label, window, self.min_visibility)
+                if len(tile['cls']) or self.include_negatives:
+                    tiles.append(tile)
+                    self.windows.append(window)
+
+        self.im_files = [tile['im_file'] for tile in tiles]
+        LOGGER.info(f"{self.prefix}{len(tiles)} tiles of {self.tile_wh[0]}x{self.tile_wh[1]} from {len(labels)} images")
+
+        return tiles
+
+    def read_tile(self, index):
+        """
+        Read a tile from its source image, through a small LRU cache.
+
+        Returns:
+            numpy.ndarray: BGR image.
+        """
+        key = (self.im_files[index], self.windows[index])
+        if key in self.tile_cache:
+            self.tile_cache.move_to_end(key)
+            return self.tile_cache[key].copy()
+
+        x, y, width, height = self.windows[index]
+        with rasterio.open(self.im_files[index]) as src:
+            image = src.read(window=Window(x, y, width, height))
+
+        image = preprocess_image(image[0] if image.shape[0] == 1 else image.transpose(1, 2, 0))
+        image = np.ascontiguousarray(image[..., ::-1], dtype=np.uint8)
+
+        self.tile_cache[key] = image
+        if len(self.tile_cache) > self.cache_size:
+            self.tile_cache.popitem(last=False)
+
+        return image.copy()
+
+    def load_image(self, i, rect_mode=True):
+        """
+        Load a tile, resized as YOLODataset resizes images.
+
+        Returns:
+            tuple: (image, original hw, resized hw)
+        """
+        if self.ims[i] is not None:
+            return self.ims[i], self.im_hw0[i], self.im_hw[i]
+
+        im = self.read_tile(i)
+        h0, w0 = im.shape[:2]
+        if rect_mode:
+            r = self.imgsz / max(h0, w0)
+            if r != 1:
+                w, h = (min(math.ceil(w0 * r), self.imgsz), min(math.ceil(h0 * r), self.imgsz))
+                im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        elif not (h0 == w0 == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+
+        # Add to the mosaic buffer if training with augmentations
+        if self.augment:
+            self.ims[i], self.im_hw0[i], self.im_hw[i] = im, (h0, w0), im.shape[:2]
+            self.buffer.append(i)
+            if 1 < len(self.buffer) >= self.max_buffer_length:
+                j = self.buffer.pop(0)
+                if self.cache != "ram":
+                    self.ims[j], self.im_hw0[j], self.im_hw[j] = None, None, None
+
+        return im, (h0, w0), im.shape[:2]
+
+
+class WeightedTiledInstanceDataset(WeightedInstanceDataset, TiledInstanceDataset):
+    """
+    Weighted sampling over the tiles of a tiled dataset.
+    """
+    pass
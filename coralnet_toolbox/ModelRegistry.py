@@ -0,0 +1,303 @@
+import os
+import gc
+import json
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class ModelRegistry:
+    """
+    Shared registry of loaded (and warmed-up) models, so each model is loaded once across dialogs.
+    Tracks the memory footprint of each model, evicts the least recently used ones when the total exceeds
+    the memory budget, and remembers the models of the last session so they can be preloaded in the
+    background at startup, if the user opted in.
+
+    Models are keyed by (kind, path, task, device). Each kind has a loader registered by the dialog that
+    owns it, taking (path, task, device) and returning a ready-to-use model.
+
+    :param memory_budget: Maximum total footprint of the loaded models, in bytes
+    :param session_path: JSON file the models of the session are recorded in, or None
+    :param max_session_models: Maximum number of models recorded for the next session
+    :param settings_path: JSON file the memory budget and preload choice are saved in, or None
+    """
+    def __init__(self, memory_budget=8 * 1024 ** 3, session_path=None, max_session_models=4, settings_path=None):
+        self.memory_budget = memory_budget
+        self.session_path = session_path
+        self.max_session_models = max_session_models
+        self.settings_path = settings_path
+
+        # Preloading the last session is opt-in
+        self.preload = False
+        self.load_settings()
+
+        self.loaders = {}
+        self.models = OrderedDict()
+        self.footprints = {}
+        self.evict_callbacks = {}
+
+        self.lock = threading.RLock()
+        self.key_locks = {}
+        self.preload_thread = None
+
+    @staticmethod
+    def get_key(kind, path, task=None, device=None):
+        """Create a registry key."""
+        return (kind, str(path), task, str(device))
+
+    def register_loader(self, kind, loader):
+        """
+        Register the function used to load models of a kind.
+
+        :param kind: Kind of model (e.g. 'yolo', 'sam')
+        :param loader: Callable taking (path, task, device) and returning a loaded, warmed-up model
+        """
+        with self.lock:
+            self.loaders[kind] = loader
+
+    def get_key_lock(self, key):
+        """Get the lock that serializes loading of a key."""
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.models
+
+    def get(self, key):
+        """Get a loaded model (marking it as recently used), or None."""
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                return self.models[key]
+        return None
+
+    def get_or_load(self, key, loader=None, on_evict=None):
+        """
+        Get a model from the registry, loading it if needed. If the same model is being loaded in the
+        background, wait for it instead of loading it twice.
+
+        :param key: Registry key from get_key
+        :param loader: Optional callable taking no arguments, overriding the registered loader of the kind
+        :param on_evict: Optional callable taking the key, called when the model is evicted
+        :return: The model
+        """
+        with self.get_key_lock(key):
+            model = self.get(key)
+
+            if model is None:
+                if loader is None:
+                    kind, path, task, device = key
+                    model = self.loaders[kind](path, task, device)
+                else:
+                    model = loader()
+
+                footprint = self.get_footprint(model)
+                with self.lock:
+                    self.models[key] = model
+                    self.footprints[key] = footprint
+
+                print(f"Loaded {key[0]} model {os.path.basename(key[1])} ({footprint / 1024 ** 2:.0f} MB)")
+                self.record_session(key)
+
+        if on_evict is not None:
+            with self.lock:
+                self.evict_callbacks[key] = on_evict
+
+        self.evict(keep=key)
+
+        return model
+
+    def release(self, key):
+        """
+        Remove a model from the registry, freeing its memory once no one else references it.
+        """
+        with self.lock:
+            self.models.pop(key, None)
+            self.footprints.pop(key, None)
+            self.evict_callbacks.pop(key, None)
+
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def evict(self, keep=None):
+        """
+        Evict the least recently used models until the total footprint fits the memory budget.
+
+        :param keep: Key that is never evicted (e.g. the model that was just requested)
+        """
+        evicted = []
+        with self.lock:
+            for key in list(self.models.keys()):
+                if self.get_total_footprint() <= self.memory_budget:
+                    break
+                if key == keep:
+                    continue
+                self.models.pop(key)
+                self.footprints.pop(key, None)
+                evicted.append((key, self.evict_callbacks.pop(key, None)))
+
+        for key, callback in evicted:
+            print(f"Evicted {key[0]} model {os.path.basename(key[1])} to stay within the memory budget")
+            if callback is not None:
+                try:
+                    callback(key)
+                except Exception as e:
+                    print(f"Warning: Failed to notify the owner of an evicted model\n{e}")
+
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def set_memory_budget(self, memory_budget):
+        """
+        Set the memory budget, evicting models that no longer fit, and save it for the next session.
+
+        :param memory_budget: Maximum total footprint of the loaded models, in bytes
+        """
+        self.memory_budget = int(memory_budget)
+        self.save_settings()
+        self.evict()
+
+    def set_preload(self, preload):
+        """
+        Set whether the models of the last session are preloaded at startup, and save it.
+        """
+        self.preload = bool(preload)
+        self.save_settings()
+
+    def load_settings(self):
+        """
+        Load the memory budget and preload choice saved by a previous session, if any.
+        """
+        if self.settings_path is None or not os.path.exists(self.settings_path):
+            return
+
+        try:
+            with open(self.settings_path, 'r') as f:
+                settings = json.load(f)
+            self.memory_budget = int(settings.get('memory_budget', self.memory_budget))
+            self.preload = bool(settings.get('preload', self.preload))
+        except Exception as e:
+            print(f"Warning: Failed to read the model settings\n{e}")
+
+    def save_settings(self):
+        """
+        Save the memory budget and preload choice for the next session.
+        """
+        if self.settings_path is None:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.settings_path), exist_ok=True)
+            with open(self.settings_path, 'w') as f:
+                json.dump({'memory_budget': self.memory_budget, 'preload': self.preload}, f, indent=4)
+        except Exception as e:
+            print(f"Warning: Failed to save the model settings\n{e}")
+
+    def get_total_footprint(self):
+        """Get the total footprint of the loaded models, in bytes."""
+        with self.lock:
+            return sum(self.footprints.values())
+
+    @staticmethod
+    def get_footprint(model, depth=3):
+        """
+        Estimate the memory footprint of a model from the parameters and buffers of the torch modules it
+        holds (directly or as attributes, e.g. SamPredictor.model).
+
+        :param model: Model
+        :param depth: How deep to search attributes for torch modules
+        :return: Footprint in bytes
+        """
+        seen = set()
+
+        def module_bytes(module):
+            total = 0
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                if id(tensor) not in seen:
+                    seen.add(id(tensor))
+                    total += tensor.numel() * tensor.element_size()
+            return total
+
+        def search(obj, level):
+            if isinstance(obj, torch.nn.Module):
+                return module_bytes(obj)
+            if level == 0 or not hasattr(obj, '__dict__'):
+                return 0
+            return sum(search(value, level - 1) for value in vars(obj).values())
+
+        try:
+            return search(model, depth)
+        except Exception:
+            return 0
+
+    def record_session(self, key):
+        """
+        Record a model as used in this session, so it can be preloaded next time.
+        """
+        if self.session_path is None:
+            return
+
+        try:
+            session = self.load_session()
+            entry = list(key[:3])
+            session = [e for e in session if e != entry] + [entry]
+            session = session[-self.max_session_models:]
+
+            os.makedirs(os.path.dirname(self.session_path), exist_ok=True)
+            with open(self.session_path, 'w') as f:
+                json.dump(session, f, indent=4)
+        except Exception as e:
+            print(f"Warning: Failed to record the model session\n{e}")
+
+    def load_session(self):
+        """
+        Load the models recorded in the last session.
+
+        :return: List of [kind, path, task]
+        """
+        if self.session_path is None or not os.path.exists(self.session_path):
+            return []
+
+        try:
+            with open(self.session_path, 'r') as f:
+                return [list(entry) for entry in json.load(f)]
+        except Exception as e:
+            print(f"Warning: Failed to read the model session\n{e}")
+            return []
+
+    def preload_session(self, device):
+        """
+        Load the models of the last session in a background thread, so the first prediction does not
+        wait for loading and warm-up. Does nothing unless preloading is enabled; models whose loader is
+        not registered or whose file no longer exists are skipped.
+
+        :param device: Device to load the models on
+        """
+        if not self.preload:
+            return
+
+        entries = [(kind, path, task) for kind, path, task in self.load_session()
+                   if kind in self.loaders and os.path.exists(path)]
+
+        if not entries:
+            return
+
+        def preload():
+            for kind, path, task in entries:
+                try:
+                    self.get_or_load(self.get_key(kind, path, task, device))
+                except Exception as e:
+                    print(f"Warning: Failed to preload {kind} model {path}\n{e}")
+
+        self.preload_thread = threading.Thread(target=preload, daemon=True)
+        self.preload_thread.start()
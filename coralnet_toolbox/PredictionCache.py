@@ -0,0 +1,160 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class PredictionCache:
+    """
+    Compact, GUI-independent store of the raw (pre-filter) predictions made for each image, so thresholds
+    and NMS can be re-applied without running the model again. Boxes are kept as float32, scores as
+    float16, class IDs as int16 and masks as polygons rather than bitmaps.
+
+    Each entry is a dictionary with the keys:
+        task: 'detect', 'segment' or 'classify'
+        names: Dictionary mapping class IDs to class names
+        class_mapping: Class mapping used when the predictions were made
+        shape: (height, width) of the image
+        xyxy, conf, cls: Arrays for the detections (detect / segment)
+        points: List of polygons, one per detection (segment)
+        classifications: Dictionary mapping annotation IDs to (class name, confidence, predictions) (classify)
+        annotation_ids: Dictionary mapping the IDs of the annotations created from the entry to the index of
+            the prediction each was created from (or None)
+        suppressed: Set of the indices of predictions whose annotation the user deleted
+
+    :param max_images: Maximum number of images kept; the least recently updated are dropped first
+    """
+    def __init__(self, max_images=512):
+        self.max_images = max_images
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, image_path):
+        return image_path in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def image_paths(self):
+        """Get the image paths with cached predictions."""
+        with self.lock:
+            return list(self.entries.keys())
+
+    def get(self, image_path):
+        """Get the cached entry for an image, or None."""
+        with self.lock:
+            return self.entries.get(image_path)
+
+    def start(self, image_path, task, names, class_mapping, shape):
+        """
+        Start a new entry for an image, replacing predictions from a previous run.
+
+        :param image_path: Path to the image
+        :param task: 'detect', 'segment' or 'classify'
+        :param names: Dictionary mapping class IDs to class names
+        :param class_mapping: Class mapping used when the predictions were made
+        :param shape: (height, width) of the image
+        """
+        entry = {
+            'task': task,
+            'names': dict(names) if names else {},
+            'class_mapping': class_mapping,
+            'shape': tuple(int(i) for i in shape),
+            'xyxy': np.zeros((0, 4), dtype=np.float32),
+            'conf': np.zeros(0, dtype=np.float16),
+            'cls': np.zeros(0, dtype=np.int16),
+            'points': [],
+            'classifications': {},
+            'annotation_ids': {},
+            'suppressed': set(),
+        }
+        with self.lock:
+            self.entries[image_path] = entry
+            self.entries.move_to_end(image_path)
+            while len(self.entries) > self.max_images:
+                self.entries.popitem(last=False)
+
+    def add_detections(self, image_path, xyxy, conf, cls, points=None):
+        """
+        Append detections (in image coordinates) to an image's entry; an image predicted in windows
+        (e.g. slices) gets one call per window.
+
+        :return: Index of the first appended detection in the entry, or None if the image has no entry
+        """
+        with self.lock:
+            entry = self.entries.get(image_path)
+            if entry is None:
+                return None
+            start = len(entry['conf'])
+            entry['xyxy'] = np.concatenate([entry['xyxy'], np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)])
+            entry['conf'] = np.concatenate([entry['conf'], np.asarray(conf, dtype=np.float16).ravel()])
+            entry['cls'] = np.concatenate([entry['cls'], np.asarray(cls, dtype=np.int16).ravel()])
+            if points is not None:
+                entry['points'].extend(np.asarray(p, dtype=np.float32) for p in points)
+            return start
+
+    def add_classification(self, image_path, annotation_id, cls_name, conf, predictions):
+        """
+        Add the classification of a single (patch) annotation to an image's entry.
+        """
+        with self.lock:
+            entry = self.entries.get(image_path)
+            if entry is not None:
+                entry['classifications'][annotation_id] = (cls_name, float(conf), dict(predictions))
+
+    def set_annotation_ids(self, image_path, annotation_ids):
+        """
+        Set the annotations created from an image's entry.
+
+        :param image_path: Path to the image
+        :param annotation_ids: Dictionary mapping annotation IDs to prediction indices (or None)
+        """
+        with self.lock:
+            if image_path in self.entries:
+                self.entries[image_path]['annotation_ids'] = dict(annotation_ids)
+
+    def add_annotation_ids(self, image_path, annotation_ids, indices=None):
+        """
+        Add to the annotations created from an image's entry.
+
+        :param image_path: Path to the image
+        :param annotation_ids: List of annotation IDs
+        :param indices: List of the prediction index each annotation was created from, if known
+        """
+        indices = [None] * len(annotation_ids) if indices is None else indices
+        with self.lock:
+            if image_path in self.entries:
+                self.entries[image_path]['annotation_ids'].update(zip(annotation_ids, indices))
+
+    def add_suppressed(self, image_path, indices):
+        """
+        Record predictions whose annotation the user deleted, so they are not created again.
+
+        :param image_path: Path to the image
+        :param indices: Iterable of prediction indices
+        """
+        with self.lock:
+            if image_path in self.entries:
+                self.entries[image_path]['suppressed'].update(indices)
+
+    def remove(self, image_path):
+        """Remove an image's entry."""
+        with self.lock:
+            self.entries.pop(image_path, None)
+
+    def clear(self):
+        """Remove all entries."""
+        with self.lock:
+            self.entries.clear()
+
+    def nbytes(self):
+        """Approximate memory used by the cached arrays, in bytes."""
+        with self.lock:
+            return sum(entry['xyxy'].nbytes + entry['conf'].nbytes + entry['cls'].nbytes +
+                       sum(p.nbytes for p in entry['points'])
+                       for entry in self.entries.values())
@@ -237,6 +237,23 @@ class ImageWindow(QWidget):
             self.update_search_bars()
             QApplication.processEvents()
 
+    def add_images(self, image_paths):
+        """Add many images at once, updating the table a single time."""
+        for image_path in image_paths:
+            if image_path not in self.image_dict:
+                self.image_paths.append(image_path)
+                self.image_dict[image_path] = {
+                    'filename': os.path.basename(image_path),
+                    'has_annotations': False,
+                    'has_predictions': False,
+                    'labels': set(),
+                    'annotation_count': 0
+                }
+        self.update_table_widget()
+        self.update_image_count_label()
+        self.update_search_bars()
+        QApplication.processEvents()
+
     def update_table_widget(self):
         self.tableWidget.setRowCount(0)  # Clear the table
 
@@ -295,6 +312,26 @@ class ImageWindow(QWidget):
             self.image_dict[image_path]['labels'] = labels
             self.image_dict[image_path]['annotation_count'] = len(annotations)
             self.update_table_widget()
+
+    def update_images_annotations(self, image_paths):
+        """
+        Update the annotation info of many images at once, grouping all annotations by image in a single
+        pass rather than scanning them once per image.
+
+        :param image_paths: Iterable of image paths
+        """
+        image_annotations = {image_path: [] for image_path in image_paths if image_path in self.image_dict}
+        for annotation in self.annotation_window.annotations_dict.values():
+            if annotation.image_path in image_annotations:
+                image_annotations[annotation.image_path].append(annotation)
+
+        for image_path, annotations in image_annotations.items():
+            predictions = [a.machine_confidence for a in annotations if a.machine_confidence != {}]
+            self.image_dict[image_path]['has_annotations'] = bool(annotations)
+            self.image_dict[image_path]['has_predictions'] = len(predictions)
+            self.image_dict[image_path]['labels'] = {a.label.short_label_code for a in annotations}
+            self.image_dict[image_path]['annotation_count'] = len(annotations)
+        self.update_table_widget()
             
     def update_current_image_annotations(self):
         if self.selected_image_path:
@@ -514,8 +551,9 @@ class ImageWindow(QWidget):
                                          "Are you sure you want to delete annotations for this image?",
                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                # Proceed with deleting annotations
+                # Proceed with deleting annotations, and the predictions they were created from
                 self.annotation_window.delete_image_annotations(image_path)
+                self.main_window.prediction_cache.remove(image_path)
                 self.main_window.confidence_window.clear_display()
 
     def delete_image(self, image_path):
@@ -529,8 +567,9 @@ class ImageWindow(QWidget):
             if image_path in self.filtered_image_paths:
                 self.filtered_image_paths.remove(image_path)
 
-            # Remove the image's annotations
+            # Remove the image's annotations and cached predictions
             self.annotation_window.delete_image(image_path)
+            self.main_window.prediction_cache.remove(image_path)
 
             # Update the table widget
             self.update_table_widget()
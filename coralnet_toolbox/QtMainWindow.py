@@ -2,16 +2,17 @@ import warnings
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+import os
 import re
 
 from qtrangeslider import QRangeSlider
-from PyQt5.QtCore import Qt, pyqtSignal, QEvent, QSize, QPoint
+from PyQt5.QtCore import Qt, pyqtSignal, QEvent, QSize, QPoint, QTimer
 from PyQt5.QtGui import QIcon, QMouseEvent
 from PyQt5.QtWidgets import (QListWidget, QCheckBox, QFrame)
 from PyQt5.QtWidgets import (QMainWindow, QApplication, QToolBar, QAction, QSizePolicy,
                              QMessageBox, QWidget, QVBoxLayout, QLabel, QHBoxLayout,
                              QSpinBox, QSlider, QDialog, QPushButton, QToolButton,
-                             QGroupBox)
+                             QGroupBox, QInputDialog)
 
 from coralnet_toolbox.QtAnnotationWindow import AnnotationWindow
 from coralnet_toolbox.QtConfidenceWindow import ConfidenceWindow
@@ -71,6 +72,9 @@ from coralnet_toolbox.AutoDistill import (
 )
 
 from coralnet_toolbox.Icons import get_icon
+from coralnet_toolbox.ModelRegistry import ModelRegistry
+from coralnet_toolbox.PredictionCache import PredictionCache
+from coralnet_toolbox.ResultsProcessor import ResultsProcessor
 
 from coralnet_toolbox.utilities import get_available_device
 
@@ -127,6 +131,18 @@ class MainWindow(QMainWindow):
         self.uncertainty_thresh = 0.30
         self.area_thresh_min = 0.00
         self.area_thresh_max = 0.40
+        
+        # Raw predictions, so changing the thresholds re-filters them without re-running the model
+        self.prediction_cache = PredictionCache()
+        self.threshold_timer = QTimer(self)
+        self.threshold_timer.setSingleShot(True)
+        self.threshold_timer.setInterval(300)
+        self.threshold_timer.timeout.connect(self.reapply_thresholds)
+
+        # Models shared across dialogs, loaded once (and optionally preloaded from the last session)
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "coralnet_toolbox")
+        self.model_registry = ModelRegistry(session_path=os.path.join(cache_dir, "model_session.json"),
+                                            settings_path=os.path.join(cache_dir, "model_settings.json"))
 
         # Create windows
         self.annotation_window = AnnotationWindow(self)
@@ -488,6 +504,21 @@ class MainWindow(QMainWindow):
         self.auto_distill_batch_inference_action.triggered.connect(self.open_auto_distill_batch_inference_dialog)
         self.auto_distill_menu.addAction(self.auto_distill_batch_inference_action)
 
+        # Models menu
+        self.models_menu = self.menu_bar.addMenu("Models")
+
+        # Preload the models of the last session at startup
+        self.preload_models_action = QAction("Preload Last Session", self)
+        self.preload_models_action.setCheckable(True)
+        self.preload_models_action.setChecked(self.model_registry.preload)
+        self.preload_models_action.toggled.connect(self.model_registry.set_preload)
+        self.models_menu.addAction(self.preload_models_action)
+
+        # Memory budget of the loaded models
+        self.model_memory_budget_action = QAction("Memory Budget", self)
+        self.model_memory_budget_action.triggered.connect(self.set_model_memory_budget)
+        self.models_menu.addAction(self.model_memory_budget_action)
+
         # ----------------------------------------
         # Create and add the toolbar
         # ----------------------------------------
@@ -581,6 +612,9 @@ class MainWindow(QMainWindow):
         self.device_tool_action.triggered.connect(self.toggle_device)
         self.toolbar.addAction(self.device_tool_action)
 
+        # Load the models of the last session in the background (if enabled)
+        self.model_registry.preload_session(self.device)
+
         # ----------------------------------------
         # Create and add the status bar
         # ----------------------------------------
@@ -884,6 +918,16 @@ class MainWindow(QMainWindow):
 
             self.label_window.unlock_label_lock()
 
+    def set_model_memory_budget(self):
+        """Set the maximum memory the loaded models may use before the least recently used are evicted"""
+        budget, ok = QInputDialog.getDouble(self,
+                                            "Memory Budget",
+                                            "Maximum memory for loaded models (GB):",
+                                            self.model_registry.memory_budget / 1024 ** 3,
+                                            0.5, 1024.0, 1)
+        if ok:
+            self.model_registry.set_memory_budget(budget * 1024 ** 3)
+
     def toggle_device(self):
         dialog = DeviceSelectionDialog(self.devices, self)
         if dialog.exec_() == QDialog.Accepted:
@@ -991,11 +1035,13 @@ class MainWindow(QMainWindow):
             self.uncertainty_thresh = value
             self.uncertainty_thresh_slider.setValue(int(value * 100))  # Convert to slider range (0-100)
             self.uncertaintyChanged.emit(value)
+            self.schedule_reapply_thresholds()
 
     def update_uncertainty_label(self, value):
         """Update uncertainty threshold label when slider value changes"""
         self.uncertainty_thresh = value / 100.0  # Convert from 0-100 to 0-1
         self.uncertainty_value_label.setText(f"{self.uncertainty_thresh:.2f}")
+        self.schedule_reapply_thresholds()
 
     def get_iou_thresh(self):
         """Get the current IoU threshold value"""
@@ -1007,11 +1053,13 @@ class MainWindow(QMainWindow):
             self.iou_thresh = value
             self.iou_thresh_slider.setValue(int(value * 100))  # Convert to slider range (0-100)
             self.iouChanged.emit(value)
+            self.schedule_reapply_thresholds()
 
     def update_iou_label(self, value):
         """Update IoU threshold label when slider value changes"""
         self.iou_thresh = value / 100.0  # Convert from 0-100 to 0-1
         self.iou_value_label.setText(f"{self.iou_thresh:.2f}")
+        self.schedule_reapply_thresholds()
 
     def get_area_thresh(self):
         """Get the current area threshold values"""
@@ -1032,6 +1080,7 @@ class MainWindow(QMainWindow):
             self.area_thresh_max = max_val
             self.area_threshold_slider.setValue((int(min_val * 100), int(max_val * 100)))
             self.areaChanged.emit(min_val, max_val)
+            self.schedule_reapply_thresholds()
 
     def update_area_label(self, value):
         """Handle changes to area threshold range slider"""
@@ -1039,6 +1088,26 @@ class MainWindow(QMainWindow):
         self.area_thresh_min = min_val / 100.0
         self.area_thresh_max = max_val / 100.0
         self.area_threshold_label.setText(f"{self.area_thresh_min:.2f} - {self.area_thresh_max:.2f}")
+        self.schedule_reapply_thresholds()
+
+    def schedule_reapply_thresholds(self):
+        """Re-apply the thresholds to the current image's cached predictions once the sliders stop moving"""
+        if self.annotation_window.current_image_path in self.prediction_cache:
+            self.threshold_timer.start()
+
+    def reapply_thresholds(self):
+        """Re-filter the current image's cached raw predictions with the current thresholds"""
+        image_path = self.annotation_window.current_image_path
+        if image_path not in self.prediction_cache:
+            return
+
+        results_processor = ResultsProcessor(self,
+                                             None,
+                                             uncertainty_thresh=self.get_uncertainty_thresh(),
+                                             iou_thresh=self.get_iou_thresh(),
+                                             min_area_thresh=self.get_area_thresh_min(),
+                                             max_area_thresh=self.get_area_thresh_max())
+        results_processor.reapply_thresholds([image_path])
 
     def open_patch_annotation_sampling_dialog(self):
 
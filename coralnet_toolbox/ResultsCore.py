@@ -0,0 +1,515 @@
+from dataclasses import dataclass
+
+import numpy as np
+import torch
+
+from torchvision.ops import nms
+from ultralytics.engine.results import Results
+from ultralytics.models.sam.amg import batched_mask_to_box
+from ultralytics.utils import ops
+from ultralytics.utils.ops import scale_masks
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Constants
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+# Confidence and IoU thresholds a model is run with when its raw predictions are cached, so the user's
+# thresholds and NMS are applied afterwards (and can be lowered or raised) without running it again
+RAW_CONF_THRESH = 0.01
+RAW_IOU_THRESH = 1.0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+@dataclass
+class AnnotationRecord:
+    """
+    A GUI-independent description of a single prediction, ready to be turned into an annotation.
+
+    :param image_path: Path to the image the prediction belongs to
+    :param cls: Class ID predicted by the model
+    :param cls_name: Class name predicted by the model
+    :param conf: Confidence score
+    :param short_label: Short label code the prediction maps to (or 'Review')
+    :param bbox: Bounding box as (x_min, y_min, x_max, y_max), if any
+    :param points: Polygon points as an (N, 2) array, if any
+    :param predictions: Dictionary mapping class names to confidence scores, if any
+    :param index: Index of the prediction in the image's PredictionCache entry, if it was cached
+    """
+    image_path: str
+    cls: int
+    cls_name: str
+    conf: float
+    short_label: str = 'Review'
+    bbox: np.ndarray = None
+    points: np.ndarray = None
+    predictions: dict = None
+    index: int = None
+
+
+class ResultsCore:
+    """
+    Pure (NumPy / torch) processing of Ultralytics Results into annotation records. Contains no Qt
+    dependencies so it can be used from worker processes, benchmarks and tests without a display.
+
+    :param class_mapping: Dictionary mapping class names to label dictionaries
+    :param uncertainty_thresh: Minimum confidence threshold
+    :param iou_thresh: IoU threshold used for NMS
+    :param min_area_thresh: Minimum normalized area threshold
+    :param max_area_thresh: Maximum normalized area threshold
+    """
+    def __init__(self,
+                 class_mapping,
+                 uncertainty_thresh=0.3,
+                 iou_thresh=0.2,
+                 min_area_thresh=0.00,
+                 max_area_thresh=0.40):
+
+        self.class_mapping = class_mapping if class_mapping else {}
+
+        self.uncertainty_thresh = uncertainty_thresh
+        self.iou_thresh = iou_thresh
+        self.min_area_thresh = min_area_thresh
+        self.max_area_thresh = max_area_thresh
+
+        # Optional PredictionCache that raw (pre-filter) predictions are recorded in
+        self.prediction_cache = None
+        self.cached_images = set()
+
+    def get_filter_indices(self, conf, xyxy, shape):
+        """
+        Compute the indices of the boxes that pass the uncertainty, IoU (NMS) and area filters, in that
+        order, as batched tensor operations.
+
+        :param conf: Confidence scores with shape (N,)
+        :param xyxy: Boxes in pixel coordinates with shape (N, 4)
+        :param shape: (height, width) of the image the areas are normalized by
+        :return: Tensor of indices into the original boxes
+        """
+        # Uncertainty
+        keep = torch.nonzero(conf > self.uncertainty_thresh).flatten()
+        if keep.numel() == 0:
+            return keep
+
+        # IoU (NMS on the remaining boxes only)
+        keep = keep[nms(xyxy[keep].float(), conf[keep].float(), self.iou_thresh)]
+
+        # Area
+        height, width = shape
+        area_norm = ((xyxy[keep, 2] - xyxy[keep, 0]) / width) * ((xyxy[keep, 3] - xyxy[keep, 1]) / height)
+        keep = keep[(area_norm >= self.min_area_thresh) & (area_norm <= self.max_area_thresh)]
+
+        return keep
+
+    @staticmethod
+    def get_offset(results):
+        """
+        Results computed on a window of a larger image (e.g. a tile) carry an 'offset' (x, y) attribute
+        that maps their coordinates back to the full image, and a 'full_shape' (height, width).
+
+        :param results: Ultralytics Results
+        :return: Offset as (x, y)
+        """
+        return getattr(results, 'offset', (0, 0))
+
+    @staticmethod
+    def copy_window_attributes(source, target):
+        """
+        Copy the window attributes (offset, full_shape) from one Results object to another, as
+        indexing a Results object creates a new one without them.
+        """
+        for attr in ('offset', 'full_shape'):
+            if hasattr(source, attr):
+                setattr(target, attr, getattr(source, attr))
+        return target
+
+    def apply_filters(self, results, return_indices=False):
+        """
+        Check if the results passed all filters.
+
+        :param results: Ultralytics Results (or list containing one) for a single image
+        :param return_indices: Also return the indices of the kept boxes (None if filtering failed)
+        :return: Filtered Results, or (filtered Results, indices)
+        """
+        keep = None
+        try:
+            if isinstance(results, list):
+                results = results[0]
+            boxes = results.boxes
+            shape = getattr(results, 'full_shape', results.orig_shape)
+            keep = self.get_filter_indices(boxes.conf, boxes.xyxy, shape)
+            # Index the Results object once, rather than once per filter
+            results = self.copy_window_attributes(results, results[keep])
+            keep = keep.cpu().numpy()
+        except Exception as e:
+            print(f"Warning: Failed to filter results\n{e}")
+            keep = None
+
+        if return_indices:
+            return results, keep
+        return results
+
+    def get_mapped_short_label(self, cls_name, conf):
+        """
+        Get the short label for a detection result based on confidence and class mapping.
+
+        :param cls_name: Class name
+        :param conf: Confidence score
+        :return: Short label as a string
+        """
+        if conf <= self.uncertainty_thresh:
+            return 'Review'
+        return self.class_mapping.get(cls_name, {}).get('short_label_code', 'Review')
+
+    def extract_classification_result(self, result):
+        """
+        Extract relevant information from a classification result.
+
+        :param result: Classification result
+        :return: Tuple containing image path, top1 class name, top1 confidence and top5 predictions by class name
+        """
+        image_path = result.path.replace("\\", "/")
+        class_names = result.names
+        top1cls = class_names[result.probs.top1]
+        top1conf = float(result.probs.top1conf)
+        predictions = {class_names[idx]: float(conf) for idx, conf in zip(result.probs.top5, result.probs.top5conf)}
+
+        return image_path, top1cls, top1conf, predictions
+
+    def classification_record(self, result):
+        """
+        Convert a single classification result into an annotation record.
+
+        :param result: Classification result
+        :return: AnnotationRecord
+        """
+        image_path, cls_name, conf, predictions = self.extract_classification_result(result)
+        cls = int(result.probs.top1)
+
+        return AnnotationRecord(image_path=image_path,
+                                cls=cls,
+                                cls_name=cls_name,
+                                conf=conf,
+                                short_label=self.get_mapped_short_label(cls_name, conf),
+                                predictions=predictions)
+
+    def extract_detection_arrays(self, results):
+        """
+        Extract the class IDs, confidences and boxes for all detections of an image in one pass.
+
+        :param results: Ultralytics Results for a single image
+        :return: Tuple containing image path, class IDs (N,), confidences (N,) and boxes (N, 4)
+        """
+        image_path = results.path.replace("\\", "/")
+        boxes = results.boxes.cpu().numpy()
+        cls = boxes.cls.astype(int)
+        conf = boxes.conf.astype(float)
+        xyxy = boxes.xyxy.astype(float) + np.tile(self.get_offset(results), 2)
+
+        return image_path, cls, conf, xyxy
+
+    def extract_segmentation_arrays(self, results):
+        """
+        Extract the class IDs, confidences and polygons for all detections of an image in one pass.
+
+        :param results: Ultralytics Results for a single image
+        :return: Tuple containing image path, class IDs (N,), confidences (N,) and a list of (M, 2) polygons
+        """
+        image_path, cls, conf, _ = self.extract_detection_arrays(results)
+        offset = np.array(self.get_offset(results), dtype=float)
+        points = [p.astype(float) + offset for p in results.masks.cpu().xy]
+
+        return image_path, cls, conf, points
+
+    def get_mapped_short_labels(self, names, cls, conf):
+        """
+        Vectorized version of get_mapped_short_label for all detections of an image.
+
+        :param names: Dictionary mapping class IDs to class names
+        :param cls: Class IDs with shape (N,)
+        :param conf: Confidence scores with shape (N,)
+        :return: Tuple containing a list of class names and a list of short labels
+        """
+        # Map each unique class once instead of each detection
+        unique_cls = np.unique(cls)
+        cls_names = {c: names[c] for c in unique_cls}
+        short_labels = {c: self.class_mapping.get(cls_names[c], {}).get('short_label_code', 'Review')
+                        for c in unique_cls}
+
+        below_thresh = conf <= self.uncertainty_thresh
+        return ([cls_names[c] for c in cls],
+                ['Review' if low else short_labels[c] for c, low in zip(cls, below_thresh)])
+
+    def build_records(self, image_path, names, cls, conf, bboxes=None, points=None, indices=None):
+        """
+        Build annotation records from the (already filtered) arrays of a single image.
+
+        :param image_path: Path to the image
+        :param names: Dictionary mapping class IDs to class names
+        :param cls: Class IDs with shape (N,)
+        :param conf: Confidence scores with shape (N,)
+        :param bboxes: Boxes with shape (N, 4), if any
+        :param points: List of N polygons, if any
+        :param indices: Indices of the predictions in the image's PredictionCache entry, if any
+        :return: List of AnnotationRecord
+        """
+        cls_names, short_labels = self.get_mapped_short_labels(names, cls, conf)
+        indices = [None] * len(cls) if indices is None else [int(i) for i in indices]
+
+        if points is not None:
+            return [AnnotationRecord(image_path=image_path,
+                                     cls=int(c),
+                                     cls_name=n,
+                                     conf=float(s),
+                                     short_label=sl,
+                                     points=p,
+                                     index=i)
+                    for c, n, s, sl, p, i in zip(cls, cls_names, conf, short_labels, points, indices)
+                    if len(p)]
+
+        return [AnnotationRecord(image_path=image_path,
+                                 cls=int(c),
+                                 cls_name=n,
+                                 conf=float(s),
+                                 short_label=sl,
+                                 bbox=b,
+                                 index=i)
+                for c, n, s, sl, b, i in zip(cls, cls_names, conf, short_labels, bboxes, indices)]
+
+    def detection_records(self, results):
+        """
+        Filter a single image's detection results and convert them into annotation records.
+
+        :param results: Ultralytics Results (or list containing one) for a single image
+        :return: List of AnnotationRecord
+        """
+        offset = self.cache_predictions(results, 'detect')
+        results, keep = self.apply_filters(results, return_indices=True)
+
+        if results is None or not len(results):
+            return []
+
+        image_path, cls, conf, xyxy = self.extract_detection_arrays(results)
+        indices = offset + keep if offset is not None and keep is not None else None
+        return self.build_records(image_path, results.names, cls, conf, bboxes=xyxy, indices=indices)
+
+    def segmentation_records(self, results):
+        """
+        Filter a single image's segmentation results and convert them into annotation records.
+
+        :param results: Ultralytics Results (or list containing one) for a single image
+        :return: List of AnnotationRecord
+        """
+        offset = self.cache_predictions(results, 'segment')
+        results, keep = self.apply_filters(results, return_indices=True)
+
+        if results is None or not len(results) or results.masks is None:
+            return []
+
+        image_path, cls, conf, points = self.extract_segmentation_arrays(results)
+        indices = offset + keep if offset is not None and keep is not None else None
+        return self.build_records(image_path, results.names, cls, conf, points=points, indices=indices)
+
+    def start_cache_entry(self, image_path, task, names, shape):
+        """
+        Start the prediction cache entry for an image the first time this processor sees it, so a new
+        run replaces the predictions of the previous one while windows of the same run accumulate.
+        """
+        if image_path not in self.cached_images:
+            self.prediction_cache.start(image_path, task, names, self.class_mapping, shape)
+            self.cached_images.add(image_path)
+
+    def cache_predictions(self, results, task):
+        """
+        Record the raw (pre-filter) predictions of a single image's results in the prediction cache.
+
+        :param results: Ultralytics Results (or list containing one) for a single image
+        :param task: 'detect' or 'segment'
+        :return: Index of the first prediction in the image's cache entry, or None if not cached
+        """
+        if self.prediction_cache is None:
+            return None
+
+        try:
+            if isinstance(results, list):
+                results = results[0]
+
+            image_path = results.path.replace("\\", "/")
+            self.start_cache_entry(image_path, task, results.names, getattr(results, 'full_shape', results.orig_shape))
+
+            if not len(results):
+                return None
+
+            _, cls, conf, xyxy = self.extract_detection_arrays(results)
+            points = None
+            if task == 'segment':
+                if results.masks is not None:
+                    _, _, _, points = self.extract_segmentation_arrays(results)
+                else:
+                    # Keep the polygons aligned with the boxes
+                    points = [np.zeros((0, 2))] * len(cls)
+
+            return self.prediction_cache.add_detections(image_path, xyxy, conf, cls, points)
+        except Exception as e:
+            print(f"Warning: Failed to cache predictions\n{e}")
+            return None
+
+    def cached_records(self, image_path, entry, exclude=None):
+        """
+        Re-apply the current thresholds and NMS to an image's cached raw predictions.
+
+        :param image_path: Path to the image
+        :param entry: The image's PredictionCache entry
+        :param exclude: Optional collection of prediction indices not to create records for
+        :return: List of AnnotationRecord
+        """
+        if not len(entry['conf']):
+            return []
+
+        conf = torch.from_numpy(entry['conf'].astype(np.float32))
+        xyxy = torch.from_numpy(entry['xyxy'])
+        keep = self.get_filter_indices(conf, xyxy, entry['shape']).numpy()
+
+        # Predictions that are still kept are not created again (e.g. annotations the user verified)
+        if exclude:
+            keep = keep[~np.isin(keep, list(exclude))]
+
+        cls = entry['cls'][keep].astype(int)
+        conf = entry['conf'][keep].astype(float)
+
+        if entry['task'] == 'segment':
+            points = [entry['points'][i] for i in keep]
+            return self.build_records(image_path, entry['names'], cls, conf, points=points, indices=keep)
+
+        return self.build_records(image_path, entry['names'], cls, conf, bboxes=entry['xyxy'][keep], indices=keep)
+
+    def from_sam(self, masks, scores, image, image_path):
+        """
+        Converts SAM results to Ultralytics Results Object.
+
+        Args:
+            masks (torch.Tensor): Predicted masks with shape (N, 1, H, W).
+            scores (torch.Tensor): Confidence scores for each mask with shape (N, 1).
+            image (np.ndarray): The original, unprocessed image.
+            image_path (str): Path to the image file.
+
+        Returns:
+            results (Results): Ultralytics Results object.
+        """
+        # Ensure the original image is in the correct format
+        if not isinstance(image, np.ndarray):
+            image = image.cpu().numpy()
+
+        # Ensure masks have the correct shape (N, 1, H, W)
+        if masks.ndim != 4 or masks.shape[1] != 1:
+            raise ValueError(f"Expected masks to have shape (N, 1, H, W), but got {masks.shape}")
+
+        # Scale masks to the original image size and remove extra dimensions
+        scaled_masks = ops.scale_masks(masks.float(), image.shape[:2], padding=False)
+        scaled_masks = scaled_masks > 0.5  # Apply threshold to masks
+
+        # Ensure scaled_masks is 3D (N, H, W)
+        if scaled_masks.ndim == 4:
+            scaled_masks = scaled_masks.squeeze(1)
+
+        # Generate bounding boxes from masks using batched_mask_to_box
+        scaled_boxes = batched_mask_to_box(scaled_masks)
+
+        # Ensure scores has shape (N,) by removing extra dimensions
+        scores = scores.squeeze().cpu()
+        if scores.ndim == 0:  # If only one score, make it a 1D tensor
+            scores = scores.unsqueeze(0)
+
+        # Generate class labels
+        cls = torch.arange(len(masks), dtype=torch.int32).cpu()
+
+        # Ensure all tensors are 2D before concatenating
+        scaled_boxes = scaled_boxes.cpu()
+        if scaled_boxes.ndim == 1:
+            scaled_boxes = scaled_boxes.unsqueeze(0)
+        scores = scores.view(-1, 1)  # Reshape to (N, 1)
+        cls = cls.view(-1, 1)  # Reshape to (N, 1)
+
+        # Combine bounding boxes, scores, and class labels
+        scaled_boxes = torch.cat([scaled_boxes, scores, cls], dim=1)
+
+        # Create names dictionary (placeholder for consistency)
+        names = dict(enumerate(str(i) for i in range(len(masks))))
+
+        # Create Results object
+        results = Results(image,
+                          path=image_path,
+                          names=names,
+                          masks=scaled_masks,
+                          boxes=scaled_boxes)
+
+        return results
+
+    def from_supervision(self, detections, image, image_path, names):
+        """
+        Convert Supervision Detections to Ultralytics Results format with proper mask handling.
+
+        Args:
+            detections (Detections): Supervision detection object
+            image (np.ndarray): Original image array
+            image_path (str, optional): Path to the image file
+            names (dict, optional): Dictionary mapping class ids to class names
+
+        Returns:
+            results_generator (generator): A generator that yields Ultralytics Results.
+        """
+        # Ensure original image is numpy array
+        if torch.is_tensor(image):
+            image = image.cpu().numpy()
+
+        # Create default names if not provided
+        if names is None:
+            names = {i: str(i) for i in range(len(detections))} if len(detections) > 0 else {}
+
+        if len(detections) == 0:
+            return Results(orig_img=image, path=image_path, names=names)
+
+        # Handle masks if present
+        if hasattr(detections, 'mask') and detections.mask is not None:
+            # Convert masks to torch tensor if needed
+            masks = torch.as_tensor(detections.mask, dtype=torch.float32)
+
+            # Ensure masks have shape (N, 1, H, W)
+            if masks.ndim == 3:
+                masks = masks.unsqueeze(1)
+
+            # Scale masks to match original image size
+            scaled_masks = scale_masks(masks, image.shape[:2], padding=False)
+            scaled_masks = scaled_masks > 0.5  # Apply threshold
+
+            # Ensure scaled_masks is 3D (N, H, W)
+            if scaled_masks.ndim == 4:
+                scaled_masks = scaled_masks.squeeze(1)
+        else:
+            scaled_masks = None
+
+        # Convert boxes and scores to torch tensors
+        scaled_boxes = torch.as_tensor(detections.xyxy, dtype=torch.float32)
+        scores = torch.as_tensor(detections.confidence, dtype=torch.float32).view(-1, 1)
+
+        # Convert class IDs to torch tensor
+        cls = torch.as_tensor(detections.class_id, dtype=torch.int32).view(-1, 1)
+
+        # Combine boxes, scores, and class IDs
+        if scaled_boxes.ndim == 1:
+            scaled_boxes = scaled_boxes.unsqueeze(0)
+        scaled_boxes = torch.cat([scaled_boxes, scores, cls], dim=1)
+
+        # Create Results object
+        results = Results(image,
+                          path=image_path,
+                          names=names,
+                          boxes=scaled_boxes,
+                          masks=scaled_masks)
+
+        yield results
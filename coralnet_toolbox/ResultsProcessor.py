@@ -1,17 +1,13 @@
+import time
+
 import numpy as np
-import torch
 
 from PyQt5.QtCore import QPointF
 
-from torchvision.ops import nms
-from ultralytics.engine.results import Results
-from ultralytics.models.sam.amg import batched_mask_to_box
-from ultralytics.utils import ops
-from ultralytics.utils.ops import scale_masks
-
 from coralnet_toolbox.Annotations.QtPolygonAnnotation import PolygonAnnotation
 from coralnet_toolbox.Annotations.QtRectangleAnnotation import RectangleAnnotation
 from coralnet_toolbox.QtProgressBar import ProgressBar
+from coralnet_toolbox.ResultsCore import ResultsCore
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -19,7 +15,13 @@ from coralnet_toolbox.QtProgressBar import ProgressBar
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-class ResultsProcessor:
+class ResultsProcessor(ResultsCore):
+    """
+    Qt adapter around ResultsCore; turns annotation records into annotations and displays them.
+
+    :param main_window: MainWindow object
+    :param class_mapping: Dictionary mapping class names to label dictionaries
+    """
     def __init__(self, 
                  main_window, 
                  class_mapping, 
@@ -27,97 +29,46 @@ class ResultsProcessor:
                  iou_thresh=0.2, 
                  min_area_thresh=0.00, 
                  max_area_thresh=0.40):
+        super().__init__(class_mapping,
+                         uncertainty_thresh=uncertainty_thresh,
+                         iou_thresh=iou_thresh,
+                         min_area_thresh=min_area_thresh,
+                         max_area_thresh=max_area_thresh)
+        
         self.main_window = main_window
         self.label_window = main_window.label_window
         self.annotation_window = main_window.annotation_window
-
-        self.class_mapping = class_mapping
         
-        self.uncertainty_thresh = uncertainty_thresh
-        self.iou_thresh = iou_thresh
-        self.min_area_thresh = min_area_thresh
-        self.max_area_thresh = max_area_thresh
+        # Record raw predictions so thresholds can be re-applied without re-running the model
+        self.prediction_cache = getattr(main_window, 'prediction_cache', None)
         
-    def filter_by_uncertainty(self, results):
-        """
-        Filter the results based on the uncertainty threshold.
-        """
-        try:
-            if isinstance(results, list):
-                results = results[0]
-            results = results[results.boxes.conf > self.uncertainty_thresh]
-        except Exception as e:
-            print(f"Warning: Failed to filter results by uncertainty\n{e}")
-            
-        return results
-    
-    def filter_by_iou(self, results):
-        """Filter the results based on the IoU threshold."""
-        try:
-            if isinstance(results, list):
-                results = results[0]
-            results = results[nms(results.boxes.xyxy, results.boxes.conf, self.iou_thresh)]
-        except Exception as e:  
-            print(f"Warning: Failed to filter results by IoU\n{e}")
-            
-        return results
-    
-    def filter_by_area(self, results):
-        """
-        Filter the results based on the area threshold.
-        """
-        try:
-            if isinstance(results, list):
-                results = results[0]
-            x_norm, y_norm, w_norm, h_norm = results.boxes.xywhn.T
-            area_norm = w_norm * h_norm
-            results = results[(area_norm >= self.min_area_thresh) & (area_norm <= self.max_area_thresh)]
-        except Exception as e:
-            print(f"Warning: Failed to filter results by area\n{e}")
-            
-        return results
-    
-    def apply_filters(self, results):
-        """Check if the results passed all filters."""
-        results = self.filter_by_uncertainty(results)
-        results = self.filter_by_iou(results)
-        results = self.filter_by_area(results)
-        return results
-
-    def extract_classification_result(self, result):
+    def process_single_classification_result(self, result, annotation):
         """
-        Extract relevant information from a classification result.
+        Process a single classification result.
         """
-        predictions = {}
-
         try:
-            image_path = result.path.replace("\\", "/")
-            class_names = result.names
-            top1 = result.probs.top1
-            top1conf = result.probs.top1conf
-            top1cls = class_names[top1]
-            top5 = result.probs.top5
-            top5conf = result.probs.top5conf
+            record = self.classification_record(result)
         except Exception as e:
             print(f"Warning: Failed to process classification result\n{e}")
-            return predictions
-
-        for idx, conf in zip(top5, top5conf):
-            class_name = class_names[idx]
+            return
+        
+        # Map the class names of the top5 predictions to label objects
+        predictions = {}
+        for class_name, conf in record.predictions.items():
             label = self.label_window.get_label_by_short_code(class_name)
             if label:
-                predictions[label] = float(conf)
-
-        return image_path, top1cls, top1conf, predictions
-
-    def process_single_classification_result(self, result, annotation):
-        """
-        Process a single classification result.
-        """
-        # Extract relevant information from the classification result
-        image_path, cls_name, conf, predictions = self.extract_classification_result(result)
+                predictions[label] = conf
+                
         # Store and display the annotation
-        self.store_and_display_annotation(annotation, image_path, cls_name, conf, predictions)
+        self.store_and_display_annotation(annotation, record.image_path, record.cls_name, record.conf, predictions)
+        
+        if self.prediction_cache is not None:
+            self.start_cache_entry(record.image_path, 'classify', result.names, result.orig_shape)
+            self.prediction_cache.add_classification(record.image_path,
+                                                     annotation.id,
+                                                     record.cls_name,
+                                                     record.conf,
+                                                     record.predictions)
 
     def process_classification_results(self, results_generator, annotations):
         """
@@ -135,38 +86,44 @@ class ResultsProcessor:
         progress_bar.stop_progress()
         progress_bar.close()
 
-    def extract_detection_result(self, result):
+    def create_record_annotations(self, records, create_annotation):
         """
-        Extract relevant information from a detection result.
+        Create, store and display the annotations for a single image's records in one pass; labels are
+        looked up once per short label and the image window is refreshed once per image.
 
-        :param result: Detection result
-        :return: Tuple containing class, class name, confidence, and bounding box coordinates
+        :param records: List of AnnotationRecord for a single image
+        :param create_annotation: Callable taking (record, label) and returning an annotation or None
+        :return: Number of annotations created
         """
-        # Class ID, class name, confidence, and bounding box coordinates
-        image_path = result.path.replace("\\", "/")
-        cls = int(result.boxes.cls.cpu().numpy()[0])
-        cls_name = result.names[cls]
-        conf = float(result.boxes.conf.cpu().numpy()[0])
-        x_min, y_min, x_max, y_max = map(float, result.boxes.xyxy.cpu().numpy()[0])
+        if not records:
+            return 0
 
-        return image_path, cls, cls_name, conf, x_min, y_min, x_max, y_max
+        labels = {}
+        annotations = []
+        indices = []
 
-    def process_single_detection_result(self, result):
-        """
-        Process a single detection result.
-        """       
-        # Get image path, class, class name, confidence, and bounding box coordinates
-        image_path, cls, cls_name, conf, x_min, y_min, x_max, y_max = self.extract_detection_result(result)
-        # Get the short label given the class name and confidence
-        short_label = self.get_mapped_short_label(cls_name, conf)
-        # Get the label object given the short label
-        label = self.label_window.get_label_by_short_code(short_label)
-        # Create the rectangle annotation
-        annotation = self.create_rectangle_annotation(x_min, y_min, x_max, y_max, label, image_path)
-        
-        if annotation:
-            # Store and display the annotation
-            self.store_and_display_annotation(annotation, image_path, cls_name, conf)
+        for record in records:
+            # Get the label object given the short label (cached)
+            if record.short_label not in labels:
+                labels[record.short_label] = self.label_window.get_label_by_short_code(record.short_label)
+
+            annotation = create_annotation(record, labels[record.short_label])
+
+            if annotation:
+                # Store the annotation, deferring the image window refresh
+                self.store_annotation(annotation, record.image_path, record.cls_name, record.conf)
+                annotations.append(annotation)
+                indices.append(record.index)
+
+        if self.prediction_cache is not None:
+            self.prediction_cache.add_annotation_ids(records[0].image_path, [a.id for a in annotations], indices)
+
+        # Update the image in the image window once for all annotations
+        self.main_window.image_window.update_image_annotations(records[0].image_path)
+        # Unselect all annotations
+        self.annotation_window.unselect_annotations()
+
+        return len(annotations)
 
     def process_detection_results(self, results_generator):
         """
@@ -176,48 +133,13 @@ class ResultsProcessor:
         progress_bar.show()
 
         for results in results_generator:
-            # Apply filtering to the results
-            results = self.apply_filters(results)
-            for result in results:
-                if result:
-                    self.process_single_detection_result(result)
-                progress_bar.update_progress()
+            # Apply filtering and convert the results to records, then annotations in one pass
+            self.create_record_annotations(self.detection_records(results), self.create_detection_annotation)
+            progress_bar.update_progress()
 
         progress_bar.stop_progress()
         progress_bar.close()
 
-    def extract_segmentation_result(self, result):
-        """
-        Extract relevant information from a segmentation result.
-
-        :param result: Segmentation result
-        :return: Tuple containing class, class name, confidence, and polygon points
-        """
-        # Class ID, class name, confidence, and polygon points
-        image_path = result.path.replace("\\", "/")
-        cls = int(result.boxes.cls.cpu().numpy()[0])
-        cls_name = result.names[cls]
-        conf = float(result.boxes.conf.cpu().numpy()[0])
-        points = result.masks.cpu().xy[0].astype(float)
-        return image_path, cls, cls_name, conf, points
-
-    def process_single_segmentation_result(self, result):
-        """
-        Process a single segmentation result.
-        """
-        # Get image path, class, class name, confidence, and polygon points
-        image_path, cls, cls_name, conf, points = self.extract_segmentation_result(result)
-        # Get the short label given the class name and confidence
-        short_label = self.get_mapped_short_label(cls_name, conf)
-        # Get the label object given the short label
-        label = self.label_window.get_label_by_short_code(short_label)
-        # Create the polygon annotation
-        annotation = self.create_polygon_annotation(points, label, image_path)
-        
-        if annotation:
-            # Store and display the annotation
-            self.store_and_display_annotation(annotation, image_path, cls_name, conf)
-
     def process_segmentation_results(self, results_generator):
         """
         Process the segmentation results from the results generator.
@@ -226,27 +148,118 @@ class ResultsProcessor:
         progress_bar.show()
 
         for results in results_generator:
-            # Apply filtering to the results
-            results = self.apply_filters(results)
-            for result in results:
-                if result:
-                    self.process_single_segmentation_result(result)
-                progress_bar.update_progress()
+            # Apply filtering and convert the results to records, then annotations in one pass
+            self.create_record_annotations(self.segmentation_records(results), self.create_segmentation_annotation)
+            progress_bar.update_progress()
 
         progress_bar.stop_progress()
         progress_bar.close()
 
-    def get_mapped_short_label(self, cls_name, conf):
+    def create_detection_annotation(self, record, label):
+        """Create a rectangle annotation from a detection record."""
+        return self.create_rectangle_annotation(*record.bbox, label, record.image_path)
+
+    def create_segmentation_annotation(self, record, label):
+        """Create a polygon annotation from a segmentation record."""
+        return self.create_polygon_annotation(record.points, label, record.image_path)
+
+    def reapply_thresholds(self, image_paths=None):
         """
-        Get the short label for a detection result based on confidence and class mapping.
+        Re-apply the current thresholds and NMS to the cached raw predictions of each image, replacing
+        the annotations previously created from them. Annotations the user has verified or relabeled
+        are left untouched, and their predictions are not created again.
 
-        :param cls_name: Class name
-        :param conf: Confidence score
-        :return: Short label as a string
+        :param image_paths: Image paths to update, or None for all cached images
+        :return: Number of annotations created or updated
         """
-        if conf <= self.uncertainty_thresh:
-            return 'Review'
-        return self.class_mapping.get(cls_name, {}).get('short_label_code', 'Review')
+        if self.prediction_cache is None:
+            return 0
+
+        start = time.perf_counter()
+        cached_paths = self.prediction_cache.image_paths()
+        image_paths = cached_paths if image_paths is None else [p for p in image_paths if p in cached_paths]
+        count = 0
+
+        # Each entry is filtered with the class mapping it was predicted with
+        class_mapping = self.class_mapping
+
+        try:
+            for image_path in image_paths:
+                entry = self.prediction_cache.get(image_path)
+                if entry is None:
+                    continue
+
+                self.class_mapping = entry['class_mapping'] if entry['class_mapping'] else {}
+
+                if entry['task'] == 'classify':
+                    count += self.reapply_classification_thresholds(entry)
+                    continue
+
+                # Remove the machine annotations created from the cached predictions, keeping verified ones;
+                # predictions whose annotation the user deleted are suppressed
+                verified, deleted = {}, []
+                for annotation_id, index in entry['annotation_ids'].items():
+                    annotation = self.annotation_window.annotations_dict.get(annotation_id)
+                    if annotation is None:
+                        deleted.append(index)
+                    elif annotation.user_confidence:
+                        verified[annotation_id] = index
+                    else:
+                        self.annotation_window.delete_annotation(annotation_id)
+
+                self.prediction_cache.set_annotation_ids(image_path, verified)
+                self.prediction_cache.add_suppressed(image_path, set(deleted) - {None})
+
+                exclude = (set(verified.values()) | entry['suppressed']) - {None}
+                records = self.cached_records(image_path, entry, exclude=exclude)
+                if entry['task'] == 'segment':
+                    created = self.create_record_annotations(records, self.create_segmentation_annotation)
+                else:
+                    created = self.create_record_annotations(records, self.create_detection_annotation)
+
+                if not created:
+                    self.main_window.image_window.update_image_annotations(image_path)
+
+                count += created
+        finally:
+            self.class_mapping = class_mapping
+
+        print(f"Re-applied thresholds to {len(image_paths)} images ({count} annotations) "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        return count
+
+    def reapply_classification_thresholds(self, entry):
+        """
+        Re-apply the uncertainty threshold to the cached classifications of an image's annotations.
+
+        :param entry: The image's PredictionCache entry
+        :return: Number of annotations updated
+        """
+        review_label = self.label_window.get_label_by_id('-1')
+        count = 0
+
+        for annotation_id, (cls_name, conf, predictions) in entry['classifications'].items():
+            annotation = self.annotation_window.annotations_dict.get(annotation_id)
+            if annotation is None or annotation.user_confidence:
+                continue
+
+            # Map the class names of the top5 predictions to label objects
+            label_predictions = {}
+            for class_name, class_conf in predictions.items():
+                label = self.label_window.get_label_by_short_code(class_name)
+                if label:
+                    label_predictions[label] = class_conf
+
+            annotation.update_machine_confidence(label_predictions)
+
+            # If the confidence is below the threshold, set the label to review
+            if conf < self.uncertainty_thresh:
+                annotation.update_label(review_label)
+
+            count += 1
+
+        return count
 
     def create_rectangle_annotation(self, x_min, y_min, x_max, y_max, label, image_path):
         """
@@ -286,7 +299,7 @@ class ResultsProcessor:
         :return: PolygonAnnotation object
         """
         try:
-            points = [QPointF(x, y) for x, y in points]
+            points = [QPointF(x, y) for x, y in np.asarray(points, dtype=float).tolist()]
             annotation = PolygonAnnotation(points,
                                            label.short_label_code,
                                            label.long_label_code,
@@ -299,9 +312,9 @@ class ResultsProcessor:
             
         return annotation
 
-    def store_and_display_annotation(self, annotation, image_path, cls_name, conf, predictions=None):
+    def store_annotation(self, annotation, image_path, cls_name, conf, predictions=None):
         """
-        Store and display the annotation in the annotation window and image window.
+        Store the annotation in the annotation window, without refreshing the image window.
 
         :param annotation: Annotation object
         :param image_path: Path to the image
@@ -334,133 +347,20 @@ class ResultsProcessor:
             annotation.create_cropped_image(self.annotation_window.rasterio_image)
             self.main_window.confidence_window.display_cropped_image(annotation)
 
-        # Update the image in the image window
-        self.main_window.image_window.update_image_annotations(image_path)
-        # Unselect all annotations
-        self.annotation_window.unselect_annotations()
-                
-    def from_sam(self, masks, scores, image, image_path):
+    def store_and_display_annotation(self, annotation, image_path, cls_name, conf, predictions=None):
         """
-        Converts SAM results to Ultralytics Results Object.
-
-        Args:
-            masks (torch.Tensor): Predicted masks with shape (N, 1, H, W).
-            scores (torch.Tensor): Confidence scores for each mask with shape (N, 1).
-            image (np.ndarray): The original, unprocessed image.
-            image_path (str): Path to the image file.
+        Store and display the annotation in the annotation window and image window.
 
-        Returns:
-            results (Results): Ultralytics Results object.
-        """
-        # Ensure the original image is in the correct format
-        if not isinstance(image, np.ndarray):
-            image = image.cpu().numpy()
-
-        # Ensure masks have the correct shape (N, 1, H, W)
-        if masks.ndim != 4 or masks.shape[1] != 1:
-            raise ValueError(f"Expected masks to have shape (N, 1, H, W), but got {masks.shape}")
-
-        # Scale masks to the original image size and remove extra dimensions
-        scaled_masks = ops.scale_masks(masks.float(), image.shape[:2], padding=False)
-        scaled_masks = scaled_masks > 0.5  # Apply threshold to masks
-
-        # Ensure scaled_masks is 3D (N, H, W)
-        if scaled_masks.ndim == 4:
-            scaled_masks = scaled_masks.squeeze(1)
-
-        # Generate bounding boxes from masks using batched_mask_to_box
-        scaled_boxes = batched_mask_to_box(scaled_masks)
-
-        # Ensure scores has shape (N,) by removing extra dimensions
-        scores = scores.squeeze().cpu()
-        if scores.ndim == 0:  # If only one score, make it a 1D tensor
-            scores = scores.unsqueeze(0)
-
-        # Generate class labels
-        cls = torch.arange(len(masks), dtype=torch.int32).cpu()
-
-        # Ensure all tensors are 2D before concatenating
-        scaled_boxes = scaled_boxes.cpu()
-        if scaled_boxes.ndim == 1:
-            scaled_boxes = scaled_boxes.unsqueeze(0)
-        scores = scores.view(-1, 1)  # Reshape to (N, 1)
-        cls = cls.view(-1, 1)  # Reshape to (N, 1)
-
-        # Combine bounding boxes, scores, and class labels
-        scaled_boxes = torch.cat([scaled_boxes, scores, cls], dim=1)
-
-        # Create names dictionary (placeholder for consistency)
-        names = dict(enumerate(str(i) for i in range(len(masks))))
-
-        # Create Results object
-        results = Results(image, 
-                          path=image_path, 
-                          names=names, 
-                          masks=scaled_masks, 
-                          boxes=scaled_boxes)
-        
-        return results
-    
-    def from_supervision(self, detections, image, image_path, names):
+        :param annotation: Annotation object
+        :param image_path: Path to the image
+        :param cls_name: Class name
+        :param conf: Confidence score
+        :param predictions: Dictionary containing class predictions
         """
-        Convert Supervision Detections to Ultralytics Results format with proper mask handling.
+        # Store the annotation
+        self.store_annotation(annotation, image_path, cls_name, conf, predictions)
 
-        Args:
-            detections (Detections): Supervision detection object
-            image (np.ndarray): Original image array
-            image_path (str, optional): Path to the image file
-            names (dict, optional): Dictionary mapping class ids to class names
-
-        Returns:
-            results_generator (generator): A generator that yields Ultralytics Results.
-        """
-        # Ensure original image is numpy array
-        if torch.is_tensor(image):
-            image = image.cpu().numpy()
-
-        # Create default names if not provided
-        if names is None:
-            names = {i: str(i) for i in range(len(detections))} if len(detections) > 0 else {}
-
-        if len(detections) == 0:
-            return Results(orig_img=image, path=image_path, names=names)
-
-        # Handle masks if present
-        if hasattr(detections, 'mask') and detections.mask is not None:
-            # Convert masks to torch tensor if needed
-            masks = torch.as_tensor(detections.mask, dtype=torch.float32)
-
-            # Ensure masks have shape (N, 1, H, W)
-            if masks.ndim == 3:
-                masks = masks.unsqueeze(1)
-
-            # Scale masks to match original image size
-            scaled_masks = scale_masks(masks, image.shape[:2], padding=False)
-            scaled_masks = scaled_masks > 0.5  # Apply threshold
-
-            # Ensure scaled_masks is 3D (N, H, W)
-            if scaled_masks.ndim == 4:
-                scaled_masks = scaled_masks.squeeze(1)
-        else:
-            scaled_masks = None
-
-        # Convert boxes and scores to torch tensors
-        scaled_boxes = torch.as_tensor(detections.xyxy, dtype=torch.float32)
-        scores = torch.as_tensor(detections.confidence, dtype=torch.float32).view(-1, 1)
-
-        # Convert class IDs to torch tensor
-        cls = torch.as_tensor(detections.class_id, dtype=torch.int32).view(-1, 1)
-
-        # Combine boxes, scores, and class IDs
-        if scaled_boxes.ndim == 1:
-            scaled_boxes = scaled_boxes.unsqueeze(0)
-        scaled_boxes = torch.cat([scaled_boxes, scores, cls], dim=1)
-
-        # Create Results object
-        results = Results(image,
-                          path=image_path,
-                          names=names,
-                          boxes=scaled_boxes, 
-                          masks=scaled_masks)
-
-        yield results
\ No newline at end of file
+        # Update the image in the image window
+        self.main_window.image_window.update_image_annotations(image_path)
+        # Unselect all annotations
+        self.annotation_window.unselect_annotations()
@@ -0,0 +1,148 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class EmbeddingCache:
+    """
+    Cache of SAM image embeddings, keyed by image path, modification time, model, imgsz and (optionally)
+    the window of the image that was encoded. Embeddings are kept in an in-memory LRU and can optionally
+    be persisted to disk as compressed NumPy archives so revisiting an image skips the encoder entirely.
+
+    :param max_items: Maximum number of embeddings kept in memory
+    :param cache_dir: Directory for the on-disk store, or None to disable it
+    """
+    def __init__(self, max_items=32, cache_dir=None):
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.embeddings = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(image_path, model_path, imgsz, window=None):
+        """
+        Create a cache key for the given image and encoder settings.
+
+        :param image_path: Path to the image
+        :param model_path: Path (or name) of the SAM model weights
+        :param imgsz: Image size the image was resized to before encoding
+        :param window: Optional (left, top, right, bottom) of the encoded region
+        :return: Key as a hex string
+        """
+        image_path = os.path.abspath(image_path)
+        mtime = os.path.getmtime(image_path) if os.path.exists(image_path) else 0
+        key = f"{image_path}|{mtime}|{os.path.basename(str(model_path))}|{imgsz}|{window}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def get_disk_path(self, key):
+        """Get the on-disk path for a key."""
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def __contains__(self, key):
+        with self.lock:
+            if key in self.embeddings:
+                return True
+        return self.cache_dir is not None and os.path.exists(self.get_disk_path(key))
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def get(self, key):
+        """
+        Get the cached predictor state for a key, checking memory first and then disk.
+
+        :param key: Cache key
+        :return: Dictionary with the predictor state, or None
+        """
+        with self.lock:
+            if key in self.embeddings:
+                self.embeddings.move_to_end(key)
+                self.hits += 1
+                return self.embeddings[key]
+
+        if self.cache_dir is not None and os.path.exists(self.get_disk_path(key)):
+            try:
+                with np.load(self.get_disk_path(key)) as data:
+                    state = {k: data[k] for k in data.files}
+                self.put(key, state, persist=False)
+                with self.lock:
+                    self.hits += 1
+                return state
+            except Exception as e:
+                print(f"Warning: Failed to read cached embedding {key}\n{e}")
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, state, persist=True):
+        """
+        Add a predictor state to the cache, evicting the least recently used entries if needed.
+
+        :param key: Cache key
+        :param state: Dictionary with the predictor state
+        :param persist: Whether to write the state to the on-disk store (if enabled)
+        """
+        with self.lock:
+            self.embeddings[key] = state
+            self.embeddings.move_to_end(key)
+            while len(self.embeddings) > self.max_items:
+                self.embeddings.popitem(last=False)
+
+        if persist and self.cache_dir is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Write to a temporary file first so an interrupted write never leaves a corrupt entry
+                tmp_path = self.get_disk_path(key) + ".tmp.npz"
+                np.savez(tmp_path, **state)
+                os.replace(tmp_path, self.get_disk_path(key))
+            except Exception as e:
+                print(f"Warning: Failed to write cached embedding {key}\n{e}")
+
+    def clear(self):
+        """Clear the in-memory cache (the on-disk store is left untouched)."""
+        with self.lock:
+            self.embeddings.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def get_predictor_state(predictor):
+        """
+        Extract the image embedding state from a SamPredictor after set_image has been called.
+
+        :param predictor: SamPredictor
+        :return: Dictionary with the predictor state as NumPy arrays
+        """
+        return {
+            'features': predictor.features.detach().cpu().numpy(),
+            'original_size': np.array(predictor.original_size),
+            'input_size': np.array(predictor.input_size),
+        }
+
+    @staticmethod
+    def set_predictor_state(predictor, state, device):
+        """
+        Restore the image embedding state of a SamPredictor, as if set_image had been called.
+
+        :param predictor: SamPredictor
+        :param state: Dictionary with the predictor state
+        :param device: Device the features should be moved to
+        """
+        predictor.reset_image()
+        predictor.features = torch.as_tensor(state['features']).to(device)
+        predictor.original_size = tuple(int(i) for i in state['original_size'])
+        predictor.input_size = tuple(int(i) for i in state['input_size'])
+        predictor.is_image_set = True
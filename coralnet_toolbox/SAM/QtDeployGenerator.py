@@ -10,16 +10,17 @@ import torch
 from ultralytics.models.fastsam import FastSAMPredictor
 
 from qtrangeslider import QRangeSlider
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QMetaObject, Q_ARG
 from PyQt5.QtWidgets import (QApplication, QComboBox, QDialog, QFormLayout, QHBoxLayout,
                              QLabel, QMessageBox, QPushButton, QSlider, QSpinBox,
-                             QVBoxLayout, QGroupBox)
+                             QDoubleSpinBox, QVBoxLayout, QGroupBox)
 
 from torch.cuda import empty_cache
 
 from coralnet_toolbox.ResultsProcessor import ResultsProcessor
 from coralnet_toolbox.QtProgressBar import ProgressBar
 from coralnet_toolbox.Icons import get_icon
+from coralnet_toolbox.Slicer.QtSlicer import Slicer
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -62,7 +63,12 @@ class DeployGeneratorDialog(QDialog):
         self.max_detect = 300
         self.loaded_model = None
         self.model_path = None
+        self.model_key = None
         self.class_mapping = {0: 'Review'}
+        
+        # Models are loaded through the shared registry
+        self.model_registry = main_window.model_registry
+        self.model_registry.register_loader('fastsam', self.load_fastsam_model)
 
         # Create the layout
         self.layout = QVBoxLayout(self)
@@ -206,6 +212,29 @@ class DeployGeneratorDialog(QDialog):
         label = QLabel("Choose a task to perform")
         layout.addRow(label, self.use_task_dropdown)
         
+        # Sliced mode for large images (e.g. orthomosaics)
+        self.sliced_dropdown = QComboBox()
+        self.sliced_dropdown.addItems(["False", "True"])
+        self.sliced_dropdown.setCurrentIndex(0)
+        layout.addRow("Sliced Mode (Large Images):", self.sliced_dropdown)
+        
+        self.slice_size_spinbox = QSpinBox()
+        self.slice_size_spinbox.setRange(256, 8192)
+        self.slice_size_spinbox.setSingleStep(256)
+        self.slice_size_spinbox.setValue(self.imgsz)
+        layout.addRow("Slice Size:", self.slice_size_spinbox)
+        
+        self.slice_overlap_spinbox = QDoubleSpinBox()
+        self.slice_overlap_spinbox.setRange(0.0, 0.5)
+        self.slice_overlap_spinbox.setSingleStep(0.05)
+        self.slice_overlap_spinbox.setValue(0.2)
+        layout.addRow("Slice Overlap:", self.slice_overlap_spinbox)
+        
+        self.slice_batch_spinbox = QSpinBox()
+        self.slice_batch_spinbox.setRange(1, 64)
+        self.slice_batch_spinbox.setValue(4)
+        layout.addRow("Slices per Batch:", self.slice_batch_spinbox)
+        
         # SAM dropdown
         self.use_sam_dropdown = QComboBox()
         self.use_sam_dropdown.addItems(["False", "True"])
@@ -322,23 +351,10 @@ class DeployGeneratorDialog(QDialog):
             self.max_detect = self.max_detections_spinbox.value()
             self.task = self.use_task_dropdown.currentText().lower()
 
-            # Set the parameters
-            overrides = dict(model=self.model_path, 
-                             task=self.task, 
-                             mode='predict', 
-                             save=False, 
-                             max_det=self.max_detect,
-                             imgsz=self.get_imgsz(),
-                             conf=0.00, 
-                             iou=1.00, 
-                             device=self.main_window.device)
-            
-            # Load the model
-            self.loaded_model = FastSAMPredictor(overrides=overrides)
-            
-            with torch.no_grad():
-                # Run a blank through the model to initialize it
-                self.loaded_model(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+            # Load the model (or get it from the registry)
+            self.model_key = self.model_registry.get_key('fastsam', self.model_path, self.task, self.main_window.device)
+            self.loaded_model = self.model_registry.get_or_load(self.model_key, on_evict=self.on_model_evicted)
+            self.loaded_model.args.max_det = self.max_detect
             
             self.status_bar.setText(f"Model loaded: {self.model_path}")
             QMessageBox.information(self, "Model Loaded", "Model loaded successfully")
@@ -354,11 +370,85 @@ class DeployGeneratorDialog(QDialog):
         # Exit the dialog box
         self.accept()
         
+    def load_fastsam_model(self, model_path, task, device):
+        """
+        Load and warm up a FastSAM predictor; used as the registry loader for 'fastsam' models.
+
+        Args:
+            model_path (str): Path to the model weights.
+            task (str): Task to perform ('detect' or 'segment').
+            device (str): Device to load the model on.
+        """
+        # Set the parameters
+        overrides = dict(model=model_path, 
+                         task=task, 
+                         mode='predict', 
+                         save=False, 
+                         max_det=self.max_detect,
+                         imgsz=self.imgsz,
+                         conf=0.00, 
+                         iou=1.00, 
+                         device=device)
+        
+        # Load the model
+        predictor = FastSAMPredictor(overrides=overrides)
+        
+        with torch.no_grad():
+            # Run a blank through the model to initialize it
+            predictor(np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8))
+            
+        return predictor
+
+    def on_model_evicted(self, key):
+        """
+        Drop the reference to a model the registry evicted to stay within its memory budget.
+        """
+        if key == self.model_key:
+            self.loaded_model = None
+            self.model_key = None
+            # Evictions can happen off the GUI thread (e.g. while another dialog loads a model)
+            QMetaObject.invokeMethod(self.status_bar, "setText", Qt.QueuedConnection, Q_ARG(str, "No model loaded"))
+        
     def get_imgsz(self):
         """Get the image size for the model."""
         self.imgsz = self.imgsz_spinbox.value()
         return self.imgsz
 
+    def predict_sliced(self, image_path, results_processor):
+        """
+        Make predictions on a large image slice by slice. Slices are read with windowed reads (the full
+        image is never loaded) and run through the model in batches. Segments only one slice can see are
+        yielded with their slice, so annotations appear while the rest of the image is still being processed;
+        segments in the overlaps or cut by a slice edge (e.g. larger than the overlap) are merged across
+        slices by confidence once every slice is done (see SliceMerger).
+
+        Args:
+            image_path (str): Path to the image.
+            results_processor (ResultsProcessor): Used to apply the threshold filters before merging.
+
+        Yields:
+            results (Results): Results for a slice or a merged segment, with 'offset' and 'full_shape' set.
+        """
+        slice_size = self.slice_size_spinbox.value()
+        slicer = Slicer(self.loaded_model,
+                        slice_size=(slice_size, slice_size),
+                        overlap=self.slice_overlap_spinbox.value(),
+                        batch_size=self.slice_batch_spinbox.value())
+
+        def filter_results(results):
+            results.names = self.class_mapping
+            return results_processor.apply_filters(results)
+
+        for results in slicer.predict(image_path,
+                                      iou_thresh=results_processor.iou_thresh,
+                                      filter_results=filter_results):
+            yield results
+
+        print(f"Sliced inference: {slicer.report()}")
+        self.status_bar.setText(slicer.report())
+        gc.collect()
+        empty_cache()
+
     def predict(self, image_paths=None):
         """
         Make predictions on the given image paths using the loaded model.
@@ -381,24 +471,6 @@ class DeployGeneratorDialog(QDialog):
 
         for image_path in image_paths:
             
-            with torch.no_grad():
-                # Predict the image
-                results = self.loaded_model(image_path)
-
-                gc.collect()
-                empty_cache()
-            
-            # Update the results names
-            results[0].names = self.class_mapping
-                        
-            # Check if SAM model is deployed
-            if self.use_sam_dropdown.currentText() == "True":
-                # Apply SAM to the detection results
-                results = self.sam_dialog.predict_from_results(results, self.class_mapping)
-                        
-            # Update the progress bar
-            progress_bar.update_progress()
-            
             # Create a results processor
             results_processor = ResultsProcessor(self.main_window, 
                                                  self.class_mapping,
@@ -407,10 +479,32 @@ class DeployGeneratorDialog(QDialog):
                                                  min_area_thresh=self.main_window.get_area_thresh_min(),
                                                  max_area_thresh=self.main_window.get_area_thresh_max())
             
+            if self.sliced_dropdown.currentText() == "True":
+                # Results are generated (and consumed) one slice at a time
+                results = self.predict_sliced(image_path, results_processor)
+            else:
+                with torch.no_grad():
+                    # Predict the image
+                    results = self.loaded_model(image_path)
+
+                    gc.collect()
+                    empty_cache()
+                
+                # Update the results names
+                results[0].names = self.class_mapping
+                        
+            # Check if SAM model is deployed
+            if self.use_sam_dropdown.currentText() == "True":
+                # Apply SAM to the detection results
+                results = self.sam_dialog.predict_from_results(results, self.class_mapping)
+            
             if self.task.lower() == 'segment' or self.use_sam_dropdown.currentText() == "True":
                 results_processor.process_segmentation_results(results)
             else:
                 results_processor.process_detection_results(results)
+                
+            # Update the progress bar
+            progress_bar.update_progress()
                         
         # Stop the progress bar
         progress_bar.stop_progress()
@@ -425,7 +519,10 @@ class DeployGeneratorDialog(QDialog):
         """
         Deactivate the currently loaded model and clean up resources.
         """
+        if self.model_key is not None:
+            self.model_registry.release(self.model_key)
         self.loaded_model = None
+        self.model_key = None
         self.model_path = None
         gc.collect()
         torch.cuda.empty_cache()
@@ -4,28 +4,37 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 import gc
 import os
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+import rasterio
 import torch
 
 from qtrangeslider import QRangeSlider
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QMetaObject, Q_ARG
 from PyQt5.QtWidgets import (QApplication, QComboBox, QDialog, QFormLayout,
                              QHBoxLayout, QLabel, QMessageBox, QPushButton,
-                             QSlider, QSpinBox, QVBoxLayout, QGroupBox)
+                             QSlider, QSpinBox, QDoubleSpinBox, QVBoxLayout, QGroupBox)
+
+from rasterio.windows import Window
 
 from x_segment_anything import SamPredictor
 from x_segment_anything import sam_model_registry
 from x_segment_anything import sam_model_urls
 
 from torch.cuda import empty_cache
+from ultralytics.engine.results import Results
 from ultralytics.utils import ops
 
-from coralnet_toolbox.ResultsProcessor import ResultsProcessor
+from coralnet_toolbox.ResultsCore import ResultsCore
+from coralnet_toolbox.SAM.EmbeddingCache import EmbeddingCache
+from coralnet_toolbox.SAM.QtPrecomputeWorker import PrecomputeEmbeddingsWorker
 from coralnet_toolbox.QtProgressBar import ProgressBar
 from coralnet_toolbox.Icons import get_icon
 from coralnet_toolbox.utilities import preprocess_image
-from coralnet_toolbox.utilities import rasterio_to_numpy
 from coralnet_toolbox.utilities import attempt_download_asset
 
 
@@ -52,10 +61,28 @@ class DeployPredictorDialog(QDialog):
         self.area_thresh_min = 0.00
         self.area_thresh_max = 0.40
         self.model_path = None
+        self.model_key = None
         self.loaded_model = None
+        
+        # Models are loaded through the shared registry
+        self.model_registry = main_window.model_registry
+        self.model_registry.register_loader('sam', self.load_sam_model)
         self.image_path = None
         self.original_image = None
         self.resized_image = None
+        self.resized_shape = None
+        
+        # Cache of image embeddings, so revisiting an image skips the encoder
+        self.embedding_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "coralnet_toolbox", "sam")
+        self.embedding_cache = EmbeddingCache(max_items=32)
+        # Separate, smaller cache for tiles of large images so memory stays bounded
+        self.tile_embedding_cache = EmbeddingCache(max_items=16)
+        # Serializes use of the encoder between the GUI thread and the precompute worker
+        self.encoder_lock = threading.Lock()
+        self.precompute_worker = None
+        
+        # Per-stage timings (seconds) of the most recent batched prediction
+        self.timings = defaultdict(float)
 
         # Create the layout
         self.layout = QVBoxLayout(self)
@@ -151,6 +178,53 @@ class DeployPredictorDialog(QDialog):
         self.imgsz_spinbox.setSingleStep(1024)
         self.imgsz_spinbox.setValue(self.imgsz)
         layout.addRow("Image Size (imgsz):", self.imgsz_spinbox)
+        
+        # Embedding cache dropdowns
+        self.cache_embeddings_dropdown = QComboBox()
+        self.cache_embeddings_dropdown.addItems(["True", "False"])
+        self.cache_embeddings_dropdown.setCurrentIndex(0)
+        layout.addRow("Cache Embeddings:", self.cache_embeddings_dropdown)
+        
+        self.disk_cache_dropdown = QComboBox()
+        self.disk_cache_dropdown.addItems(["False", "True"])
+        self.disk_cache_dropdown.setCurrentIndex(0)
+        self.disk_cache_dropdown.currentIndexChanged.connect(self.update_embedding_cache_dir)
+        layout.addRow("Cache Embeddings to Disk:", self.disk_cache_dropdown)
+        
+        # Background precomputation of embeddings (opt-in)
+        self.precompute_dropdown = QComboBox()
+        self.precompute_dropdown.addItems(["False", "True"])
+        self.precompute_dropdown.setCurrentIndex(0)
+        layout.addRow("Precompute Embeddings:", self.precompute_dropdown)
+        
+        self.precompute_ahead_spinbox = QSpinBox()
+        self.precompute_ahead_spinbox.setRange(0, 20)
+        self.precompute_ahead_spinbox.setValue(3)
+        layout.addRow("Images to Precompute Ahead:", self.precompute_ahead_spinbox)
+        
+        # Maximum number of box prompts decoded at once, bounds memory for very large box sets
+        self.max_boxes_spinbox = QSpinBox()
+        self.max_boxes_spinbox.setRange(1, 1024)
+        self.max_boxes_spinbox.setValue(64)
+        layout.addRow("Max Boxes per Batch:", self.max_boxes_spinbox)
+        
+        # Tiled mode for images (e.g. orthomosaics) larger than the encoder's input size
+        self.tiled_dropdown = QComboBox()
+        self.tiled_dropdown.addItems(["False", "True"])
+        self.tiled_dropdown.setCurrentIndex(0)
+        layout.addRow("Tiled Mode (Large Images):", self.tiled_dropdown)
+        
+        self.tile_size_spinbox = QSpinBox()
+        self.tile_size_spinbox.setRange(256, 4096)
+        self.tile_size_spinbox.setSingleStep(256)
+        self.tile_size_spinbox.setValue(1024)
+        layout.addRow("Tile Size:", self.tile_size_spinbox)
+        
+        self.tile_overlap_spinbox = QDoubleSpinBox()
+        self.tile_overlap_spinbox.setRange(0.0, 0.5)
+        self.tile_overlap_spinbox.setSingleStep(0.05)
+        self.tile_overlap_spinbox.setValue(0.2)
+        layout.addRow("Tile Overlap:", self.tile_overlap_spinbox)
 
         # Uncertainty threshold controls
         self.uncertainty_thresh = self.main_window.get_uncertainty_thresh()
@@ -265,6 +339,13 @@ class DeployPredictorDialog(QDialog):
         self.main_window.update_area_thresh(self.area_thresh_min, self.area_thresh_max)
         self.area_threshold_label.setText(f"{self.area_thresh_min:.2f} - {self.area_thresh_max:.2f}")
         
+    def update_embedding_cache_dir(self):
+        """Enable or disable the on-disk embedding store"""
+        if self.disk_cache_dropdown.currentText() == "True":
+            self.embedding_cache.cache_dir = self.embedding_cache_dir
+        else:
+            self.embedding_cache.cache_dir = None
+        
     def download_model_weights(self, model_path):
         """
         Download the model weights if they are not present.
@@ -291,31 +372,9 @@ class DeployPredictorDialog(QDialog):
             self.model_path = self.models[self.model_combo.currentText()]
             self.download_model_weights(self.model_path)
 
-            # Determine model type from filename
-            if "repvit" in self.model_path.lower():
-                model_type = "repvit"
-            elif "edge_" in self.model_path.lower():
-                model_type = "edge_sam"
-            elif "_coralscop" in self.model_path.lower():
-                model_type = "vit_b_coralscop"
-            elif "_t" in self.model_path.lower():
-                model_type = "vit_t"
-            elif "_b" in self.model_path.lower():
-                model_type = "vit_b"
-            elif "_l" in self.model_path.lower():
-                model_type = "vit_l"
-            elif "_h" in self.model_path.lower():
-                model_type = "vit_h"
-            else:
-                raise ValueError(f"Model type not recognized from filename: {self.model_path}")
-
-            # Load model using registry
-            model = sam_model_registry[model_type](checkpoint=self.model_path)
-            self.loaded_model = SamPredictor(model)
-
-            # Move to device and set eval mode
-            self.loaded_model.model.to(device=self.main_window.device)
-            self.loaded_model.model.eval()
+            # Load the model (or get it from the registry)
+            self.model_key = self.model_registry.get_key('sam', self.model_path, None, self.main_window.device)
+            self.loaded_model = self.model_registry.get_or_load(self.model_key, on_evict=self.on_model_evicted)
             
             self.status_bar.setText("Model loaded")
             QMessageBox.information(self, "Model Loaded", "Model loaded successfully")
@@ -328,11 +387,62 @@ class DeployPredictorDialog(QDialog):
         QApplication.restoreOverrideCursor()
         self.accept()
 
-    def resize_image(self, image):
+    def load_sam_model(self, model_path, task, device):
+        """
+        Load a SAM model as a predictor on the device; used as the registry loader for 'sam' models.
+
+        Args:
+            model_path (str): Path to the model weights.
+            task: Unused, SAM models have a single task.
+            device (str): Device to load the model on.
+        """
+        # Determine model type from filename
+        if "repvit" in model_path.lower():
+            model_type = "repvit"
+        elif "edge_" in model_path.lower():
+            model_type = "edge_sam"
+        elif "_coralscop" in model_path.lower():
+            model_type = "vit_b_coralscop"
+        elif "_t" in model_path.lower():
+            model_type = "vit_t"
+        elif "_b" in model_path.lower():
+            model_type = "vit_b"
+        elif "_l" in model_path.lower():
+            model_type = "vit_l"
+        elif "_h" in model_path.lower():
+            model_type = "vit_h"
+        else:
+            raise ValueError(f"Model type not recognized from filename: {model_path}")
+
+        # Load model using the SAM model registry
+        model = sam_model_registry[model_type](checkpoint=model_path)
+        predictor = SamPredictor(model)
+
+        # Move to device and set eval mode
+        predictor.model.to(device=device)
+        predictor.model.eval()
+
+        return predictor
+
+    def on_model_evicted(self, key):
+        """
+        Drop the reference to a model the registry evicted to stay within its memory budget.
+        """
+        if key == self.model_key:
+            self.cancel_precompute()
+            self.loaded_model = None
+            self.model_key = None
+            self.embedding_cache.clear()
+            self.tile_embedding_cache.clear()
+            # Evictions can happen off the GUI thread (e.g. while another dialog loads a model)
+            QMetaObject.invokeMethod(self.status_bar, "setText", Qt.QueuedConnection, Q_ARG(str, "No model loaded"))
+
+    def resize_image(self, image, imgsz=None):
         """
         Resize the image to the specified size.
         """
-        imgsz = self.imgsz_spinbox.value()
+        if imgsz is None:
+            imgsz = self.imgsz_spinbox.value()
         target_shape = self.get_target_shape(image, imgsz)
         return ops.scale_image(image, target_shape)
 
@@ -346,9 +456,207 @@ class DeployPredictorDialog(QDialog):
         else:
             return int(h * (imgsz / w)), imgsz
 
-    def set_image(self, image, image_path):
+    def get_embedding_key(self, image_path, window=None, resize=True, force=False):
+        """
+        Get the embedding cache key for an image (and optional window) with the current settings.
+
+        Args:
+            image_path (str): Path to the image.
+            window (tuple): Optional (left, top, right, bottom) of the region being encoded.
+            resize (bool): Whether the image is resized before encoding.
+            force (bool): Return a key even if caching embeddings is disabled.
+        """
+        if image_path is None:
+            return None
+        
+        if self.cache_embeddings_dropdown.currentText() != "True" and not force:
+            return None
+        
+        imgsz = self.get_encoder_imgsz() if resize else None
+        return EmbeddingCache.get_key(image_path, self.model_path, imgsz, window)
+    
+    def get_encoder_imgsz(self):
+        """
+        Get the size images are resized to before encoding, or None if they are not resized.
+        """
+        if self.resize_image_dropdown.currentText() == "True":
+            return self.imgsz_spinbox.value()
+        return None
+
+    def encode_image(self, image, imgsz=None):
+        """
+        Run the encoder on an image without modifying the predictor's current image; safe to call
+        from a worker thread.
+
+        Args:
+            image (np.ndarray): The preprocessed image.
+            imgsz (int): Size to resize the long side to, or None to skip resizing.
+
+        Returns:
+            state (dict): Predictor state as expected by EmbeddingCache.set_predictor_state.
         """
-        Set the image in the predictor.
+        if imgsz:
+            image = self.resize_image(image, imgsz)
+
+        transform = self.loaded_model.transform
+        model = self.loaded_model.model
+        device = self.main_window.device
+
+        # Mirror SamPredictor.set_image
+        input_image = transform.apply_image(image)
+        input_image_torch = torch.as_tensor(input_image, device=device)
+        input_image_torch = input_image_torch.permute(2, 0, 1).contiguous()[None, :, :, :]
+
+        with self.encoder_lock, torch.no_grad():
+            features = model.image_encoder(model.preprocess(input_image_torch))
+
+        return {
+            'features': features.cpu().numpy(),
+            'original_size': np.array(image.shape[:2]),
+            'input_size': np.array(input_image_torch.shape[-2:]),
+            'resized_shape': np.array(image.shape[:2]),
+        }
+
+    def precompute_embeddings(self, image_path, window=None):
+        """
+        Start computing embeddings in the background for the given image (region) and the next few
+        filtered images, if enabled.
+
+        Args:
+            image_path (str): Path to the current image.
+            window (tuple): Optional (left, top, right, bottom) of the current working area.
+        """
+        if self.loaded_model is None or image_path is None:
+            return
+        
+        if self.precompute_dropdown.currentText() != "True":
+            return
+        
+        if self.cache_embeddings_dropdown.currentText() != "True":
+            return
+        
+        # Stop any previous worker, its upcoming images are no longer relevant
+        self.cancel_precompute()
+        
+        imgsz = self.get_encoder_imgsz()
+        jobs = [(image_path, window, self.get_embedding_key(image_path, window), imgsz)]
+        
+        # The next few images in the filtered list (full images)
+        filtered_image_paths = self.main_window.image_window.filtered_image_paths
+        if image_path in filtered_image_paths:
+            index = filtered_image_paths.index(image_path)
+            for next_path in filtered_image_paths[index + 1: index + 1 + self.precompute_ahead_spinbox.value()]:
+                jobs.append((next_path, None, self.get_embedding_key(next_path), imgsz))
+            
+        self.precompute_worker = PrecomputeEmbeddingsWorker(self, jobs)
+        self.precompute_worker.errorOccurred.connect(self.on_precompute_error)
+        self.precompute_worker.start()
+        
+    def on_precompute_error(self, error_message):
+        """Report errors from the precompute worker without interrupting the user"""
+        print(f"Warning: Failed to precompute embedding\n{error_message}")
+        
+    def cancel_precompute(self):
+        """
+        Cancel the background precompute worker, if running.
+        """
+        if self.precompute_worker is not None and self.precompute_worker.isRunning():
+            self.precompute_worker.cancel()
+            self.precompute_worker.wait()
+        self.precompute_worker = None
+
+    def read_image(self, image_path, window=None):
+        """
+        Read an image (or a window of it) with its own rasterio handle; safe to call off the GUI thread.
+
+        Args:
+            image_path (str): Path to the image.
+            window (tuple): Optional (left, top, right, bottom) to read.
+        """
+        with rasterio.open(image_path) as src:
+            if window:
+                left, top, right, bottom = window
+                image = src.read(window=Window(left, top, right - left, bottom - top))
+            else:
+                image = src.read()
+
+        return preprocess_image(image.transpose(1, 2, 0))
+    
+    def timed_read_image(self, image_path):
+        """
+        Read an image, returning it along with the time it took.
+        """
+        start = time.perf_counter()
+        image = self.read_image(image_path)
+        return image, time.perf_counter() - start
+
+    def compute_embedding(self, image, resize=True):
+        """
+        Resize the image (if needed) and run the encoder on it.
+
+        Args:
+            image (np.ndarray): The preprocessed image.
+            resize (bool): Whether to resize the image (tiles are encoded at native resolution).
+        """
+        start = time.perf_counter()
+        
+        # Resize the image if the checkbox is checked
+        if resize and self.resize_image_dropdown.currentText() == "True":
+            image = self.resize_image(image)
+            
+        self.timings['resize'] += time.perf_counter() - start
+        start = time.perf_counter()
+
+        # Set the image in the predictor
+        with self.encoder_lock:
+            self.loaded_model.set_image(image)
+        self.resized_image = image
+        self.resized_shape = image.shape[:2]
+        
+        self.timings['encode'] += time.perf_counter() - start
+        
+    def set_image_array(self, image, image_path, window=None, cacheable=True, tile=False):
+        """
+        Set an already preprocessed image in the predictor without any dialogs, re-using a cached
+        embedding if one exists.
+
+        Args:
+            image (np.ndarray): The preprocessed image.
+            image_path (str): Path to the image.
+            window (tuple): Optional (left, top, right, bottom) if image is a region of image_path.
+            cacheable (bool): Whether the image can be keyed in the embedding cache.
+            tile (bool): Whether the image is a tile; tiles are not resized and use the tile cache.
+        """
+        cache = self.tile_embedding_cache if tile else self.embedding_cache
+        key = self.get_embedding_key(image_path, window, resize=not tile, force=tile) if cacheable else None
+        
+        # Save the original image
+        self.original_image = image
+        self.image_path = image_path
+        
+        state = cache.get(key) if key else None
+        
+        if state is not None:
+            # Restore the embedding, skipping the encoder
+            EmbeddingCache.set_predictor_state(self.loaded_model, state, self.main_window.device)
+            self.resized_image = None
+            self.resized_shape = tuple(int(i) for i in state['resized_shape'])
+            self.timings['cache_hits'] += 1
+        else:
+            self.compute_embedding(image, resize=not tile)
+            if key:
+                state = EmbeddingCache.get_predictor_state(self.loaded_model)
+                state['resized_shape'] = np.array(self.resized_shape)
+                cache.put(key, state)
+
+    def set_image(self, image, image_path, window=None):
+        """
+        Set the image in the predictor, re-using a cached embedding if one exists.
+        
+        Args:
+            image (np.ndarray): The image, or None to read it from image_path.
+            image_path (str): Path to the image.
+            window (tuple): Optional (left, top, right, bottom) if image is a region of image_path.
         """
         QApplication.setOverrideCursor(Qt.WaitCursor)
         progress_bar = ProgressBar(self.annotation_window, title="Setting Image")
@@ -357,25 +665,17 @@ class DeployPredictorDialog(QDialog):
         try:
             if self.loaded_model is not None:
                 
-                if image is None and image_path is not None:
-                    # Open the image using rasterio
-                    image = self.main_window.image_window.rasterio_open(image_path)
-                    image = rasterio_to_numpy(image)
-                    
-                # Preprocess the image
-                image = preprocess_image(image)
-
-                # Save the original image
-                self.original_image = image
-                self.image_path = image_path
-
-                # Resize the image if the checkbox is checked
-                if self.resize_image_dropdown.currentText() == "True":
-                    image = self.resize_image(image)
-
-                # Set the image in the predictor
-                self.loaded_model.set_image(image)
-                self.resized_image = image
+                read_from_path = image is None and image_path is not None
+                
+                if read_from_path:
+                    # Read the image (region) with rasterio, the same pixels the precompute worker encodes
+                    image = self.read_image(image_path, window)
+                else:
+                    # Preprocess the image
+                    image = preprocess_image(image)
+                
+                # Only embeddings of pixels read from the path are shared through the cache
+                self.set_image_array(image, image_path, window, cacheable=read_from_path)
             else:
                 raise Exception("Model not loaded")
 
@@ -397,7 +697,7 @@ class DeployPredictorDialog(QDialog):
         """
         # Calculate scaling factors
         original_height, original_width = self.original_image.shape[:2]
-        resized_height, resized_width = self.resized_image.shape[:2]
+        resized_height, resized_width = self.resized_shape
 
         scale_x = resized_width / original_width
         scale_y = resized_height / original_height
@@ -424,7 +724,7 @@ class DeployPredictorDialog(QDialog):
 
         # Calculate scaling factors
         original_height, original_width = self.original_image.shape[:2]
-        resized_height, resized_width = self.resized_image.shape[:2]
+        resized_height, resized_width = self.resized_shape
 
         scale_x = resized_width / original_width
         scale_y = resized_height / original_height
@@ -462,7 +762,7 @@ class DeployPredictorDialog(QDialog):
         point_coords = self.scale_points(input_points)
 
         point_coords = self.loaded_model.transform.apply_coords_torch(point_coords,
-                                                                      self.resized_image.shape[:2])
+                                                                      self.resized_shape)
 
         return point_coords, point_labels
 
@@ -480,7 +780,7 @@ class DeployPredictorDialog(QDialog):
         bbox_coords = self.scale_boxes(input_bbox)
 
         bbox_coords = self.loaded_model.transform.apply_boxes_torch(bbox_coords,
-                                                                    self.resized_image.shape[:2])
+                                                                    self.resized_shape)
 
         return bbox_coords
 
@@ -516,16 +816,15 @@ class DeployPredictorDialog(QDialog):
                                                                point_labels=point_labels,
                                                                num_multimask_outputs=1)
             
-            # Create a results processor
-            results_processor = ResultsProcessor(self.main_window, 
-                                                 class_mapping=None,
-                                                 uncertainty_thresh=self.main_window.get_uncertainty_thresh(),
-                                                 iou_thresh=self.main_window.get_iou_thresh(),
-                                                 min_area_thresh=self.main_window.get_area_thresh_min(),
-                                                 max_area_thresh=self.main_window.get_area_thresh_max())
+            # Create a results core (no GUI interaction needed here)
+            results_core = ResultsCore(class_mapping=None,
+                                       uncertainty_thresh=self.main_window.get_uncertainty_thresh(),
+                                       iou_thresh=self.main_window.get_iou_thresh(),
+                                       min_area_thresh=self.main_window.get_area_thresh_min(),
+                                       max_area_thresh=self.main_window.get_area_thresh_max())
 
             # Post-process the results
-            results = results_processor.from_sam(masks, scores, self.original_image, self.image_path)
+            results = results_core.from_sam(masks, scores, self.original_image, self.image_path)
 
         except Exception as e:
             QMessageBox.critical(self, "Prediction Error", f"Error predicting: {e}")
@@ -533,64 +832,316 @@ class DeployPredictorDialog(QDialog):
 
         return results
 
-    def predict_from_results(self, results_generator, class_mapping):
+    def decode_boxes(self, bboxes):
+        """
+        Decode masks for a batch of box prompts on the current image, without any dialogs.
+
+        Args:
+            bboxes (np.ndarray): The bounding boxes to use as prompts, shape (N, 4).
+
+        Returns:
+            results (Results): Ultralytics Results object
         """
-        Make predictions using the currently loaded model using results.
+        start = time.perf_counter()
         
+        with torch.no_grad():
+            masks, scores, _ = self.loaded_model.predict_torch(boxes=self.transform_bboxes(bboxes),
+                                                               point_coords=None,
+                                                               point_labels=None,
+                                                               num_multimask_outputs=1)
+        
+        self.timings['decode'] += time.perf_counter() - start
+        start = time.perf_counter()
+
+        results = ResultsCore(class_mapping=None).from_sam(masks, scores, self.original_image, self.image_path)
+        
+        self.timings['postprocess'] += time.perf_counter() - start
+        return results
+    
+    def report_timings(self):
+        """
+        Report the per-stage timings of the most recent batched prediction.
+        """
+        stages = ['read', 'resize', 'encode', 'decode', 'postprocess']
+        summary = ", ".join(f"{stage}: {self.timings[stage]:.2f}s" for stage in stages)
+        summary += f" ({int(self.timings['images'])} images, {int(self.timings['boxes'])} boxes, "
+        summary += f"{int(self.timings['cache_hits'])} cached embeddings)"
+        print(f"SAM timings - {summary}")
+        self.status_bar.setText(f"Last run - {summary}")
+
+    def get_tiles(self, height, width, tile_size, overlap):
+        """
+        Get overlapping tiles covering an image.
+
         Args:
-            results_generator (generator): A generator that yields Ultralytics Results.
+            height (int): Height of the image.
+            width (int): Width of the image.
+            tile_size (int): Size of the (square) tiles.
+            overlap (float): Fractional overlap between neighbouring tiles.
+
+        Returns:
+            tiles (np.ndarray): Tiles as (left, top, right, bottom), shape (T, 4).
         """
-        # Create a result processor
-        result_processor = ResultsProcessor(self.main_window, 
-                                            class_mapping=class_mapping,
-                                            uncertainty_thresh=self.main_window.get_uncertainty_thresh(),
-                                            iou_thresh=self.main_window.get_iou_thresh(),
-                                            min_area_thresh=self.main_window.get_area_thresh_min(),
-                                            max_area_thresh=self.main_window.get_area_thresh_max())
+        stride = max(1, int(tile_size * (1 - overlap)))
 
-        results_dict = {}
+        def get_starts(length):
+            starts = list(range(0, max(length - tile_size, 0) + 1, stride))
+            # Make sure the last tile reaches the edge of the image
+            if starts[-1] + tile_size < length:
+                starts.append(length - tile_size)
+            return starts
 
-        for results in results_generator:
-            results = result_processor.apply_filters(results)
-            for result in results:
-                if result:
-                    # Extract the results
-                    image_path, cls_id, cls_name, conf, *bbox = result_processor.extract_detection_result(result)
+        tiles = [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+                 for y in get_starts(height) for x in get_starts(width)]
+
+        return np.array(tiles, dtype=int)
+
+    def route_boxes_to_tiles(self, xyxy, tiles):
+        """
+        Route each box to the tile that fully contains it, preferring the tile whose center is closest
+        to the box center.
+
+        Args:
+            xyxy (np.ndarray): Boxes with shape (N, 4).
+            tiles (np.ndarray): Tiles with shape (T, 4).
+
+        Returns:
+            best (np.ndarray): Index of the best tile for each box, shape (N,).
+            fits (np.ndarray): Whether the box is fully contained in its best tile, shape (N,).
+        """
+        contains = ((xyxy[:, None, 0] >= tiles[None, :, 0]) &
+                    (xyxy[:, None, 1] >= tiles[None, :, 1]) &
+                    (xyxy[:, None, 2] <= tiles[None, :, 2]) &
+                    (xyxy[:, None, 3] <= tiles[None, :, 3]))
+
+        box_centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2
+        tile_centers = (tiles[:, :2] + tiles[:, 2:]) / 2
+        distances = np.linalg.norm(box_centers[:, None, :] - tile_centers[None, :, :], axis=2)
+        distances[~contains] = np.inf
+
+        return np.argmin(distances, axis=1), contains.any(axis=1)
+
+    def set_tile(self, image_path, tile):
+        """
+        Read a tile of an image (never the whole image) and set it in the predictor.
+        """
+        start = time.perf_counter()
+        image = self.read_image(image_path, tuple(int(i) for i in tile))
+        self.timings['read'] += time.perf_counter() - start
 
-                    if image_path not in results_dict:
-                        results_dict[image_path] = []
+        self.set_image_array(image, image_path, window=tuple(int(i) for i in tile), tile=True)
 
-                    # Add the results to the dictionary
-                    results_dict[image_path].append(np.array(bbox))
+    def predict_tiled(self, image_path, boxes, names):
+        """
+        Make predictions on a large image tile by tile, at native resolution. Boxes are routed to the
+        tile that covers them; boxes spanning several tiles are decoded on each covering tile and their
+        masks are stitched back together.
+
+        Args:
+            image_path (str): Path to the image.
+            boxes (torch.Tensor): Boxes as (x1, y1, x2, y2, conf, cls), shape (N, 6).
+            names (dict): Class names.
+
+        Yields:
+            results (Results): Results on a window of the image, with 'offset' and 'full_shape' set.
+        """
+        with rasterio.open(image_path) as src:
+            height, width = src.height, src.width
+
+        tiles = self.get_tiles(height, width, self.tile_size_spinbox.value(), self.tile_overlap_spinbox.value())
+        best, fits = self.route_boxes_to_tiles(boxes[:, :4].numpy(), tiles)
+        max_boxes = self.max_boxes_spinbox.value()
 
-        # Loop through each unique image path
-        for image_path in results_dict:
-            try:
-                # Set the image
-                self.set_image(image=None, image_path=image_path)
+        # Boxes that fit within a single tile
+        for tile_index in np.unique(best[fits]):
+            tile = tiles[tile_index]
+            self.set_tile(image_path, tile)
 
-                # Unpack the results
-                bboxes = np.stack(results_dict[image_path])
+            indices = torch.as_tensor(np.nonzero(fits & (best == tile_index))[0])
+            offset = torch.tensor([tile[0], tile[1], tile[0], tile[1]], dtype=boxes.dtype)
 
-                # Make predictions
-                new_results = self.predict_from_prompts(bboxes, [], [])
-                new_results.names = results.names
-                new_results.boxes = results.boxes
+            for start in range(0, len(indices), max_boxes):
+                chunk = boxes[indices[start: start + max_boxes]].clone()
+                chunk[:, :4] -= offset
 
+                new_results = self.decode_boxes(chunk[:, :4].numpy())
+                new_results.names = names
+                new_results.update(boxes=chunk)
+                new_results.offset = (int(tile[0]), int(tile[1]))
+                new_results.full_shape = (height, width)
+                self.timings['boxes'] += len(chunk)
+
+                yield new_results
+
+        # Boxes that span several tiles
+        for index in np.nonzero(~fits)[0]:
+            new_results = self.predict_spanning_box(image_path, boxes[index], tiles, names)
+            if new_results is not None:
+                new_results.full_shape = (height, width)
+                self.timings['boxes'] += 1
                 yield new_results
 
-            except Exception as e:
-                QMessageBox.critical(self, "Prediction Error", f"Error predicting: {e}")
+    def predict_spanning_box(self, image_path, box, tiles, names):
+        """
+        Decode a box that does not fit in any single tile on every tile it overlaps, and stitch the
+        partial masks into one mask covering the box.
+
+        Args:
+            image_path (str): Path to the image.
+            box (torch.Tensor): Box as (x1, y1, x2, y2, conf, cls).
+            tiles (np.ndarray): Tiles with shape (T, 4).
+            names (dict): Class names.
+
+        Returns:
+            results (Results): Results on the window of the box, with 'offset' set.
+        """
+        x1, y1, x2, y2 = [int(round(float(v))) for v in box[:4]]
+        box_w, box_h = max(x2 - x1, 1), max(y2 - y1, 1)
+        stitched = np.zeros((box_h, box_w), dtype=bool)
+
+        # Tiles overlapping the box
+        overlapping = ((tiles[:, 0] < x2) & (tiles[:, 2] > x1) & (tiles[:, 1] < y2) & (tiles[:, 3] > y1))
+
+        for tile in tiles[overlapping]:
+            # The part of the box within this tile, in tile coordinates
+            ix1, iy1 = max(x1, tile[0]), max(y1, tile[1])
+            ix2, iy2 = min(x2, tile[2]), min(y2, tile[3])
+            if ix2 <= ix1 or iy2 <= iy1:
+                continue
+
+            self.set_tile(image_path, tile)
+            clipped = np.array([[ix1 - tile[0], iy1 - tile[1], ix2 - tile[0], iy2 - tile[1]]])
+            tile_results = self.decode_boxes(clipped)
+            mask = tile_results.masks.data[0].cpu().numpy()
+
+            # Paste the part of the mask within the box into the stitched mask
+            stitched[iy1 - y1: iy2 - y1, ix1 - x1: ix2 - x1] |= mask[iy1 - tile[1]: iy2 - tile[1],
+                                                                      ix1 - tile[0]: ix2 - tile[0]]
+
+        if not stitched.any():
+            return None
+
+        start = time.perf_counter()
+
+        # A zero-strided placeholder image, only its shape is used
+        placeholder = np.broadcast_to(np.zeros((1, 1, 3), dtype=np.uint8), (box_h, box_w, 3))
+        local_box = box.clone().view(1, -1)
+        local_box[:, :4] = torch.tensor([0, 0, box_w, box_h], dtype=box.dtype)
+
+        new_results = Results(placeholder,
+                              path=image_path,
+                              names=names,
+                              masks=torch.from_numpy(stitched)[None],
+                              boxes=local_box)
+        new_results.offset = (x1, y1)
+
+        self.timings['postprocess'] += time.perf_counter() - start
+        return new_results
+
+    def predict_from_results(self, results_generator, class_mapping):
+        """
+        Make predictions using the currently loaded model using results. Box prompts are decoded in
+        chunks per image to bound memory, and the next image is read while the current one is decoded.
+        
+        Args:
+            results_generator (generator): A generator that yields Ultralytics Results.
+        """
+        # Create a results core (no GUI interaction needed here)
+        result_processor = ResultsCore(class_mapping=class_mapping,
+                                       uncertainty_thresh=self.main_window.get_uncertainty_thresh(),
+                                       iou_thresh=self.main_window.get_iou_thresh(),
+                                       min_area_thresh=self.main_window.get_area_thresh_min(),
+                                       max_area_thresh=self.main_window.get_area_thresh_max())
+        
+        self.timings = defaultdict(float)
+
+        # Collect the filtered boxes (xyxy, conf, cls) and class names for each image
+        boxes_dict = {}
+        names_dict = {}
+
+        for results in results_generator:
+            results = result_processor.apply_filters(results)
+            if results is None or not len(results):
+                continue
+            
+            image_path = results.path.replace("\\", "/")
+            # Results of a window (e.g. a slice) are shifted back into image coordinates
+            boxes = results.boxes.data.cpu().clone()
+            boxes[:, :4] += torch.tensor(result_processor.get_offset(results), dtype=boxes.dtype).repeat(2)
+            boxes_dict.setdefault(image_path, []).append(boxes)
+            names_dict[image_path] = results.names
+
+        image_paths = list(boxes_dict.keys())
+        max_boxes = self.max_boxes_spinbox.value()
+        
+        if self.tiled_dropdown.currentText() == "True":
+            # Tiles are read with windowed reads, the full image is never loaded
+            for image_path in image_paths:
+                try:
+                    self.timings['images'] += 1
+                    yield from self.predict_tiled(image_path, torch.cat(boxes_dict[image_path]), names_dict[image_path])
+                except Exception as e:
+                    print(f"Warning: Failed to predict {image_path}\n{e}")
+                    
+            self.report_timings()
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.timed_read_image, image_paths[0]) if image_paths else None
+            
+            for idx, image_path in enumerate(image_paths):
+                try:
+                    image, elapsed = future.result()
+                    self.timings['read'] += elapsed
+                except Exception as e:
+                    print(f"Warning: Failed to read {image_path}\n{e}")
+                    image = None
+                
+                # Read the next image while the current one is encoded and decoded
+                if idx + 1 < len(image_paths):
+                    future = executor.submit(self.timed_read_image, image_paths[idx + 1])
+                    
+                if image is None:
+                    continue
+                
+                try:
+                    # Set the image (or restore its cached embedding)
+                    self.set_image_array(image, image_path)
+                    self.timings['images'] += 1
+                    
+                    boxes = torch.cat(boxes_dict[image_path])
+                    
+                    # Decode the boxes in chunks
+                    for start in range(0, len(boxes), max_boxes):
+                        chunk = boxes[start: start + max_boxes]
+                        new_results = self.decode_boxes(chunk[:, :4].numpy())
+                        new_results.names = names_dict[image_path]
+                        new_results.update(boxes=chunk)
+                        self.timings['boxes'] += len(chunk)
+                        
+                        yield new_results
+
+                except Exception as e:
+                    print(f"Warning: Failed to predict {image_path}\n{e}")
+                    
+        self.report_timings()
 
     def deactivate_model(self):
         """
         Deactivate the currently loaded model.
         """
+        self.cancel_precompute()
+        if self.model_key is not None:
+            self.model_registry.release(self.model_key)
         self.loaded_model = None
+        self.model_key = None
         self.model_path = None
         self.image_path = None
         self.original_image = None
         self.resized_image = None
+        self.resized_shape = None
+        self.embedding_cache.clear()
+        self.tile_embedding_cache.clear()
         gc.collect()
         empty_cache()
         self.main_window.untoggle_all_tools()
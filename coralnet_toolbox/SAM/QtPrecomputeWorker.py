@@ -0,0 +1,52 @@
+import warnings
+
+from PyQt5.QtCore import pyqtSignal, QThread
+
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Classes
+# ----------------------------------------------------------------------------------------------------------------------
+
+
+class PrecomputeEmbeddingsWorker(QThread):
+    """
+    Background worker that computes SAM embeddings for upcoming images (or regions of images) and feeds
+    them into the SAM predictor's embedding cache, so interactive prompting does not wait on the encoder.
+
+    :param sam_dialog: DeployPredictorDialog with a loaded model
+    :param jobs: List of (image_path, window, key, imgsz) tuples, computed on the GUI thread
+    """
+    embeddingComputed = pyqtSignal(str)
+    finished = pyqtSignal()
+    errorOccurred = pyqtSignal(str)
+
+    def __init__(self, sam_dialog, jobs):
+        super().__init__()
+        self.sam_dialog = sam_dialog
+        self.embedding_cache = sam_dialog.embedding_cache
+        self.jobs = jobs
+        self._is_cancelled = False
+
+    def run(self):
+        try:
+            for image_path, window, key, imgsz in self.jobs:
+                if self._is_cancelled or self.sam_dialog.loaded_model is None:
+                    break
+
+                if key in self.embedding_cache:
+                    continue
+
+                try:
+                    image = self.sam_dialog.read_image(image_path, window)
+                    state = self.sam_dialog.encode_image(image, imgsz)
+                    self.embedding_cache.put(key, state)
+                    self.embeddingComputed.emit(image_path)
+                except Exception as e:
+                    self.errorOccurred.emit(f"{image_path}: {e}")
+        finally:
+            self.finished.emit()
+
+    def cancel(self):
+        self._is_cancelled = True
@@ -1,5 +1,17 @@
-import supervision as sv
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
 import numpy as np
+import rasterio
+import torch
+
+from rasterio.windows import Window
+from ultralytics.engine.results import Results
+
+from coralnet_toolbox.utilities import preprocess_image
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -7,25 +19,384 @@ import numpy as np
 # ----------------------------------------------------------------------------------------------------------------------
 
 
+class SliceMerger:
+    """
+    Merges the results of the slices of one image so each object is kept once, while the slices are still
+    being predicted.
+
+    A detection that is whole within its slice and not within any other slice is final as soon as its slice
+    is done. The others (in an overlap, or cut by an interior slice edge) are deferred until every slice is
+    done, then handled from the most to the least confident: each is compared to the detections kept from
+    other slices by the IoU of their boxes within the window the two slices share, where both see the same
+    pixels. A match with a final detection is a duplicate; other matches are joined, keeping the most
+    confident detection of a slice that saw the object whole, else merging the pieces of an object larger
+    than the overlap.
+
+    :param slices: All slices of the image, shape (T, 4)
+    :param full_shape: (height, width) of the full image
+    :param iou_thresh: IoU (within the shared window) above which detections are the same object
+    :param margin: Distance (pixels) to an interior slice edge within which a detection is cut
+    """
+    def __init__(self, slices, full_shape, iou_thresh=0.5, margin=2):
+        self.slices = np.asarray(slices, dtype=float).reshape(-1, 4)
+        self.full_shape = full_shape
+        self.iou_thresh = iou_thresh
+        self.margin = margin
+
+        self.path = None
+        self.names = None
+        # Final detections as (box, class, slice index)
+        self.final = []
+        # Deferred detections as (box, confidence, class, slice index, cut, polygon or None)
+        self.deferred = []
+
+    def add(self, results, index):
+        """
+        Add the results of a slice.
+
+        :param results: Ultralytics Results for the slice
+        :param index: Index of the slice
+        :return: Ultralytics Results with the detections that are final
+        """
+        if results is None or not len(results):
+            return results
+
+        self.path, self.names = results.path, results.names
+
+        height, width = self.full_shape
+        left, top, right, bottom = self.slices[index]
+        boxes = results.boxes.cpu().numpy()
+        xyxy = boxes.xyxy.astype(float)
+
+        # Detections touching an edge that is shared with another slice
+        cut = np.zeros(len(xyxy), dtype=bool)
+        if left > 0:
+            cut |= xyxy[:, 0] <= self.margin
+        if top > 0:
+            cut |= xyxy[:, 1] <= self.margin
+        if right < width:
+            cut |= xyxy[:, 2] >= (right - left) - self.margin
+        if bottom < height:
+            cut |= xyxy[:, 3] >= (bottom - top) - self.margin
+
+        xyxy += np.array([left, top, left, top])
+
+        # Detections another slice could also see whole
+        others = np.delete(self.slices, index, axis=0)
+        shared = ((xyxy[:, None, :2] >= others[None, :, :2]) &
+                  (xyxy[:, None, 2:] <= others[None, :, 2:])).all(axis=2).any(axis=1)
+        final = ~cut & ~shared
+
+        polygons = results.masks.xy if results.masks is not None else None
+        for i in np.flatnonzero(~final):
+            polygon = polygons[i].astype(float) + [left, top] if polygons is not None else None
+            self.deferred.append((xyxy[i], float(boxes.conf[i]), int(boxes.cls[i]), index, bool(cut[i]), polygon))
+
+        for i in np.flatnonzero(final):
+            self.final.append((xyxy[i], int(boxes.cls[i]), index))
+
+        merged = results[torch.from_numpy(np.flatnonzero(final))]
+        for attr in ('offset', 'full_shape'):
+            if hasattr(results, attr):
+                setattr(merged, attr, getattr(results, attr))
+
+        return merged
+
+    def match(self, box, cls, index, boxes, classes, indices):
+        """
+        Check which detections (of other slices) are the same object as a detection, by the IoU of their
+        boxes clipped to the window shared by the two slices.
+
+        :param box: Box of the detection as (x1, y1, x2, y2)
+        :param cls: Class of the detection
+        :param index: Slice index of the detection
+        :param boxes: Boxes of the other detections, shape (K, 4)
+        :param classes: Classes of the other detections, shape (K,)
+        :param indices: Slice indices of the other detections, shape (K,)
+        :return: Boolean array, shape (K,)
+        """
+        if not len(boxes):
+            return np.zeros(0, dtype=bool)
+
+        window = self.slices[index]
+        others = self.slices[indices]
+        shared = np.concatenate([np.maximum(window[:2], others[:, :2]),
+                                 np.minimum(window[2:], others[:, 2:])], axis=1)
+
+        a = np.concatenate([np.maximum(box[:2], shared[:, :2]), np.minimum(box[2:], shared[:, 2:])], axis=1)
+        b = np.concatenate([np.maximum(boxes[:, :2], shared[:, :2]), np.minimum(boxes[:, 2:], shared[:, 2:])], axis=1)
+
+        def area(xyxy):
+            return np.clip(xyxy[:, 2] - xyxy[:, 0], 0, None) * np.clip(xyxy[:, 3] - xyxy[:, 1], 0, None)
+
+        intersection = area(np.concatenate([np.maximum(a[:, :2], b[:, :2]), np.minimum(a[:, 2:], b[:, 2:])], axis=1))
+        union = area(a) + area(b) - intersection
+        iou = np.divide(intersection, union, out=np.zeros_like(union), where=union > 0)
+
+        return (classes == cls) & (indices != index) & (iou > self.iou_thresh)
+
+    def flush(self):
+        """
+        Merge the deferred detections, once every slice is done.
+
+        :return: List of Ultralytics Results, one per kept object, with 'offset' and 'full_shape' set
+        """
+        final_boxes = np.array([box for box, _, _ in self.final]).reshape(-1, 4)
+        final_classes = np.array([cls for _, cls, _ in self.final], dtype=int)
+        final_indices = np.array([index for _, _, index in self.final], dtype=int)
+
+        num_deferred = len(self.deferred)
+        kept_boxes = np.zeros((num_deferred, 4))
+        kept_classes = np.zeros(num_deferred, dtype=int)
+        kept_indices = np.zeros(num_deferred, dtype=int)
+        kept_groups = np.zeros(num_deferred, dtype=int)
+        num_kept = 0
+
+        groups = []
+        for i in sorted(range(num_deferred), key=lambda i: -self.deferred[i][1]):
+            box, _, cls, index, _, _ = self.deferred[i]
+
+            # Already kept whole from the slice that owns it
+            if self.match(box, cls, index, final_boxes, final_classes, final_indices).any():
+                continue
+
+            matched = self.match(box, cls, index,
+                                 kept_boxes[:num_kept], kept_classes[:num_kept], kept_indices[:num_kept])
+            if matched.any():
+                group = kept_groups[np.argmax(matched)]
+                groups[group].append(i)
+            else:
+                group = len(groups)
+                groups.append([i])
+
+            kept_boxes[num_kept], kept_classes[num_kept] = box, cls
+            kept_indices[num_kept], kept_groups[num_kept] = index, group
+            num_kept += 1
+
+        merged = [self.merge_group([self.deferred[i] for i in group]) for group in groups]
+
+        self.final, self.deferred = [], []
+        return merged
+
+    def merge_group(self, members):
+        """
+        Create the Results of an object from its detections in different slices (most confident first).
+
+        :param members: List of deferred detections
+        :return: Ultralytics Results on the window of the object, with 'offset' and 'full_shape' set
+        """
+        whole = [member for member in members if not member[4]]
+        if whole:
+            # A slice saw the object whole
+            members = whole[:1]
+
+        boxes = np.array([member[0] for member in members])
+        _, conf, cls, _, _, _ = members[0]
+        x1, y1 = np.floor(boxes[:, :2].min(axis=0)).astype(int)
+        x2, y2 = np.ceil(boxes[:, 2:].max(axis=0)).astype(int)
+        box_w, box_h = max(x2 - x1, 1), max(y2 - y1, 1)
+
+        masks = None
+        polygons = [member[5] for member in members if member[5] is not None and len(member[5])]
+        if members[0][5] is not None:
+            # Union of the pieces' polygons, on the window of the object
+            mask = np.zeros((box_h, box_w), dtype=np.uint8)
+            for polygon in polygons:
+                cv2.fillPoly(mask, [np.round(polygon - [x1, y1]).astype(np.int32)], 1)
+            masks = torch.from_numpy(mask.astype(bool))[None]
+
+        local_box = torch.tensor([[*(boxes[:, :2].min(axis=0) - [x1, y1]),
+                                   *(boxes[:, 2:].max(axis=0) - [x1, y1]), conf, cls]], dtype=torch.float32)
+
+        # A zero-strided placeholder image, only its shape is used
+        placeholder = np.broadcast_to(np.zeros((1, 1, 3), dtype=np.uint8), (box_h, box_w, 3))
+        results = Results(placeholder, path=self.path, names=self.names, boxes=local_box, masks=masks)
+        results.offset = (int(x1), int(y1))
+        results.full_shape = self.full_shape
+
+        return results
+
+
 class Slicer:
-    def __init__(self, model, slice_size=(640, 640), overlap=0.2):
+    """
+    Sliced inference for images that are much larger than the model's input size. Slices are read with
+    windowed rasterio reads (the full image is never loaded) by a pool of threads, run through the model in
+    batches of fixed-size slices, and merged so objects in the overlap between slices are kept once
+    (see SliceMerger).
+
+    :param model: Ultralytics model (or predictor) that accepts a list of images
+    :param slice_size: (width, height) of the slices
+    :param overlap: Fractional overlap between neighbouring slices
+    :param batch_size: Number of slices passed to the model at once
+    :param num_workers: Number of threads reading slices (the next batch is read during inference)
+    :param pad: Pad slices at the image border to slice_size, so every batch has one fixed shape
+    """
+    def __init__(self, model, slice_size=(640, 640), overlap=0.2, batch_size=8, num_workers=4, pad=True):
         self.model = model
         self.slice_size = slice_size
         self.overlap = overlap
-        self.slicer = None
-        
-    def initialize_slicer(self):
-        def inference_callback(image_slice: np.ndarray):
-            results = self.model.predict(image_slice)[0]
-            return sv.Detections.from_inference(results)
-            
-        self.slicer = sv.InferenceSlicer(
-            callback=inference_callback,
-            slice_size=self.slice_size,
-            overlap=self.overlap
-        )
-        
-    def process_image(self, image):
-        if self.slicer is None:
-            self.initialize_slicer()
-        return self.slicer(image)
\ No newline at end of file
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.pad = pad
+
+        # Each reading thread keeps its own handles, rasterio datasets are not thread-safe
+        self.local = threading.local()
+        self.handles = []
+        self.handles_lock = threading.Lock()
+
+        self.timings = defaultdict(float)
+
+    @staticmethod
+    def get_slices(height, width, slice_size, overlap):
+        """
+        Get overlapping slices covering an image.
+
+        :param height: Height of the image
+        :param width: Width of the image
+        :param slice_size: (width, height) of the slices
+        :param overlap: Fractional overlap between neighbouring slices
+        :return: Slices as (left, top, right, bottom), shape (T, 4)
+        """
+        slice_width, slice_height = slice_size
+
+        def get_starts(length, size):
+            stride = max(1, int(size * (1 - overlap)))
+            starts = list(range(0, max(length - size, 0) + 1, stride))
+            # Make sure the last slice reaches the edge of the image
+            if starts[-1] + size < length:
+                starts.append(length - size)
+            return starts
+
+        slices = [(x, y, min(x + slice_width, width), min(y + slice_height, height))
+                  for y in get_starts(height, slice_height)
+                  for x in get_starts(width, slice_width)]
+
+        return np.array(slices, dtype=int)
+
+    def get_handle(self, image_path):
+        """
+        Get this thread's rasterio handle for an image, opening it on first use.
+
+        :param image_path: Path to the image
+        :return: Open rasterio dataset
+        """
+        handles = getattr(self.local, 'handles', None)
+        if handles is None:
+            handles = self.local.handles = {}
+
+        if image_path not in handles:
+            handles[image_path] = rasterio.open(image_path)
+            with self.handles_lock:
+                self.handles.append(handles[image_path])
+
+        return handles[image_path]
+
+    def close_handles(self):
+        """Close the rasterio handles opened by the reading threads."""
+        with self.handles_lock:
+            for handle in self.handles:
+                handle.close()
+            self.handles = []
+        self.local = threading.local()
+
+    def read_slice(self, image_path, window):
+        """
+        Read a slice of an image as a BGR image (the same as the model reads from a path), padded to
+        slice_size if the slice is at the border of a smaller image.
+
+        :param image_path: Path to the image
+        :param window: (left, top, right, bottom) to read
+        :return: Image as an (H, W, 3) array
+        """
+        left, top, right, bottom = (int(i) for i in window)
+        src = self.get_handle(image_path)
+        image = src.read(window=Window(left, top, right - left, bottom - top))
+        image = preprocess_image(image.transpose(1, 2, 0))[..., ::-1]
+
+        slice_width, slice_height = self.slice_size
+        if self.pad and image.shape[:2] != (slice_height, slice_width):
+            padded = np.zeros((slice_height, slice_width, 3), dtype=image.dtype)
+            padded[:image.shape[0], :image.shape[1]] = image
+            return padded
+
+        return np.ascontiguousarray(image)
+
+    def predict(self, image_path, iou_thresh=0.5, filter_results=None, **kwargs):
+        """
+        Make predictions on an image slice by slice, yielding the final results of each slice as soon
+        as its batch is done, then the objects merged across slices. The next batch of slices is read by
+        the thread pool while the current one is in the model.
+
+        :param image_path: Path to the image
+        :param iou_thresh: IoU threshold used to merge detections across slices
+        :param filter_results: Optional callable applied to each slice's results before merging
+        :param kwargs: Keyword arguments passed to the model (e.g. imgsz=slice_size for fixed slices)
+        :return: Generator of Ultralytics Results, with 'offset' (x, y) and 'full_shape' (h, w) set
+        """
+        with rasterio.open(image_path) as src:
+            full_shape = (src.height, src.width)
+
+        slices = self.get_slices(*full_shape, self.slice_size, self.overlap)
+        merger = SliceMerger(slices, full_shape, iou_thresh)
+        batches = [np.arange(i, min(i + self.batch_size, len(slices))) for i in range(0, len(slices), self.batch_size)]
+
+        executor = ThreadPoolExecutor(max_workers=max(1, self.num_workers))
+        try:
+            pending = [executor.submit(self.read_slice, image_path, slices[i]) for i in batches[0]]
+
+            for idx, indices in enumerate(batches):
+                start = time.perf_counter()
+                images = [future.result() for future in pending]
+                self.timings['read'] += time.perf_counter() - start
+
+                # Read the next batch while this one is in the model
+                if idx + 1 < len(batches):
+                    pending = [executor.submit(self.read_slice, image_path, slices[i]) for i in batches[idx + 1]]
+
+                # One call per batch of slices, not per slice
+                start = time.perf_counter()
+                with torch.no_grad():
+                    batch_results = self.model(images, **kwargs)
+                self.timings['inference'] += time.perf_counter() - start
+                self.timings['slices'] += len(images)
+
+                for results, index in zip(batch_results, indices):
+                    start = time.perf_counter()
+                    window = slices[index]
+                    results.path = image_path
+                    results.offset = (int(window[0]), int(window[1]))
+                    results.full_shape = full_shape
+
+                    if filter_results is not None:
+                        results = filter_results(results)
+
+                    results = merger.add(results, index)
+                    self.timings['merge'] += time.perf_counter() - start
+
+                    yield results
+
+                del images, batch_results
+
+            # Objects in the overlaps or cut by slice edges, once every slice is done
+            start = time.perf_counter()
+            merged = merger.flush()
+            self.timings['merge'] += time.perf_counter() - start
+
+            yield from merged
+        finally:
+            executor.shutdown(wait=True)
+            self.close_handles()
+
+    def report(self):
+        """
+        Summarize the time spent reading, inferring and merging slices.
+
+        :return: Summary as a string
+        """
+        total = self.timings['read'] + self.timings['inference'] + self.timings['merge']
+        slices_per_sec = self.timings['slices'] / total if total else 0.0
+
+        return (f"{int(self.timings['slices'])} slices, {slices_per_sec:.1f} slices/sec "
+                f"(read wait {self.timings['read']:.2f}s, "
+                f"inference {self.timings['inference']:.2f}s, "
+                f"merge {self.timings['merge']:.2f}s)")
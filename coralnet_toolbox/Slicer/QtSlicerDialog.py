@@ -1,6 +1,5 @@
 from PyQt5.QtWidgets import QDialog
-from PyQt5.QtWidgets import (QGroupBox, QVBoxLayout, QHBoxLayout, QLabel, QSpinBox, 
-                             QDoubleSpinBox, QCheckBox)
+from PyQt5.QtWidgets import (QGroupBox, QFormLayout, QSpinBox, QDoubleSpinBox, QComboBox)
 
 from coralnet_toolbox.Slicer.QtSlicer import Slicer
 
@@ -11,58 +10,104 @@ from coralnet_toolbox.Slicer.QtSlicer import Slicer
 
 
 class Base(QDialog):
+    """
+    Base class for dialogs that offer sliced inference. Subclasses call setup_slicer_layout() after
+    creating self.layout, and get_slicer() when predicting.
+    """
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.slice_enabled = False
         self.slice_size = (640, 640)
         self.slice_overlap = 0.2
-        self.slicer_handler = None
+        self.slice_batch_size = 8
+        self.slice_workers = 4
+        self.slicer = None
 
     def setup_slicer_layout(self):
-        slicer_group = QGroupBox("Image Slicing")
-        slicer_layout = QVBoxLayout()
-        
-        # Enable slicer checkbox
-        self.slicer_checkbox = QCheckBox("Enable Image Slicing")
-        self.slicer_checkbox.stateChanged.connect(self.toggle_slicer)
-        
+        """
+        Set up the image slicing group box.
+        """
+        group_box = QGroupBox("Image Slicing")
+        layout = QFormLayout()
+
+        # Enable slicer dropdown
+        self.slicer_dropdown = QComboBox()
+        self.slicer_dropdown.addItems(["False", "True"])
+        self.slicer_dropdown.setCurrentIndex(0)
+        layout.addRow("Sliced Inference:", self.slicer_dropdown)
+
         # Slice size controls
-        size_layout = QHBoxLayout()
-        size_layout.addWidget(QLabel("Slice Size:"))
         self.slice_size_spin = QSpinBox()
-        self.slice_size_spin.setRange(256, 1024)
-        self.slice_size_spin.setValue(640)
-        size_layout.addWidget(self.slice_size_spin)
-        
+        self.slice_size_spin.setRange(256, 4096)
+        self.slice_size_spin.setSingleStep(128)
+        self.slice_size_spin.setValue(self.slice_size[0])
+        layout.addRow("Slice Size:", self.slice_size_spin)
+
         # Overlap controls
-        overlap_layout = QHBoxLayout()
-        overlap_layout.addWidget(QLabel("Overlap:"))
         self.overlap_spin = QDoubleSpinBox()
         self.overlap_spin.setRange(0.0, 0.5)
-        self.overlap_spin.setValue(0.2)
-        overlap_layout.addWidget(self.overlap_spin)
-        
-        slicer_layout.addWidget(self.slicer_checkbox)
-        slicer_layout.addLayout(size_layout)
-        slicer_layout.addLayout(overlap_layout)
-        slicer_group.setLayout(slicer_layout)
-        self.layout.addWidget(slicer_group)
-
-    def toggle_slicer(self, state):
-        self.slice_enabled = bool(state)
-        if self.slice_enabled and self.loaded_model:
-            self.slicer_handler = Slicer(
-                model=self.loaded_model,
-                slice_size=(self.slice_size_spin.value(), self.slice_size_spin.value()),
-                overlap=self.overlap_spin.value()
-            )
-        else:
-            self.slicer_handler = None
-
-    # Modify existing process_image method
-    def process_image(self, image):
-        if self.slice_enabled and self.slicer_handler:
-            return self.slicer_handler.process_image(image)
-        else:
-            # Original processing code
-            return self.loaded_model.predict(image)
\ No newline at end of file
+        self.overlap_spin.setSingleStep(0.05)
+        self.overlap_spin.setValue(self.slice_overlap)
+        layout.addRow("Overlap:", self.overlap_spin)
+
+        # Batch size controls
+        self.slice_batch_spin = QSpinBox()
+        self.slice_batch_spin.setRange(1, 128)
+        self.slice_batch_spin.setValue(self.slice_batch_size)
+        layout.addRow("Slices per Batch:", self.slice_batch_spin)
+
+        # Reading threads controls
+        self.slice_workers_spin = QSpinBox()
+        self.slice_workers_spin.setRange(1, 32)
+        self.slice_workers_spin.setValue(self.slice_workers)
+        layout.addRow("Reading Threads:", self.slice_workers_spin)
+
+        group_box.setLayout(layout)
+        self.layout.addWidget(group_box)
+
+    def is_slicing_enabled(self):
+        """Check if sliced inference is enabled."""
+        return self.slicer_dropdown.currentText() == "True"
+
+    def get_slicer(self):
+        """
+        Create a Slicer for the loaded model with the current settings.
+        """
+        self.slice_size = (self.slice_size_spin.value(), self.slice_size_spin.value())
+        self.slice_overlap = self.overlap_spin.value()
+        self.slice_batch_size = self.slice_batch_spin.value()
+        self.slice_workers = self.slice_workers_spin.value()
+
+        return Slicer(model=self.loaded_model,
+                      slice_size=self.slice_size,
+                      overlap=self.slice_overlap,
+                      batch_size=self.slice_batch_size,
+                      num_workers=self.slice_workers)
+
+    def predict_sliced(self, inputs, iou_thresh=0.5, **kwargs):
+        """
+        Make sliced predictions on each of the inputs.
+
+        :param inputs: List of image paths
+        :param iou_thresh: IoU threshold used to merge detections across slices
+        :param kwargs: Keyword arguments passed to the model
+        :return: Generator of Ultralytics Results, one per slice
+        """
+        self.slicer = self.get_slicer()
+
+        # Slices are padded to one fixed size, so they are batched without letterboxing
+        kwargs.setdefault('imgsz', max(self.slice_size))
+
+        for image_path in inputs:
+            yield from self.slicer.predict(image_path, iou_thresh=iou_thresh, **kwargs)
+
+    def report_slicer_timings(self):
+        """
+        Print the slicer's throughput and show it in the status bar (if any).
+        """
+        if self.slicer is None:
+            return
+
+        summary = self.slicer.report()
+        print(f"Sliced inference: {summary}")
+        if hasattr(self, 'status_bar'):
+            self.status_bar.setText(summary)
@@ -11,7 +11,6 @@ from PyQt5.QtWidgets import QMessageBox, QGraphicsEllipseItem, QGraphicsRectItem
 from coralnet_toolbox.Tools.QtTool import Tool
 from coralnet_toolbox.Annotations.QtPolygonAnnotation import PolygonAnnotation
 
-from coralnet_toolbox.utilities import pixmap_to_numpy
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -35,6 +34,7 @@ class SAMTool(Tool):
         self.negative_points = []
 
         self.working_area = None
+        self.working_window = None
         self.shadow_area = None
 
         self.image_path = None
@@ -67,6 +67,9 @@ class SAMTool(Tool):
         self.annotation_window.setCursor(Qt.CrossCursor)
         self.sam_dialog = self.annotation_window.main_window.sam_deploy_model_dialog
         self.hover_active = True  # Ensure hover is active when SAMTool is activated
+        # Precompute embeddings in the background whenever a new image is shown
+        self.annotation_window.imageLoaded.connect(self.precompute_embeddings)
+        self.precompute_embeddings()
 
     def deactivate(self):
         """
@@ -74,6 +77,12 @@ class SAMTool(Tool):
         """
         self.active = False
         self.annotation_window.setCursor(Qt.ArrowCursor)
+        try:
+            self.annotation_window.imageLoaded.disconnect(self.precompute_embeddings)
+        except TypeError:
+            pass  # Not connected
+        if self.sam_dialog:
+            self.sam_dialog.cancel_precompute()
         self.sam_dialog = None
         self.cancel_annotation()
         self.cancel_working_area()
@@ -256,7 +265,8 @@ class SAMTool(Tool):
         # If there is no working area, set it
         if not self.working_area:
             self.set_working_area()
-            self.sam_dialog.set_image(self.image, self.image_path)
+            # Read from the path so the embedding is shared with the precompute worker (None is the full image)
+            self.sam_dialog.set_image(None, self.image_path, window=self.working_window)
         # If there is a bounding box, add the annotation
         elif self.start_point and self.end_point and not self.drawing_rectangle:
             self.annotation_window.add_annotation()
@@ -270,21 +280,17 @@ class SAMTool(Tool):
         self.cancel_annotation()
         self.annotation_window.viewport().update()
 
-    def set_working_area(self):
+    def get_working_window(self, image_width, image_height):
         """
-        Set the working area for the tool.
+        Get the current extent of the view, clipped to the image.
+        
+        Args:
+            image_width (int): Width of the image.
+            image_height (int): Height of the image.
+            
+        Returns:
+            tuple: (left, top, right, bottom)
         """
-        self.annotation_window.setCursor(Qt.WaitCursor)
-
-        # Cancel the current working area if it exists
-        self.cancel_working_area()
-
-        # Original image (grab current from the annotation window)
-        self.image_path = self.annotation_window.current_image_path
-        self.original_image = pixmap_to_numpy(self.annotation_window.image_pixmap)
-        self.original_width = self.annotation_window.image_pixmap.size().width()
-        self.original_height = self.annotation_window.image_pixmap.size().height()
-
         # Current extent (view)
         extent = self.annotation_window.viewportToScene()
 
@@ -301,13 +307,54 @@ class SAMTool(Tool):
             top = 0
         if left < 0:
             left = 0
-        if bottom > self.original_height:
-            bottom = self.original_height
-        if right > self.original_width:
-            right = self.original_width
+        if bottom > image_height:
+            bottom = image_height
+        if right > image_width:
+            right = image_width
+
+        return left, top, right, bottom
+    
+    def get_cache_window(self, left, top, right, bottom):
+        """
+        Get the window of the working area; None if it covers the whole image, so it is read and
+        cached as the full image (as the precompute worker does for upcoming images).
+        """
+        if (left, top, right, bottom) == (0, 0, self.original_width, self.original_height):
+            return None
+        return left, top, right, bottom
+    
+    def precompute_embeddings(self, width=None, height=None):
+        """
+        Ask the SAM dialog to precompute embeddings for the current view and the next images.
+        """
+        if not self.sam_dialog or not self.annotation_window.image_pixmap:
+            return
+        
+        self.original_width = self.annotation_window.image_pixmap.size().width()
+        self.original_height = self.annotation_window.image_pixmap.size().height()
+        window = self.get_cache_window(*self.get_working_window(self.original_width, self.original_height))
+        self.sam_dialog.precompute_embeddings(self.annotation_window.current_image_path, window)
+
+    def set_working_area(self):
+        """
+        Set the working area for the tool.
+        """
+        self.annotation_window.setCursor(Qt.WaitCursor)
+
+        # Cancel the current working area if it exists
+        self.cancel_working_area()
+
+        # Original image (grab current from the annotation window)
+        self.image_path = self.annotation_window.current_image_path
+        self.original_width = self.annotation_window.image_pixmap.size().width()
+        self.original_height = self.annotation_window.image_pixmap.size().height()
+
+        # Current extent (view), clipped to the image
+        left, top, right, bottom = self.get_working_window(self.original_width, self.original_height)
 
         # Set the working area
         working_rect = QRectF(left, top, right - left, bottom - top)
+        self.working_window = self.get_cache_window(left, top, right, bottom)
 
         # Create the graphic for the working area
         pen = QPen(Qt.green)
@@ -335,9 +382,6 @@ class SAMTool(Tool):
         # Add the shadow item to the scene
         self.annotation_window.scene.addItem(self.shadow_area)
 
-        # Crop the image based on the working_rect
-        self.image = self.original_image[top:bottom, left:right]
-
         self.annotation_window.setCursor(Qt.CrossCursor)
         self.annotation_window.viewport().update()
 
@@ -131,19 +131,21 @@ def pixmap_to_numpy(pixmap):
     :param pixmap:
     :return:
     """
-    # Convert QPixmap to QImage
+    # Convert QPixmap to QImage, with 4 bytes per pixel
     image = pixmap.toImage()
+    if image.format() not in [QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied]:
+        image = image.convertToFormat(QImage.Format_ARGB32)
+
     # Get image dimensions
     width = image.width()
     height = image.height()
 
     # Convert QImage to numpy array
-    byte_array = image.bits().asstring(width * height * 4)  # 4 for RGBA
-    numpy_array = np.frombuffer(byte_array, dtype=np.uint8).reshape((height, width, 4))
+    byte_array = image.bits().asstring(height * image.bytesPerLine())
+    numpy_array = np.frombuffer(byte_array, dtype=np.uint8).reshape((height, image.bytesPerLine() // 4, 4))
 
-    # If the image format is ARGB32, swap the first and last channels (A and B)
-    if format == QImage.Format_ARGB32:
-        numpy_array = numpy_array[:, :, [2, 1, 0, 3]]
+    # 32-bit formats are stored as BGRA, swap the B and R channels to get RGB
+    numpy_array = numpy_array[:, :width, [2, 1, 0, 3]]
 
     return numpy_array[:, :, :3]
 
@@ -0,0 +1,4 @@
+import os
+
+# Qt widgets and pixmaps are created without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
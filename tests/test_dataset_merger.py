@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.MergeDatasets.QtDatasetMerger`."""
+
+import os
+
+import yaml
+
+from coralnet_toolbox.MachineLearning.MergeDatasets.QtDatasetMerger import DatasetMerger
+
+
+def yolo_dataset(root, names, images):
+    """Create a YOLO dataset with images given as {name: (content, label lines or None)} in its train split."""
+    os.makedirs(root / "train" / "images")
+    os.makedirs(root / "train" / "labels")
+    (root / "data.yaml").write_text(yaml.dump({'names': names}))
+    for name, (content, lines) in images.items():
+        (root / "train" / "images" / f"{name}.jpg").write_bytes(content)
+        if lines is not None:
+            (root / "train" / "labels" / f"{name}.txt").write_text("".join(f"{line}\n" for line in lines))
+    return str(root)
+
+
+def read_label(output, name):
+    return (output / "train" / "labels" / f"{name}.txt").read_text().splitlines()
+
+
+def test_class_indices_are_remapped_to_the_merged_names(tmp_path):
+    a = yolo_dataset(tmp_path / "a", ['coral', 'sponge'], {'x': (b"x", ["1 0.5 0.5 0.1 0.1"])})
+    b = yolo_dataset(tmp_path / "b", ['algae', 'coral'], {'y': (b"y", ["0 0.5 0.5 0.1 0.1", "1 0.2 0.2 0.1 0.1"])})
+    output = tmp_path / "merged"
+
+    stats = DatasetMerger(str(output), task='detect', num_workers=2).merge([a, b])
+
+    assert stats['images'] == 2
+    assert yaml.safe_load((output / "data.yaml").read_text())['names'] == ['coral', 'sponge', 'algae']
+    assert read_label(output, 'x') == ["1 0.5 0.5 0.1 0.1"]
+    assert read_label(output, 'y') == ["2 0.5 0.5 0.1 0.1", "0 0.2 0.2 0.1 0.1"]
+
+
+def test_name_collisions_are_renamed(tmp_path):
+    a = yolo_dataset(tmp_path / "a", ['coral'], {'x': (b"first", ["0 0.5 0.5 0.1 0.1"])})
+    b = yolo_dataset(tmp_path / "b", ['coral'], {'x': (b"other", ["0 0.1 0.1 0.1 0.1"])})
+    output = tmp_path / "merged"
+
+    stats = DatasetMerger(str(output), task='detect', num_workers=2).merge([a, b])
+
+    assert stats['renamed'] == 1
+    assert (output / "train" / "images" / "x_ds2.jpg").read_bytes() == b"other"
+    assert read_label(output, 'x_ds2') == ["0 0.1 0.1 0.1 0.1"]
+
+
+def test_labels_of_duplicates_are_merged(tmp_path):
+    a = yolo_dataset(tmp_path / "a", ['coral'], {'x': (b"same", ["0 0.5 0.5 0.1 0.1"])})
+    b = yolo_dataset(tmp_path / "b", ['sponge', 'coral'], {'z': (b"same", ["1 0.5 0.5 0.1 0.1",
+                                                                            "0 0.2 0.2 0.1 0.1"])})
+    output = tmp_path / "merged"
+
+    stats = DatasetMerger(str(output), task='detect', num_workers=2).merge([a, b])
+
+    assert stats['images'] == 1 and stats['duplicates'] == 1 and stats['merged_labels'] == 1
+    assert not (output / "train" / "images" / "z.jpg").exists()
+    assert read_label(output, 'x') == ["0 0.5 0.5 0.1 0.1", "1 0.2 0.2 0.1 0.1"]
+
+
+def test_image_is_not_placed_when_its_label_fails(tmp_path):
+    a = yolo_dataset(tmp_path / "a", ['coral'], {'x': (b"x", ["3 0.5 0.5 0.1 0.1"])})
+    output = tmp_path / "merged"
+
+    stats = DatasetMerger(str(output), task='detect', num_workers=1).merge([a])
+
+    assert stats['failed'] == 1
+    assert not (output / "train" / "images" / "x.jpg").exists()
+
+
+def test_classification_duplicates_are_kept_once_per_class(tmp_path):
+    for dataset, label in (("a", "coral"), ("b", "coral"), ("c", "sponge")):
+        os.makedirs(tmp_path / dataset / "train" / label)
+        (tmp_path / dataset / "train" / label / f"{dataset}.jpg").write_bytes(b"same")
+    output = tmp_path / "merged"
+
+    stats = DatasetMerger(str(output), num_workers=2).merge([str(tmp_path / d) for d in "abc"])
+
+    assert stats['images'] == 2 and stats['duplicates'] == 1 and stats['cross_class_duplicates'] == 1
+    assert (output / "train" / "coral" / "a.jpg").exists()
+    assert not (output / "train" / "coral" / "b.jpg").exists()
+    assert (output / "train" / "sponge" / "c.jpg").exists()
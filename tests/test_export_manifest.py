@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.ExportDataset.QtExportManifest`."""
+
+import os
+
+import pytest
+
+from coralnet_toolbox.MachineLearning.ExportDataset.QtExportManifest import ExportManifest
+
+
+@pytest.fixture
+def export(tmp_path):
+    """A source image, and a function writing its exported files to a split of the dataset."""
+    source = tmp_path / "source.jpg"
+    source.write_bytes(b"image")
+    output_dir = tmp_path / "dataset"
+
+    def write(manifest, split, lines):
+        os.makedirs(output_dir / split / "images", exist_ok=True)
+        os.makedirs(output_dir / split / "labels", exist_ok=True)
+        image_path = output_dir / split / "images" / "source.jpg"
+        label_path = output_dir / split / "labels" / "source.txt"
+        image_path.write_bytes(source.read_bytes())
+        label_path.write_text("\n".join(lines))
+        manifest.update(str(source), split, lines, str(label_path), str(image_path))
+        return image_path, label_path
+
+    os.makedirs(output_dir)
+    return str(source), str(output_dir), write
+
+
+def test_unchanged_after_reload(export):
+    source, output_dir, write = export
+    manifest = ExportManifest(output_dir)
+    write(manifest, "train", ["0 0.5 0.5 0.1 0.1"])
+    manifest.save()
+
+    manifest = ExportManifest(output_dir)
+
+    assert source in manifest
+    assert manifest.get_split(source) == "train"
+    assert manifest.is_unchanged(source, "train", ["0 0.5 0.5 0.1 0.1"])
+    assert not manifest.is_unchanged(source, "train", ["1 0.5 0.5 0.1 0.1"])
+    assert not manifest.is_unchanged(source, "valid", ["0 0.5 0.5 0.1 0.1"])
+
+
+def test_changed_when_output_is_missing(export):
+    source, output_dir, write = export
+    manifest = ExportManifest(output_dir)
+    image_path, _ = write(manifest, "train", ["0 0.5 0.5 0.1 0.1"])
+
+    os.remove(image_path)
+
+    assert not manifest.is_unchanged(source, "train", ["0 0.5 0.5 0.1 0.1"])
+
+
+def test_moving_split_removes_previous_files(export):
+    source, output_dir, write = export
+    manifest = ExportManifest(output_dir)
+    train_image, train_label = write(manifest, "train", ["0 0.5 0.5 0.1 0.1"])
+
+    write(manifest, "valid", ["0 0.5 0.5 0.1 0.1"])
+
+    assert not train_image.exists() and not train_label.exists()
+    assert manifest.get_split(source) == "valid"
+
+
+def test_prune_removes_images_not_exported(export):
+    source, output_dir, write = export
+    manifest = ExportManifest(output_dir)
+    image_path, label_path = write(manifest, "train", ["0 0.5 0.5 0.1 0.1"])
+    manifest.save()
+
+    manifest = ExportManifest(output_dir)
+
+    assert manifest.prune() == 1
+    assert source not in manifest
+    assert not image_path.exists() and not label_path.exists()
+
+
+def test_unreadable_manifest_exports_everything(tmp_path, capsys):
+    (tmp_path / ExportManifest.filename).write_text("{")
+
+    manifest = ExportManifest(str(tmp_path))
+
+    assert manifest.entries == {}
+    assert "Warning: Failed to read the export manifest" in capsys.readouterr().out
+
+
+def test_discard_forgets_failed_images(export):
+    source, output_dir, write = export
+    manifest = ExportManifest(output_dir)
+    image_path, _ = write(manifest, "train", ["0 0.5 0.5 0.1 0.1"])
+
+    manifest.discard(source)
+
+    assert source not in manifest
+    assert manifest.prune() == 0
+    assert image_path.exists()
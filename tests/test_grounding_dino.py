@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""Tests for the tiled inference of `coralnet_toolbox.AutoDistill.Models.GroundingDINOModel`."""
+
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+import rasterio
+import supervision as sv
+
+from autodistill.detection import CaptionOntology
+
+from coralnet_toolbox.AutoDistill.Models.GroundingDINOModel import GroundingDINO
+
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = str(tmp_path / "image.tif")
+    with rasterio.open(path, 'w', driver='GTiff', width=500, height=500, count=3, dtype='uint8') as dst:
+        dst.write(np.zeros((3, 500, 500), dtype=np.uint8))
+    return path
+
+
+@pytest.fixture
+def model():
+    # Without loading the weights, tiles are "predicted" with one box each
+    model = GroundingDINO.__new__(GroundingDINO)
+    model.ontology = CaptionOntology({"coral": "coral"})
+    model.box_threshold = 0.35
+    model.text_threshold = 0.25
+    model.tile_cache = OrderedDict()
+    model.max_cached_tiles = 4
+    model.num_predicted = 0
+
+    def predict_batch(images):
+        model.num_predicted += len(images)
+        return [sv.Detections(xyxy=np.array([[10.0, 10.0, 20.0, 20.0]]),
+                              confidence=np.array([0.9]),
+                              class_id=np.array([0])) for _ in images]
+
+    model.predict_batch = predict_batch
+    return model
+
+
+def test_predict_tiled_with_more_tiles_than_the_cache(model, image_path):
+    detections = model.predict_tiled(image_path, tile_size=100, overlap=0.0, batch_size=3)
+
+    # One box per tile, none overlapping
+    assert len(detections) == 25
+    assert len(model.tile_cache) == model.max_cached_tiles
+
+
+def test_predict_tiled_reuses_cached_tiles(model, image_path):
+    model.max_cached_tiles = 100
+    model.predict_tiled(image_path, tile_size=100, overlap=0.0)
+    model.predict_tiled(image_path, tile_size=100, overlap=0.0)
+
+    assert model.num_predicted == 25
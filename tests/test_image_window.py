@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.QtImageWindow`."""
+
+from types import SimpleNamespace
+
+from coralnet_toolbox.QtImageWindow import ImageWindow
+
+
+def annotation(image_path, short_label_code, machine_confidence=None):
+    return SimpleNamespace(image_path=image_path,
+                           label=SimpleNamespace(short_label_code=short_label_code),
+                           machine_confidence=machine_confidence or {})
+
+
+def test_update_images_annotations_counts_existing_annotations():
+    existing = annotation("a.jpg", "coral")
+    imported = [annotation("a.jpg", "sponge", {'sponge': 0.9}), annotation("b.jpg", "coral")]
+
+    window = ImageWindow.__new__(ImageWindow)
+    window.image_dict = {path: {} for path in ("a.jpg", "b.jpg", "c.jpg")}
+    window.annotation_window = SimpleNamespace(annotations_dict=dict(enumerate([existing] + imported)))
+    window.update_table_widget = lambda: None
+
+    window.update_images_annotations(["a.jpg", "b.jpg", "missing.jpg"])
+
+    assert window.image_dict["a.jpg"] == {'has_annotations': True, 'has_predictions': 1,
+                                          'labels': {'coral', 'sponge'}, 'annotation_count': 2}
+    assert window.image_dict["b.jpg"]['annotation_count'] == 1
+    assert window.image_dict["c.jpg"] == {}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.ImportDataset.QtLabelReader`."""
+
+import numpy as np
+import pytest
+
+from coralnet_toolbox.MachineLearning.ImportDataset.QtLabelReader import (LabelReader, read_boxes, read_polygons,
+                                                                           to_pixel_boxes)
+
+
+@pytest.fixture
+def write_label(tmp_path):
+    def write(text, name="label.txt"):
+        path = tmp_path / name
+        path.write_text(text)
+        return str(path)
+    return write
+
+
+def test_read_boxes(write_label):
+    classes, boxes = read_boxes(write_label("0 0.5 0.5 0.2 0.4\n\n3 0.1 0.2 0.3 0.4\n"))
+
+    assert classes.tolist() == [0, 3]
+    np.testing.assert_allclose(boxes, [[0.5, 0.5, 0.2, 0.4], [0.1, 0.2, 0.3, 0.4]])
+
+
+def test_read_boxes_single_row_and_empty_file(write_label):
+    classes, boxes = read_boxes(write_label("1 0.5 0.5 0.2 0.4"))
+    assert classes.tolist() == [1] and boxes.shape == (1, 4)
+
+    classes, boxes = read_boxes(write_label(""))
+    assert classes.shape == (0,) and boxes.shape == (0, 4)
+
+
+def test_read_boxes_converts_polygons(write_label):
+    classes, boxes = read_boxes(write_label("0 0.5 0.5 0.2 0.4\n1 0.1 0.1 0.3 0.1 0.3 0.5\n"))
+
+    assert classes.tolist() == [0, 1]
+    np.testing.assert_allclose(boxes[1], [0.2, 0.3, 0.2, 0.4], atol=1e-6)
+
+
+def test_read_polygons_converts_boxes(write_label):
+    classes, polygons = read_polygons(write_label("2 0.5 0.5 0.2 0.4\n0 0.1 0.1 0.3 0.1 0.3 0.5\n"))
+
+    assert classes.tolist() == [2, 0]
+    np.testing.assert_allclose(polygons[0], [[0.4, 0.3], [0.6, 0.3], [0.6, 0.7], [0.4, 0.7]], atol=1e-6)
+    assert polygons[1].shape == (3, 2)
+
+
+@pytest.mark.parametrize("text", ["0 0.5 0.5 0.2 0.4\n1 0.5 x 0.2 0.4\n",
+                                  "0 0.5 0.5 0.2\n",
+                                  "0 0.5 0.5 0.2 0.4 0.1\n",
+                                  "0.5 0.5 0.5 0.2 0.4\n",
+                                  "-1 0.5 0.5 0.2 0.4\n",
+                                  "0 nan 0.5 0.2 0.4\n"])
+def test_malformed_files_are_rejected(write_label, text):
+    label_path = write_label(text)
+
+    with pytest.raises(ValueError):
+        read_boxes(label_path)
+    with pytest.raises(ValueError):
+        read_polygons(label_path)
+
+
+def test_reader_reports_bad_files(write_label, capsys):
+    good = write_label("0 0.5 0.5 0.2 0.4\n", "good.txt")
+    bad = write_label("0 0.5 0.5 0.2 0.4\n1 0.5 x 0.2 0.4\n", "bad.txt")
+
+    labels = LabelReader('detect', num_workers=2).read([good, bad])
+
+    assert labels[0][0].tolist() == [0]
+    assert labels[1] is None
+    assert "Warning: Failed to read" in capsys.readouterr().out
+
+
+def test_to_pixel_boxes():
+    boxes = to_pixel_boxes(np.array([[0.5, 0.5, 0.2, 0.4]], dtype=np.float32), 100, 50)
+
+    np.testing.assert_allclose(boxes, [[40, 15, 60, 35]], atol=1e-4)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.ExportDataset.QtLabelWriter`."""
+
+import os
+
+from coralnet_toolbox.MachineLearning.ExportDataset.QtLabelWriter import LabelWriter
+
+
+def test_write_returns_failed_images(tmp_path):
+    os.makedirs(tmp_path / "source")
+    os.makedirs(tmp_path / "train" / "images")
+    os.makedirs(tmp_path / "train" / "labels")
+    good = tmp_path / "source" / "good.jpg"
+    good.write_bytes(b"image")
+    missing = str(tmp_path / "source" / "missing.jpg")
+
+    failed = LabelWriter(num_workers=2).write({str(good): ["0 0.5 0.5 0.1 0.1"], missing: ["0 0.5 0.5 0.1 0.1"]},
+                                              str(tmp_path / "train"))
+
+    assert failed == [missing]
+    assert (tmp_path / "train" / "images" / "good.jpg").read_bytes() == b"image"
+    assert (tmp_path / "train" / "labels" / "good.txt").read_text() == "0 0.5 0.5 0.1 0.1\n"
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.Materialization`."""
+
+import os
+
+import pytest
+
+from coralnet_toolbox.MachineLearning.Materialization import materialize, write_manifest
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "image.jpg"
+    path.write_bytes(b"original")
+    return path
+
+
+@pytest.mark.parametrize("strategy", ["Copy", "Hardlink", "Symlink"])
+def test_materialize_into_directory(tmp_path, src, strategy):
+    dataset = tmp_path / "dataset"
+    dataset.mkdir()
+
+    dst = materialize(str(src), str(dataset), strategy)
+
+    assert dst == str(dataset / "image.jpg")
+    assert open(dst, 'rb').read() == b"original"
+
+
+@pytest.mark.parametrize("link", [os.link, os.symlink])
+def test_copy_replaces_links_instead_of_writing_through_them(tmp_path, src, link):
+    dst = tmp_path / "dst.jpg"
+    link(str(src), str(dst))
+    other = tmp_path / "other.jpg"
+    other.write_bytes(b"other")
+
+    materialize(str(other), str(dst), "Copy")
+
+    assert dst.read_bytes() == b"other"
+    assert not dst.is_symlink()
+    assert src.read_bytes() == b"original"
+
+
+def test_materialize_onto_itself_keeps_the_file(src):
+    assert materialize(str(src), str(src), "Copy") == str(src)
+    assert src.read_bytes() == b"original"
+
+
+def test_write_manifest(tmp_path, src):
+    manifest = write_manifest([str(src)], str(tmp_path / "train.txt"))
+
+    assert open(manifest).read() == f"{os.path.abspath(src)}\n"
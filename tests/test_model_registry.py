@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.ModelRegistry`."""
+
+import json
+
+import torch
+
+from coralnet_toolbox.ModelRegistry import ModelRegistry
+
+
+def model(megabytes):
+    return torch.nn.Linear(megabytes * 1024 ** 2 // 4, 1, bias=False)
+
+
+def test_evicts_least_recently_used_and_notifies_the_owner():
+    registry = ModelRegistry(memory_budget=3 * 1024 ** 2)
+    evicted = []
+
+    a = registry.get_key('yolo', 'a.pt')
+    b = registry.get_key('yolo', 'b.pt')
+    registry.get_or_load(a, lambda: model(2), on_evict=evicted.append)
+    registry.get_or_load(b, lambda: model(2), on_evict=evicted.append)
+
+    assert evicted == [a]
+    assert a not in registry and b in registry
+
+
+def test_preload_is_opt_in(tmp_path):
+    session_path = tmp_path / "session.json"
+    (tmp_path / "model.pt").touch()
+    session_path.write_text(json.dumps([['yolo', str(tmp_path / "model.pt"), 'detect']]))
+
+    loaded = []
+    registry = ModelRegistry(session_path=str(session_path))
+    registry.register_loader('yolo', lambda path, task, device: loaded.append(path) or model(1))
+
+    registry.preload_session('cpu')
+    assert registry.preload_thread is None
+
+    registry.set_preload(True)
+    registry.preload_session('cpu')
+    registry.preload_thread.join()
+    assert loaded == [str(tmp_path / "model.pt")]
+
+
+def test_settings_are_saved_for_the_next_session(tmp_path):
+    settings_path = str(tmp_path / "settings.json")
+
+    registry = ModelRegistry(settings_path=settings_path)
+    registry.set_memory_budget(2 * 1024 ** 3)
+    registry.set_preload(True)
+
+    registry = ModelRegistry(settings_path=settings_path)
+    assert registry.memory_budget == 2 * 1024 ** 3
+    assert registry.preload
+
+
+def test_lowering_the_budget_evicts_models():
+    registry = ModelRegistry()
+    key = registry.get_key('yolo', 'a.pt')
+    registry.get_or_load(key, lambda: model(2))
+
+    registry.set_memory_budget(1024 ** 2)
+
+    assert key not in registry
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.PredictionCache`."""
+
+import numpy as np
+
+from coralnet_toolbox.PredictionCache import PredictionCache
+
+
+def test_add_detections_returns_the_start_index():
+    cache = PredictionCache()
+    cache.start("image.tif", 'detect', {0: 'coral'}, {}, (100, 100))
+
+    assert cache.add_detections("image.tif", [[0, 0, 1, 1]], [0.5], [0]) == 0
+    assert cache.add_detections("image.tif", [[0, 0, 1, 1], [1, 1, 2, 2]], [0.5, 0.6], [0, 0]) == 1
+    assert len(cache.get("image.tif")['conf']) == 3
+    assert cache.add_detections("other.tif", [[0, 0, 1, 1]], [0.5], [0]) is None
+
+
+def test_start_replaces_entry_and_drops_oldest_images():
+    cache = PredictionCache(max_images=2)
+    for image_path in ("a.tif", "b.tif", "c.tif"):
+        cache.start(image_path, 'detect', {}, {}, (10, 10))
+        cache.add_detections(image_path, [[0, 0, 1, 1]], [0.5], [0])
+
+    assert cache.image_paths() == ["b.tif", "c.tif"]
+
+    cache.start("b.tif", 'detect', {}, {}, (10, 10))
+    assert len(cache.get("b.tif")['conf']) == 0
+    assert cache.image_paths() == ["c.tif", "b.tif"]
+
+
+def test_annotation_ids_map_to_prediction_indices():
+    cache = PredictionCache()
+    cache.start("image.tif", 'detect', {}, {}, (10, 10))
+
+    cache.add_annotation_ids("image.tif", ["a", "b"], [3, 5])
+    cache.add_annotation_ids("image.tif", ["c"])
+    assert cache.get("image.tif")['annotation_ids'] == {"a": 3, "b": 5, "c": None}
+
+    cache.set_annotation_ids("image.tif", {"b": 5})
+    assert cache.get("image.tif")['annotation_ids'] == {"b": 5}
+
+
+def test_remove_and_nbytes():
+    cache = PredictionCache()
+    cache.start("image.tif", 'segment', {}, {}, (10, 10))
+    cache.add_detections("image.tif", [[0, 0, 1, 1]], [0.5], [0], [np.zeros((4, 2))])
+
+    assert cache.nbytes() > 0
+
+    cache.remove("image.tif")
+    assert "image.tif" not in cache
+    assert cache.nbytes() == 0
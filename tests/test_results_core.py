@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.ResultsCore`."""
+
+import numpy as np
+import torch
+
+from ultralytics.engine.results import Results
+
+from coralnet_toolbox.PredictionCache import PredictionCache
+from coralnet_toolbox.ResultsCore import ResultsCore
+
+
+NAMES = {0: 'coral', 1: 'sponge'}
+CLASS_MAPPING = {'coral': {'short_label_code': 'CORAL'}, 'sponge': {'short_label_code': 'SPONGE'}}
+
+
+def detection_results(boxes, shape=(100, 100)):
+    """Results of an image, with boxes given as (x1, y1, x2, y2, conf, cls)."""
+    boxes = torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6)
+    return Results(np.zeros((*shape, 3), dtype=np.uint8), path="image.tif", names=NAMES, boxes=boxes)
+
+
+def results_core(**kwargs):
+    core = ResultsCore(CLASS_MAPPING, **kwargs)
+    core.prediction_cache = PredictionCache()
+    return core
+
+
+def test_apply_filters_drops_uncertain_overlapping_and_large_boxes():
+    core = ResultsCore(CLASS_MAPPING, uncertainty_thresh=0.3, iou_thresh=0.5, max_area_thresh=0.4)
+    results = detection_results([[0, 0, 10, 10, 0.9, 0],    # kept
+                                 [1, 1, 10, 10, 0.8, 0],    # overlaps the first
+                                 [50, 50, 60, 60, 0.2, 1],  # uncertain
+                                 [0, 0, 90, 90, 0.9, 1],    # too large
+                                 [70, 70, 80, 80, 0.5, 1]])  # kept
+
+    filtered, keep = core.apply_filters(results, return_indices=True)
+
+    assert sorted(keep.tolist()) == [0, 4]
+    assert len(filtered) == 2
+
+
+def test_detection_records_map_labels_and_cache_indices():
+    core = results_core(uncertainty_thresh=0.3)
+    results = detection_results([[0, 0, 10, 10, 0.2, 0],
+                                 [20, 20, 30, 30, 0.9, 1]])
+
+    records = core.detection_records(results)
+
+    assert len(records) == 1
+    assert records[0].short_label == 'SPONGE'
+    assert records[0].index == 1
+    np.testing.assert_allclose(records[0].bbox, [20, 20, 30, 30])
+
+    # The raw predictions are cached before filtering
+    entry = core.prediction_cache.get("image.tif")
+    assert len(entry['conf']) == 2
+
+
+def test_detection_records_of_windows_index_the_whole_entry():
+    core = results_core()
+    first = detection_results([[0, 0, 10, 10, 0.9, 0]])
+    second = detection_results([[0, 0, 10, 10, 0.9, 1]])
+    second.offset = (50, 50)
+
+    core.detection_records(first)
+    records = core.detection_records(second)
+
+    assert records[0].index == 1
+    np.testing.assert_allclose(records[0].bbox, [50, 50, 60, 60])
+    np.testing.assert_allclose(core.prediction_cache.get("image.tif")['xyxy'][1], [50, 50, 60, 60])
+
+
+def test_cached_records_reapply_thresholds():
+    core = results_core(uncertainty_thresh=0.3)
+    core.detection_records(detection_results([[0, 0, 10, 10, 0.4, 0],
+                                              [20, 20, 30, 30, 0.9, 1]]))
+    entry = core.prediction_cache.get("image.tif")
+
+    assert [r.index for r in core.cached_records("image.tif", entry)] == [1, 0]
+
+    core.uncertainty_thresh = 0.5
+    assert [r.index for r in core.cached_records("image.tif", entry)] == [1]
+
+
+def test_cached_records_exclude_kept_predictions():
+    core = results_core()
+    core.detection_records(detection_results([[0, 0, 10, 10, 0.4, 0],
+                                              [20, 20, 30, 30, 0.9, 1]]))
+    entry = core.prediction_cache.get("image.tif")
+
+    records = core.cached_records("image.tif", entry, exclude={1})
+
+    assert [r.index for r in records] == [0]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.ResultsProcessor`."""
+
+from types import SimpleNamespace
+
+from coralnet_toolbox.PredictionCache import PredictionCache
+from coralnet_toolbox.ResultsProcessor import ResultsProcessor
+
+
+class AnnotationWindow:
+    def __init__(self, annotations):
+        self.annotations_dict = annotations
+
+    def delete_annotation(self, annotation_id):
+        self.annotations_dict.pop(annotation_id)
+
+
+def results_processor(annotations):
+    """A ResultsProcessor whose created annotations are recorded rather than displayed."""
+    processor = ResultsProcessor.__new__(ResultsProcessor)
+    processor.class_mapping = {}
+    processor.uncertainty_thresh = 0.3
+    processor.iou_thresh = 0.5
+    processor.min_area_thresh = 0.0
+    processor.max_area_thresh = 1.0
+    processor.annotation_window = AnnotationWindow(annotations)
+    processor.main_window = SimpleNamespace(image_window=SimpleNamespace(update_image_annotations=lambda path: None))
+    processor.prediction_cache = PredictionCache()
+    processor.created = []
+
+    def create_record_annotations(records, create_annotation):
+        processor.created.append([record.index for record in records])
+        return len(records)
+
+    processor.create_record_annotations = create_record_annotations
+    return processor
+
+
+def test_reapply_thresholds_keeps_verified_and_deleted_annotations_out():
+    annotations = {'verified': SimpleNamespace(user_confidence={'label': 1.0}),
+                   'machine': SimpleNamespace(user_confidence={})}
+    processor = results_processor(annotations)
+
+    cache = processor.prediction_cache
+    cache.start("image.tif", 'detect', {0: 'coral'}, {}, (100, 100))
+    cache.add_detections("image.tif",
+                         [[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50]],
+                         [0.9, 0.8, 0.7],
+                         [0, 0, 0])
+    # The annotation of prediction 1 was deleted by the user
+    cache.add_annotation_ids("image.tif", ['verified', 'deleted', 'machine'], [0, 1, 2])
+
+    processor.reapply_thresholds(["image.tif"])
+    assert processor.created == [[2]]
+    assert 'machine' not in annotations
+
+    # Moving the sliders again does not bring the deleted annotation back
+    processor.reapply_thresholds(["image.tif"])
+    assert processor.created[-1] == [2]
+    assert cache.get("image.tif")['suppressed'] == {1}
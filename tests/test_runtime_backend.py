@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.RuntimeBackend`."""
+
+from types import SimpleNamespace
+
+import ultralytics
+
+from coralnet_toolbox.MachineLearning import RuntimeBackend
+from coralnet_toolbox.MachineLearning.RuntimeBackend import apply_runtime_options, get_model_format
+
+
+def onnx_model(**backend):
+    session = SimpleNamespace(get_providers=lambda: ["CPUExecutionProvider"])
+    backend = SimpleNamespace(onnx=True, xml=False, session=session, **backend)
+    return SimpleNamespace(predictor=SimpleNamespace(model=backend), ckpt_path="model.onnx", model="model.onnx"), session
+
+
+def test_get_model_format():
+    assert get_model_format("model.onnx") == 'onnx'
+    assert get_model_format("model_openvino_model/") == 'openvino'
+    assert get_model_format("model.pt") == 'pytorch'
+
+
+def test_pytorch_models_are_left_unchanged():
+    model = SimpleNamespace(predictor=SimpleNamespace(model=SimpleNamespace(onnx=False, xml=False)))
+    assert not apply_runtime_options(model)
+
+
+def test_unsupported_ultralytics_keeps_the_default_session(monkeypatch):
+    monkeypatch.setattr(ultralytics, '__version__', "9.0.0")
+    model, session = onnx_model(output_names=["output0"])
+
+    assert not apply_runtime_options(model)
+    assert model.predictor.model.session is session
+
+
+def test_unexpected_backend_keeps_the_default_session(monkeypatch):
+    monkeypatch.setattr(RuntimeBackend, 'create_onnx_session', lambda *args, **kwargs: 1 / 0)
+
+    # Missing output names, and bound through IO bindings
+    for model, session in (onnx_model(), onnx_model(output_names=["output0"], io=object())):
+        assert not apply_runtime_options(model)
+        assert model.predictor.model.session is session
+
+
+def test_failed_session_keeps_the_default_session(monkeypatch):
+    monkeypatch.setattr(RuntimeBackend, 'create_onnx_session', lambda *args, **kwargs: 1 / 0)
+    model, session = onnx_model(output_names=["output0"])
+
+    assert not apply_runtime_options(model)
+    assert model.predictor.model.session is session
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.Slicer.QtSlicer`."""
+
+import numpy as np
+import torch
+
+from ultralytics.engine.results import Results
+
+from coralnet_toolbox.Slicer.QtSlicer import Slicer, SliceMerger
+
+
+NAMES = {0: 'coral', 1: 'sponge'}
+
+
+def slice_results(window, boxes, polygons=None):
+    """Results of a slice, with boxes given in image coordinates as (x1, y1, x2, y2, conf, cls)."""
+    left, top, right, bottom = window
+    boxes = torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6)
+    boxes[:, :4] -= torch.tensor([left, top, left, top], dtype=torch.float32)
+
+    masks = None
+    if polygons is not None:
+        import cv2
+        masks = np.zeros((len(polygons), bottom - top, right - left), dtype=np.uint8)
+        for mask, polygon in zip(masks, polygons):
+            cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32) - [left, top]], 1)
+        masks = torch.from_numpy(masks.astype(bool))
+
+    results = Results(np.zeros((bottom - top, right - left, 3), dtype=np.uint8),
+                      path="image.tif", names=NAMES, boxes=boxes, masks=masks)
+    results.offset = (left, top)
+    return results
+
+
+def merge(slices, full_shape, detections, iou_thresh=0.5, polygons=None):
+    """Run the detections of each slice through a SliceMerger, returning the kept boxes in image coordinates."""
+    merger = SliceMerger(slices, full_shape, iou_thresh)
+    outputs = []
+    for index, window in enumerate(slices):
+        window = tuple(int(i) for i in window)
+        outputs.append(merger.add(slice_results(window, detections[index],
+                                                polygons[index] if polygons else None), index))
+    outputs += merger.flush()
+
+    kept = []
+    for results in outputs:
+        offset = np.tile(results.offset, 2)
+        for box, conf, cls in zip(results.boxes.xyxy.numpy(), results.boxes.conf.numpy(), results.boxes.cls.numpy()):
+            kept.append((*(box + offset), float(conf), int(cls)))
+    return outputs, kept
+
+
+def test_get_slices_cover_the_image():
+    slices = Slicer.get_slices(1000, 1500, (640, 640), 0.2)
+
+    assert slices[:, 0].min() == 0 and slices[:, 1].min() == 0
+    assert slices[:, 2].max() == 1500 and slices[:, 3].max() == 1000
+    assert np.all(slices[:, 2] - slices[:, 0] == 640)
+    assert np.all(slices[:, 3] - slices[:, 1] == 640)
+
+
+def test_get_slices_smaller_than_slice():
+    slices = Slicer.get_slices(300, 200, (640, 640), 0.2)
+
+    assert slices.tolist() == [[0, 0, 200, 300]]
+
+
+def test_object_wider_than_the_overlap_is_kept_once():
+    slices = Slicer.get_slices(600, 1000, (600, 600), 0.2)
+    assert slices.tolist() == [[0, 0, 600, 600], [400, 0, 1000, 600]]
+
+    # The object spans 100-900, each slice sees a piece cut by its interior edge
+    detections = [[[100, 100, 600, 200, 0.9, 0]],
+                  [[400, 100, 900, 200, 0.8, 0]]]
+    _, kept = merge(slices, (600, 1000), detections)
+
+    assert len(kept) == 1
+    assert np.allclose(kept[0][:4], [100, 100, 900, 200])
+    assert np.isclose(kept[0][4], 0.9)
+
+
+def test_object_in_the_overlap_is_kept_once():
+    slices = Slicer.get_slices(600, 1000, (600, 600), 0.2)
+
+    # Seen whole by both slices, the most confident is kept
+    detections = [[[450, 300, 560, 350, 0.9, 1]],
+                  [[452, 301, 560, 350, 0.7, 1]]]
+    _, kept = merge(slices, (600, 1000), detections)
+
+    assert len(kept) == 1
+    assert np.allclose(kept[0][:5], [450, 300, 560, 350, 0.9])
+
+
+def test_objects_outside_the_overlap_are_final_per_slice():
+    slices = Slicer.get_slices(600, 1000, (600, 600), 0.2)
+
+    detections = [[[10, 10, 50, 50, 0.9, 0], [30, 30, 70, 70, 0.8, 0]],
+                  [[900, 500, 950, 550, 0.9, 1]]]
+    outputs, kept = merge(slices, (600, 1000), detections)
+
+    assert len(kept) == 3
+    # Yielded with their slices, nothing left to merge
+    assert [len(results) for results in outputs] == [2, 1]
+
+
+def test_cut_piece_defers_to_the_slice_that_sees_the_object_whole():
+    slices = Slicer.get_slices(600, 1000, (600, 600), 0.2)
+
+    # Cut by the right edge of the first slice (more confident), whole in the second
+    detections = [[[450, 100, 600, 200, 0.9, 0]],
+                  [[450, 100, 700, 200, 0.6, 0]]]
+    _, kept = merge(slices, (600, 1000), detections)
+
+    assert len(kept) == 1
+    assert np.allclose(kept[0][:4], [450, 100, 700, 200])
+
+
+def test_different_classes_are_not_merged():
+    slices = Slicer.get_slices(600, 1000, (600, 600), 0.2)
+
+    detections = [[[100, 100, 600, 200, 0.9, 0]],
+                  [[400, 100, 900, 200, 0.8, 1]]]
+    _, kept = merge(slices, (600, 1000), detections)
+
+    assert sorted(k[5] for k in kept) == [0, 1]
+
+
+def test_merged_segments_join_their_masks():
+    slices = Slicer.get_slices(600, 1000, (600, 600), 0.2)
+
+    polygons = [[[[100, 100], [599, 100], [599, 200], [100, 200]]],
+                [[[400, 100], [900, 100], [900, 200], [400, 200]]]]
+    detections = [[[100, 100, 600, 200, 0.9, 0]],
+                  [[400, 100, 900, 200, 0.8, 0]]]
+    outputs, kept = merge(slices, (600, 1000), detections, polygons=polygons)
+
+    assert len(kept) == 1
+    merged = [results for results in outputs if len(results)][0]
+    points = merged.masks.xy[0] + merged.offset
+    assert points[:, 0].min() <= 101 and points[:, 0].max() >= 899
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.MachineLearning.ExportDataset.QtSplitSolver`."""
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from coralnet_toolbox.MachineLearning.ExportDataset.QtSplitSolver import (build_count_matrix, count_split_labels,
+                                                                          stratified_split)
+
+
+def annotation(image_path, short_label_code):
+    return SimpleNamespace(image_path=image_path, label=SimpleNamespace(short_label_code=short_label_code))
+
+
+def test_build_count_matrix():
+    annotations = [annotation("b.jpg", "coral"), annotation("b.jpg", "coral"),
+                   annotation("a.jpg", "sponge"), annotation("c.jpg", "unknown")]
+
+    images, image_index, counts = build_count_matrix(["b.jpg", "d.jpg"], annotations, ["coral", "sponge"])
+
+    assert images == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+    assert image_index["b.jpg"] == 1
+    assert counts.tolist() == [[0, 1], [2, 0], [0, 0], [0, 0]]
+    assert count_split_labels(counts, image_index, ["a.jpg", "b.jpg"]).tolist() == [2, 1]
+
+
+def test_stratified_split_divides_each_label():
+    rng = np.random.default_rng(1)
+    counts = np.zeros((200, 2), dtype=np.int64)
+    counts[:, 0] = rng.integers(1, 5, 200)
+    counts[:20, 1] = 1  # rare label
+    counts[150:] = 0  # images without annotations
+
+    assignment = stratified_split(counts, (0.7, 0.2, 0.1))
+
+    assert (assignment >= 0).all()
+    for split, ratio in enumerate((0.7, 0.2, 0.1)):
+        share = counts[assignment == split].sum(axis=0) / counts.sum(axis=0)
+        np.testing.assert_allclose(share, ratio, atol=0.06)
+        assert abs((assignment == split).mean() - ratio) < 0.06
+
+
+def test_stratified_split_is_deterministic_and_skips_empty_splits():
+    counts = np.random.default_rng(0).integers(0, 3, (50, 4))
+
+    first = stratified_split(counts, (0.8, 0.0, 0.2), seed=3)
+
+    assert (first == stratified_split(counts, (0.8, 0.0, 0.2), seed=3)).all()
+    assert not (first == 1).any()
+    assert (stratified_split(counts, (0, 0, 0)) == -1).all()
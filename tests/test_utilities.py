@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+"""Tests for `coralnet_toolbox.utilities`."""
+
+import numpy as np
+import pytest
+
+from PyQt5.QtGui import QColor, QImage, QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from coralnet_toolbox.utilities import pixmap_to_numpy
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.mark.parametrize("image_format", [QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_RGB888])
+def test_pixmap_to_numpy_is_rgb(app, image_format):
+    image = QImage(5, 3, image_format)
+    image.fill(QColor(200, 100, 50))
+
+    array = pixmap_to_numpy(QPixmap.fromImage(image))
+
+    assert array.shape == (3, 5, 3)
+    assert np.all(array == [200, 100, 50])
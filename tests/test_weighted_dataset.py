@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for the tiling functions of `coralnet_toolbox.MachineLearning.WeightedDataset`."""
+
+import numpy as np
+
+from coralnet_toolbox.MachineLearning.WeightedDataset import clip_polygon, get_tile_windows, tile_label
+
+
+def image_label(bboxes=None, segments=None, shape=(100, 200)):
+    segments = [np.array(s, dtype=np.float32) for s in segments] if segments else []
+    cls = np.zeros((len(segments) or len(bboxes), 1), dtype=np.float32)
+    return {'im_file': "image.jpg", 'shape': shape, 'cls': cls,
+            'bboxes': np.array(bboxes or [], dtype=np.float32).reshape(-1, 4), 'segments': segments}
+
+
+def test_get_tile_windows_cover_the_image():
+    windows = get_tile_windows(250, 100, (100, 100), (0.2, 0.2))
+
+    assert windows == [(0, 0, 100, 100), (80, 0, 100, 100), (150, 0, 100, 100)]
+
+
+def test_get_tile_windows_small_image():
+    assert get_tile_windows(50, 40, (100, 100)) == [(0, 0, 50, 40)]
+
+
+def test_clip_polygon():
+    square = np.array([[0, 0], [10, 0], [10, 10], [0, 10]], dtype=np.float32)
+
+    clipped = clip_polygon(square, 5, -5, 20, 20)
+
+    np.testing.assert_allclose(clipped.min(axis=0), [5, 0])
+    np.testing.assert_allclose(clipped.max(axis=0), [10, 10])
+    assert len(clip_polygon(square, 20, 20, 30, 30)) == 0
+
+
+def test_tile_label_boxes_are_clipped_and_dropped():
+    # Boxes (200 x 100 image): one cut in half by the tile, one mostly outside it
+    label = image_label(bboxes=[[0.5, 0.5, 0.2, 0.2], [0.78, 0.5, 0.1, 0.2]])
+
+    tile = tile_label(label, (100, 0, 50, 100), min_visibility=0.3)
+
+    assert tile['shape'] == (100, 50)
+    np.testing.assert_allclose(tile['bboxes'], [[0.2, 0.5, 0.4, 0.2]], atol=1e-6)
+
+
+def test_tile_label_segments_are_clipped():
+    label = image_label(segments=[[[0.4, 0.4], [0.6, 0.4], [0.6, 0.6], [0.4, 0.6]]])
+
+    tile = tile_label(label, (100, 0, 100, 100))
+
+    assert len(tile['segments']) == 1
+    np.testing.assert_allclose(tile['segments'][0].min(axis=0), [0, 0.4], atol=1e-6)
+    np.testing.assert_allclose(tile['bboxes'], [[0.1, 0.5, 0.2, 0.2]], atol=1e-6)